@@ -0,0 +1,50 @@
+"""Shared settings helpers: environment overrides, locations of persistent files and the token estimate."""
+import os
+
+# Same rough estimate the app shows in the status bar
+CHARS_PER_TOKEN = 4
+
+
+def data_dir():
+    """Returns the app data directory, creating it if needed. Override it with STORY_APP_DATA_DIR."""
+    path = os.getenv("STORY_APP_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".story_generator")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_path(*parts):
+    """Returns a path inside the data directory, creating intermediate directories."""
+    path = os.path.join(data_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def data_subdir(name):
+    """Returns a directory inside the data directory, creating it if needed."""
+    path = os.path.join(data_dir(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def estimate_tokens(text):
+    """A rough token count for budgeting prompts; the API reports the real one."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def env_number(name, default, cast=float):
+    """Reads a numeric setting from the environment, falling back to the default when unset or invalid."""
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        return default
+
+
+def env_flag(name, default=False):
+    """Reads an on/off setting from the environment: 1, true, yes or on enable it, anything else disables it."""
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
@@ -0,0 +1,182 @@
+"""Headless batch story generation from a JSONL prompt file.
+
+Each input line is a JSON object with a "topic" (or "prompt"/"title") and an optional
+"method" (zero-shot, few-shot or chain-of-thought). Stories are written to the output
+JSONL as they complete. No GUI or TTS modules are imported.
+
+Usage: python batch_generate.py prompts.jsonl -o stories.jsonl [--workers 8] [--ordered]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from gemini_client import ClientConfig, GeminiClient, GeminiError, generate_story
+from story_parser import parse_generated_story
+from story_prompts import PROMPT_BUILDERS, build_prompt
+
+TOPIC_FIELDS = ("topic", "prompt", "title")
+ID_FIELDS = ("id", "request_id")
+
+
+def read_jobs(path, default_method):
+    """Yields (line_number, record) for each prompt in a JSONL file. Bad lines become error records."""
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, {"error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(entry, dict):
+                yield line_number, {"error": f"Expected a JSON object, got {type(entry).__name__}."}
+                continue
+            topic = next((entry[f] for f in TOPIC_FIELDS if entry.get(f)), None)
+            method = entry.get("method", default_method)
+            record = {"topic": topic, "method": method}
+            job_id = next((entry[f] for f in ID_FIELDS if f in entry), None)
+            if job_id is not None:
+                record["id"] = job_id
+            if not topic:
+                record["error"] = "No topic found (expected one of: " + ", ".join(TOPIC_FIELDS) + ")."
+            elif method not in PROMPT_BUILDERS:
+                record["error"] = f"Unknown prompting method: {method}"
+            yield line_number, record
+
+
+def run_job(line_number, record, api_key, stop_event, regenerate, client=None):
+    """Generates and post-processes one story. Never raises; failures are reported in the result."""
+    result = dict(record, line=line_number)
+    if "error" in result:
+        result["ok"] = False
+        return result
+    started = time.perf_counter()
+    try:
+        full_prompt = build_prompt(record["method"], record["topic"])
+        generated = generate_story(full_prompt, api_key, stop_event, regenerate, client)
+        result["story"] = parse_generated_story(generated, record["method"])
+        result["ok"] = True
+    except GeminiError as e:
+        result["error"] = str(e)
+        result["ok"] = False
+    except Exception as e:
+        result["error"] = f"An unexpected error occurred: {e}"
+        result["ok"] = False
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+class ResultWriter:
+    """Appends results to the output file as they arrive, optionally restoring input order."""
+    def __init__(self, file, ordered):
+        self.file = file
+        self.ordered = ordered
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.next_index = 0
+        self.ok = 0
+        self.failed = 0
+
+    def _write(self, result):
+        self.file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if result["ok"]:
+            self.ok += 1
+        else:
+            self.failed += 1
+
+    def add(self, index, result):
+        """Writes the result, or holds it until the ones before it arrive. Returns how many results were written."""
+        with self.lock:
+            if not self.ordered:
+                self._write(result)
+                return 1
+            self.pending[index] = result
+            written = 0
+            while self.next_index in self.pending:
+                self._write(self.pending.pop(self.next_index))
+                self.next_index += 1
+                written += 1
+            return written
+
+
+def run_batch(input_path, output_path, api_key, workers=4, ordered=False, default_method="zero-shot",
+              regenerate=False, stop_event=None):
+    """Runs every prompt in input_path through a bounded worker pool. Returns (ok, failed) counts."""
+    stop_event = stop_event or threading.Event()
+    # A client of our own, with at least one pooled connection per worker
+    config = ClientConfig.from_env()
+    config.pool_size = max(config.pool_size, workers)
+    client = GeminiClient(api_key, config) if api_key else None
+    # Bound unwritten jobs, so huge input files are not read into memory up front. In ordered
+    # mode a slot is held until its result is written, not just generated, so a slow head-of-line
+    # request cannot let finished results pile up behind it.
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    with open(output_path, "w", encoding="utf-8") as out_file, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        writer = ResultWriter(out_file, ordered)
+
+        def finish(index, future):
+            for _ in range(writer.add(index, future.result())):
+                slots.release()
+
+        try:
+            for index, (line_number, record) in enumerate(read_jobs(input_path, default_method)):
+                while not slots.acquire(timeout=0.5):
+                    if stop_event.is_set():
+                        break
+                if stop_event.is_set():
+                    break
+                future = pool.submit(run_job, line_number, record, api_key, stop_event, regenerate, client)
+                future.add_done_callback(lambda f, i=index: finish(i, f))
+        except KeyboardInterrupt:
+            # Cancel in-flight requests before the pool waits for them
+            stop_event.set()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+            if client is not None:
+                client.close()
+    return writer.ok, writer.failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate stories headlessly from a JSONL prompt file.")
+    parser.add_argument("input", help="JSONL file with one prompt per line")
+    parser.add_argument("-o", "--output", default="stories.jsonl", help="JSONL file to write results to")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="concurrent requests (default 4)")
+    parser.add_argument("--ordered", action="store_true", help="write results in input order")
+    parser.add_argument("--method", default="zero-shot", choices=sorted(PROMPT_BUILDERS),
+                        help="method for lines that do not set one")
+    parser.add_argument("--regenerate", action="store_true", help="skip the response cache")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("GEMINI_API_KEY not found. Please create a .env file with GEMINI_API_KEY='YOUR_API_KEY_HERE'", file=sys.stderr)
+        return 2
+
+    stop_event = threading.Event()
+    started = time.perf_counter()
+    try:
+        ok, failed = run_batch(args.input, args.output, api_key, max(1, args.workers), args.ordered,
+                               args.method, args.regenerate, stop_event)
+    except KeyboardInterrupt:
+        print("Interrupted; in-flight requests were canceled.", file=sys.stderr)
+        return 130
+    print(f"{ok} stories generated, {failed} failed in {time.perf_counter() - started:.1f}s -> {args.output}",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Benchmarks for the story generator, run against a local mock Gemini server."""
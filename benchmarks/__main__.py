@@ -0,0 +1,117 @@
+"""Runs the benchmark scenarios and writes machine-readable results.
+
+Usage: python -m benchmarks [--only parse,pdf_read] [-o results.json] [--compare baseline.json] [scenario options]
+
+Each scenario runs in a fresh process against a local mock Gemini server, so no API quota
+is used and peak RSS belongs to that scenario alone. Results include the git commit so runs
+from different commits can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.scenarios import SCENARIOS, add_options
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPARED_FIELDS = ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "peak_rss_mb")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _scenario_args(options, actions):
+    args = []
+    for action in actions:
+        args += [action.option_strings[0], str(getattr(options, action.dest))]
+    return args
+
+
+def run_scenario(name, options, actions):
+    command = [sys.executable, "-m", "benchmarks.scenarios", name] + _scenario_args(options, actions)
+    # Keep caches and traces written by the scenario out of the real data directory
+    with tempfile.TemporaryDirectory() as data_dir:
+        completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True,
+                                   env=dict(os.environ, STORY_APP_DATA_DIR=data_dir))
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    return f"{value:.4f}" if abs(value) < 1 else f"{value:.2f}"
+
+
+def print_table(results, baseline=None):
+    print(f"{'scenario':<18} {'ops':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'RSS MB':>8}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<18} error: {result['error']}")
+            continue
+        print(f"{name:<18} {result['operations']:>6} " + " ".join(
+            f"{_format(result.get(field)):>{8 if field == 'peak_rss_mb' else 9}}" for field in COMPARED_FIELDS))
+        before = (baseline or {}).get(name)
+        if before and "error" not in before:
+            changes = []
+            for field in COMPARED_FIELDS:
+                old, new = before.get(field), result.get(field)
+                if old and new is not None:
+                    changes.append(f"{(new - old) / old * 100:+.1f}%")
+                else:
+                    changes.append("-")
+            print(f"{'  vs baseline':<25} " + " ".join(f"{c:>{8 if f == 'peak_rss_mb' else 9}}"
+                                                       for c, f in zip(changes, COMPARED_FIELDS)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the story generator benchmarks against a local mock Gemini server.")
+    parser.add_argument("--only", help="comma-separated scenarios to run (default: all): " + ", ".join(SCENARIOS))
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to show changes against")
+    scenario_actions = add_options(parser)
+    options = parser.parse_args(argv)
+
+    names = options.only.split(",") if options.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenario: " + ", ".join(unknown))
+
+    results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = run_scenario(name, options, scenario_actions)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {action.dest: getattr(options, action.dest) for action in scenario_actions},
+        "scenarios": results,
+    }
+    with open(options.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as file:
+            baseline = json.load(file).get("scenarios")
+    print_table(results, baseline)
+    print(f"Results written to {options.output}", file=sys.stderr)
+    return 1 if any("error" in result for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
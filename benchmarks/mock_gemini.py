@@ -0,0 +1,206 @@
+"""Local stand-in for the Gemini generateContent and streamGenerateContent endpoints.
+
+Latency, jitter, a slow tail, streaming chunk size and pacing, error rate, payload size
+and a requests-per-window quota are all configurable, so benchmarks can exercise the client
+without spending real quota.
+
+Run it on its own and point the app at it with GEMINI_API_BASE:
+
+    python -m benchmarks.mock_gemini --port 8089 --latency 0.4 --error-rate 0.05
+    GEMINI_API_BASE=http://127.0.0.1:8089/v1beta/models python desktop_story_generator.py
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_STORY = "Once upon a time, a benchmark ran."
+
+
+def make_story(size, seed=0):
+    """Builds roughly `size` characters of story-like text."""
+    rng = random.Random(seed)
+    words = ("the", "keeper", "lit", "a", "lantern", "and", "watched", "the", "dark", "harbor",
+             "for", "ships", "that", "never", "came.")
+    parts, length = [], 0
+    while length < size:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+    return " ".join(parts)
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle stalls keep-alive responses
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _usage(self, prompt_chars, story):
+        return {"promptTokenCount": prompt_chars // 4, "candidatesTokenCount": len(story) // 4,
+                "totalTokenCount": (prompt_chars + len(story)) // 4}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.stats_lock:
+            server.requests += 1
+        retry_after = server.over_quota()
+        if retry_after is not None:
+            # Shaped like the real API's quota error, with both hints a client can use
+            self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                            "status": "RESOURCE_EXHAUSTED",
+                                            "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo",
+                                                         "retryDelay": f"{retry_after:.3f}s"}]}},
+                            {"Retry-After": str(max(1, round(retry_after)))})
+            return
+        delay = server.latency + (server.rng.uniform(0, server.latency_jitter) if server.latency_jitter else 0.0)
+        if server.tail_rate and server.rng.random() < server.tail_rate:
+            delay += server.tail_latency
+        time.sleep(delay)
+
+        if server.error_rate and server.rng.random() < server.error_rate:
+            with server.stats_lock:
+                server.errors += 1
+            headers = {"Retry-After": "1"} if server.error_status == 429 else None
+            self._send_json(server.error_status, {"error": {"code": server.error_status, "message": "Mock upstream error.",
+                                                            "status": "UNAVAILABLE"}}, headers)
+            return
+
+        story = server.story_text
+        usage = self._usage(len(body), story)
+        if ":streamGenerateContent" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            size = max(1, server.chunk_chars)
+            for start in range(0, len(story), size):
+                event = {"candidates": [{"content": {"role": "model", "parts": [{"text": story[start:start + size]}]}}]}
+                if start + size >= len(story):
+                    event["usageMetadata"] = usage
+                try:
+                    self._write_chunk(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+                except OSError:
+                    return # The client hung up, e.g. after a cancel
+                if server.chunk_delay:
+                    time.sleep(server.chunk_delay)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": story}]}}],
+                                  "usageMetadata": usage})
+
+
+class MockGeminiServer(ThreadingHTTPServer):
+    """Serves canned stories on a local port; counts accepted connections, requests, injected errors and 429s."""
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, latency_jitter=0.0, story_text=DEFAULT_STORY,
+                 chunk_chars=64, chunk_delay=0.0, error_rate=0.0, error_status=503, seed=0,
+                 quota_requests=0, quota_window=60.0, tail_rate=0.0, tail_latency=0.0):
+        super().__init__((host, port), MockGeminiHandler)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.story_text = story_text
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.quota_requests = quota_requests
+        self.quota_window = quota_window
+        self._accepted = deque()  # monotonic times of requests counted against the quota
+        self.stats_lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self._thread = None
+
+    def over_quota(self):
+        """Counts a request against the quota; returns seconds until a slot frees if it is over, else None."""
+        if not self.quota_requests:
+            return None
+        with self.stats_lock:
+            now = time.monotonic()
+            while self._accepted and now - self._accepted[0] >= self.quota_window:
+                self._accepted.popleft()
+            if len(self._accepted) >= self.quota_requests:
+                self.throttled += 1
+                return self.quota_window - (now - self._accepted[0])
+            self._accepted.append(now)
+            return None
+
+    @property
+    def api_base(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1beta/models"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock of the Gemini API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response starts")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of requests that are extra slow")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="extra seconds for those slow requests")
+    parser.add_argument("--story-chars", type=int, default=0, help="size of the generated story (default: a short sentence)")
+    parser.add_argument("--chunk-chars", type=int, default=64, help="characters per streamed event")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed events")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="status code for injected failures")
+    parser.add_argument("--quota-requests", type=int, default=0, help="requests allowed per quota window (0: no quota)")
+    parser.add_argument("--quota-window", type=float, default=60.0, help="quota window in seconds")
+    args = parser.parse_args(argv)
+
+    server = MockGeminiServer(args.host, args.port, args.latency, args.jitter,
+                              make_story(args.story_chars) if args.story_chars else DEFAULT_STORY,
+                              args.chunk_chars, args.chunk_delay, args.error_rate, args.error_status,
+                              quota_requests=args.quota_requests, quota_window=args.quota_window,
+                              tail_rate=args.tail_rate, tail_latency=args.tail_latency)
+    print(f"Mock Gemini API listening on {server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Compares story_parser.parse_generated_story with the original implementation.
+
+Usage: python -m benchmarks.parse_engine [--sizes 100000,1000000,5000000] [--repeat 5]
+
+Synthetic responses are built for each prompting method; both implementations must return
+identical text for every one of them before any timing is reported.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from story_parser import StoryStreamParser, parse_generated_story
+
+WORDS = ("the", "lantern", "**glowed**", "over", "a", "*quiet*", "harbor", "while", "Mira", "waited",
+         "for", "ships", "that", "never", "came.")
+
+
+def legacy_parse_generated_story(generated_story, selected_method):
+    """The parser as it was before story_parser, kept as the reference for equivalence."""
+    processed_story_text = generated_story.replace('**', '').replace('*', '').strip()
+
+    if selected_method == "few-shot":
+        story_marker = "Story:"
+        if story_marker in processed_story_text:
+            processed_story_text = processed_story_text.rsplit(story_marker, 1)[-1].strip()
+        elif "Now, write a short story about:" in processed_story_text:
+            processed_story_text = processed_story_text.rsplit("Now, write a short story about:", 1)[-1].strip()
+
+    elif selected_method == "chain-of-thought":
+        story_marker = "4. Story:"
+        if story_marker in processed_story_text:
+            processed_story_text = processed_story_text.rsplit(story_marker, 1)[-1].strip()
+        else:
+            lines = processed_story_text.split('\n')
+            story_lines = [line for line in lines if not line.strip().startswith(('1.', '2.', '3.', 'Character:', 'Plot:', 'Setting:'))]
+            processed_story_text = '\n'.join(story_lines).strip()
+
+    return processed_story_text.strip()
+
+
+def _prose(rng, size):
+    parts, length = [], 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+        parts.append(line)
+        length += len(line) + 1
+    return "\n".join(parts)
+
+
+def synthetic_responses(size, seed=0):
+    """Returns (name, method, response) cases of roughly `size` characters."""
+    rng = random.Random(seed)
+    body = _prose(rng, size)
+    steps = "1. **Character:** Mira, a keeper.\n2. **Plot:** She waits.\n3. Setting: A harbor.\n"
+    return [
+        ("zero-shot", "zero-shot", body),
+        ("few-shot marker", "few-shot", "Prompt: harbor\n**Story:** " + body),
+        ("few-shot echo", "few-shot", "Now, write a short story about: " + body),
+        ("cot marker", "chain-of-thought", steps + "4. **Story:**\n" + body),
+        ("cot no marker", "chain-of-thought", (steps + body[:2000] + "\n") * max(1, size // 2100)),
+    ]
+
+
+def _best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return result, min(timings), statistics.median(timings)
+
+
+def _stream(response, method, chunk_size=256):
+    parser = StoryStreamParser(method)
+    for start in range(0, len(response), chunk_size):
+        parser.feed(response[start:start + chunk_size])
+    return parser.finish()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the story post-processing engine.")
+    parser.add_argument("--sizes", default="100000,1000000,5000000", help="response sizes in characters")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="also time StoryStreamParser with 256-char chunks")
+    args = parser.parse_args(argv)
+
+    print(f"{'case':<18} {'size':>9} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8}" + ("  stream ms" if args.stream else ""))
+    for size in (int(s) for s in args.sizes.split(",")):
+        for name, method, response in synthetic_responses(size):
+            expected, legacy_best, _ = _best_of(args.repeat, legacy_parse_generated_story, response, method)
+            actual, engine_best, _ = _best_of(args.repeat, parse_generated_story, response, method)
+            if actual != expected:
+                raise SystemExit(f"Output mismatch for {name} at {size} characters")
+            line = (f"{name:<18} {len(response):>9} {legacy_best * 1000:>10.2f} {engine_best * 1000:>10.2f} "
+                    f"{legacy_best / max(engine_best, 1e-9):>7.1f}x")
+            if args.stream:
+                streamed, stream_best, _ = _best_of(1, _stream, response, method)
+                if streamed != expected:
+                    raise SystemExit(f"Streaming output mismatch for {name} at {size} characters")
+                line += f"  {stream_best * 1000:>9.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
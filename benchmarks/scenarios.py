@@ -0,0 +1,387 @@
+"""Benchmark scenarios. Each one runs in its own process so peak RSS is measured per scenario.
+
+Usage: python -m benchmarks.scenarios NAME [options]   (prints one JSON result)
+
+Normally these are run through `python -m benchmarks`, which collects the results.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_gemini import MockGeminiServer, make_story
+from benchmarks.stats import peak_rss_mb, summarize
+from perf_trace import percentile
+
+
+def _timed(func, items):
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        op_started = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - op_started)
+    return latencies, time.perf_counter() - started
+
+
+def _mock_server(options):
+    server = MockGeminiServer(latency=options.latency, latency_jitter=options.jitter,
+                              story_text=make_story(options.story_chars), chunk_chars=options.chunk_chars,
+                              error_rate=options.error_rate, error_status=options.error_status)
+    # Point the shared client at the mock and keep every request on the network path
+    os.environ["GEMINI_API_BASE"] = server.api_base
+    os.environ["STORY_CACHE_DISABLED"] = "1"
+    os.environ.setdefault("GEMINI_POOL_SIZE", str(options.concurrency))
+    return server.start()
+
+
+# --- SCENARIOS ---
+def prompt_build(options):
+    """generate_*_prompt for every method over a spread of topic lengths."""
+    from story_prompts import PROMPT_BUILDERS
+    topics = [make_story(size, seed=i) for i, size in enumerate((20, 200, 2000) * (options.iterations // 3 + 1))]
+    topics = topics[:options.iterations]
+    latencies, elapsed = [], 0.0
+    per_method = {}
+    for method, builder in PROMPT_BUILDERS.items():
+        method_latencies, method_elapsed = _timed(builder, topics)
+        per_method[method] = summarize(method_latencies, method_elapsed)["p50_ms"]
+        latencies += method_latencies
+        elapsed += method_elapsed
+    return dict(summarize(latencies, elapsed), p50_ms_by_method=per_method)
+
+
+def _network(options, call):
+    from story_prompts import build_prompt
+    server = _mock_server(options)
+    try:
+        prompts = [build_prompt("zero-shot", f"a lighthouse keeper, take {i}") for i in range(options.iterations)]
+        stop_event = threading.Event()
+        expected = server.story_text
+
+        def one(prompt):
+            started = time.perf_counter()
+            ok = call(prompt, stop_event) == expected
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options.concurrency) as pool:
+            outcomes = list(pool.map(one, prompts))
+        elapsed = time.perf_counter() - started
+        result = summarize([latency for latency, _ in outcomes], elapsed)
+        result.update(failed=sum(1 for _, ok in outcomes if not ok), connections=server.connections,
+                      http_requests=server.requests, injected_errors=server.errors)
+        return result
+    finally:
+        server.stop()
+
+
+def network_generate(options):
+    """get_story_from_gemini against the mock server, cache disabled."""
+    from gemini_client import get_story_from_gemini
+    return _network(options, lambda prompt, stop_event: get_story_from_gemini(prompt, "bench", stop_event))
+
+
+def network_stream(options):
+    """stream_story_from_gemini against the mock server; latency is time to the full story."""
+    from gemini_client import stream_story_from_gemini
+    first_chunk = []
+    lock = threading.Lock()
+
+    def call(prompt, stop_event):
+        started = time.perf_counter()
+        seen = []
+
+        def on_chunk(text):
+            if not seen:
+                seen.append(True)
+                with lock:
+                    first_chunk.append(time.perf_counter() - started)
+
+        return stream_story_from_gemini(prompt, "bench", stop_event, on_chunk)
+
+    result = _network(options, call)
+    first_chunk.sort()
+    for q in (50, 95):
+        value = percentile(first_chunk, q)
+        result[f"first_chunk_p{q}_ms"] = None if value is None else round(value * 1000, 3)
+    return result
+
+
+def rate_limited(options):
+    """A burst of requests against a mock quota: 429 backoff alone, then with a limiter sized to the quota.
+
+    The limited run's bucket starts empty, since a full one would add a quota-sized burst on top of
+    the steady rate, and its period is 10% longer than the quota window, so jitter between a grant
+    and the request reaching the mock cannot crowd one extra request into the sliding window.
+    """
+    from gemini_client import ClientConfig, GeminiClient, GeminiError
+    from rate_limiter import RateLimiter
+    from story_prompts import build_prompt
+    server = MockGeminiServer(latency=options.latency, story_text=make_story(options.story_chars),
+                              quota_requests=options.quota_requests, quota_window=options.quota_window).start()
+    prompts = [build_prompt("zero-shot", f"a lighthouse keeper, take {i}") for i in range(options.iterations)]
+    config = ClientConfig(api_base=server.api_base, pool_size=options.concurrency,
+                          rate_limit_max_wait=options.quota_window * 2)
+    stop_event = threading.Event()
+    result = {}
+    try:
+        # Each limiter is built when its run starts, so the empty bucket has not refilled during the other run
+        for label, make_limiter in (("adaptive", RateLimiter),
+                                    ("limited", lambda: RateLimiter(options.quota_requests, initial_fill=0.0,
+                                                                    period=options.quota_window * 1.1))):
+            client = GeminiClient("bench", config, make_limiter())
+            throttled_before = server.throttled
+
+            def one(prompt):
+                started = time.perf_counter()
+                try:
+                    client.generate(prompt, stop_event)
+                    ok = True
+                except GeminiError:
+                    ok = False
+                return time.perf_counter() - started, ok
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options.concurrency) as pool:
+                outcomes = list(pool.map(one, prompts))
+            elapsed = time.perf_counter() - started
+            client.close()
+            summary = summarize([latency for latency, _ in outcomes], elapsed)
+            summary.update(failed=sum(1 for _, ok in outcomes if not ok), throttled=server.throttled - throttled_before)
+            result[label] = summary
+            # Let the quota window drain before the next run
+            time.sleep(options.quota_window)
+        if result["limited"]["throttled"]:
+            raise SystemExit(f"The limited run was throttled {result['limited']['throttled']} times")
+        # The runner reports the limited run's numbers, with the backoff-only run alongside
+        return dict(result["limited"], adaptive=result["adaptive"])
+    finally:
+        server.stop()
+
+
+def hedged(options):
+    """Requests against a mock with a slow tail, without and then with hedging; compare the p99s."""
+    from gemini_client import ClientConfig, GeminiClient
+    from rate_limiter import RateLimiter
+    from story_prompts import build_prompt
+    server = MockGeminiServer(latency=options.latency, latency_jitter=options.jitter, story_text=make_story(options.story_chars),
+                              tail_rate=options.tail_rate, tail_latency=options.tail_latency).start()
+    prompts = [build_prompt("zero-shot", f"a lighthouse keeper, take {i}") for i in range(options.iterations)]
+    stop_event = threading.Event()
+    result = {}
+    try:
+        for label, hedge in (("plain", False), ("hedged", True)):
+            config = ClientConfig(api_base=server.api_base, pool_size=options.concurrency * 2, hedge=hedge,
+                                  hedge_percentile=options.hedge_percentile, hedge_max_extra=options.hedge_max_extra)
+            client = GeminiClient("bench", config, RateLimiter())
+            requests_before = server.requests
+
+            def one(prompt):
+                started = time.perf_counter()
+                client.generate(prompt, stop_event)
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options.concurrency) as pool:
+                latencies = list(pool.map(one, prompts))
+            elapsed = time.perf_counter() - started
+            client.close()
+            summary = summarize(latencies, elapsed)
+            summary["http_requests"] = server.requests - requests_before
+            if client.hedger is not None:
+                summary.update(hedges=client.hedger.hedges, hedge_wins=client.hedger.hedge_wins)
+            result[label] = summary
+        return dict(result["hedged"], plain=result["plain"])
+    finally:
+        server.stop()
+
+
+def coalesced_burst(options):
+    """Bursts of identical prompts, without and then with single-flight coalescing; compare upstream requests."""
+    from gemini_client import generate_story_result
+    from single_flight import get_default_flight
+    from story_prompts import build_prompt
+    server = _mock_server(options)
+    # A handful of distinct prompts, each sent by every worker at once
+    prompts = [build_prompt("zero-shot", f"a lighthouse keeper, take {i % 4}") for i in range(options.iterations)]
+    stop_event = threading.Event()
+    result = {}
+    try:
+        for label, disabled in (("separate", "1"), ("coalesced", "")):
+            os.environ["STORY_SINGLE_FLIGHT_DISABLED"] = disabled
+            requests_before = server.requests
+
+            def one(prompt):
+                started = time.perf_counter()
+                generate_story_result(prompt, "bench", stop_event)
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options.concurrency) as pool:
+                latencies = list(pool.map(one, prompts))
+            summary = summarize(latencies, time.perf_counter() - started)
+            summary["http_requests"] = server.requests - requests_before
+            result[label] = summary
+        summary = dict(result["coalesced"], separate=result["separate"])
+        summary["coalesced_requests"] = get_default_flight().stats()["coalesced"]
+        return summary
+    finally:
+        server.stop()
+
+
+def few_shot_lookup(options):
+    """ExampleStore.select for distinct topics over options.examples synthetic examples (no memoization)."""
+    import random
+    from example_store import DEFAULT_EXAMPLES_PATH, Example, ExampleStore, load_examples
+    bundled = load_examples(DEFAULT_EXAMPLES_PATH)
+    vocabulary = sorted({word.strip(".,'").lower() for example in bundled for word in example.prompt.split()})
+    rng = random.Random(0)
+    examples = [Example(f"{bundled[i % len(bundled)].prompt} {' '.join(rng.sample(vocabulary, 4))}",
+                        make_story(600, seed=i % 100)) for i in range(options.examples)]
+    started = time.perf_counter()
+    store = ExampleStore(examples)
+    build_s = time.perf_counter() - started
+    topics = [" ".join(rng.sample(vocabulary, 5)) for _ in range(options.iterations)]
+    latencies, elapsed = _timed(store.select, topics)
+    return dict(summarize(latencies, elapsed), examples=len(store), build_s=round(build_s, 3))
+
+
+def parse(options):
+    """parse_generated_story on synthetic responses for every method."""
+    from benchmarks.parse_engine import synthetic_responses
+    from story_parser import parse_generated_story
+    cases = synthetic_responses(options.story_chars)
+    items = [cases[i % len(cases)] for i in range(options.iterations)]
+    latencies, elapsed = _timed(lambda case: parse_generated_story(case[2], case[1]), items)
+    return summarize(latencies, elapsed)
+
+
+def _write_pdf(path, pages, seed):
+    import fitz
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), make_story(2500, seed=seed + i), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def pdf_read(options):
+    """pdf_ingest.read_pdf_text on freshly generated PDFs of options.pdf_pages pages."""
+    from pdf_ingest import read_pdf_text
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(options.pdf_files):
+            path = os.path.join(directory, f"bench_{i}.pdf")
+            _write_pdf(path, options.pdf_pages, seed=i * options.pdf_pages)
+            paths.append(path)
+        latencies, elapsed = _timed(read_pdf_text, paths)
+    return dict(summarize(latencies, elapsed), pages_per_file=options.pdf_pages,
+                pages_per_s=round(options.pdf_pages * len(paths) / elapsed, 1))
+
+
+def headless_e2e(options):
+    """batch_generate.run_batch over a JSONL of prompts, mixing all methods, against the mock server."""
+    from batch_generate import run_batch
+    from story_prompts import PROMPT_BUILDERS
+    server = _mock_server(options)
+    methods = sorted(PROMPT_BUILDERS)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, "prompts.jsonl")
+            output_path = os.path.join(directory, "stories.jsonl")
+            with open(input_path, "w", encoding="utf-8") as file:
+                for i in range(options.iterations):
+                    file.write(json.dumps({"id": i, "topic": f"a lighthouse keeper, take {i}",
+                                           "method": methods[i % len(methods)]}) + "\n")
+            started = time.perf_counter()
+            ok, failed = run_batch(input_path, output_path, "bench", workers=options.concurrency)
+            elapsed = time.perf_counter() - started
+            with open(output_path, encoding="utf-8") as file:
+                # run_job measures each story from prompt building to parsed text
+                latencies = [json.loads(line).get("seconds", 0.0) for line in file]
+        result = summarize(latencies, elapsed)
+        result.update(failed=failed, connections=server.connections, http_requests=server.requests,
+                      injected_errors=server.errors)
+        return result
+    finally:
+        server.stop()
+
+
+def history(options):
+    """Listing, full-text search and open-by-id against a history of options.history_rows stories."""
+    from story_history import StoryHistory
+    topics = ("dragon", "lighthouse", "robot", "harbor", "forest", "queen", "starship", "baker")
+    with tempfile.TemporaryDirectory() as directory:
+        store = StoryHistory(os.path.join(directory, "history.sqlite3"))
+        for i in range(options.history_rows):
+            store.add(f"a {topics[i % len(topics)]} tale", "zero-shot", make_story(1500, seed=i % 50))
+        newest = store.list(limit=1)[0].id
+        operations = []
+        for i in range(options.iterations):
+            before = newest - (i * 97) % newest
+            operations += [lambda b=before: store.list(b), lambda t=topics[i % len(topics)], b=before: store.search(t, b),
+                           lambda b=before: store.get(b)]
+        latencies, elapsed = _timed(lambda op: op(), operations)
+        store.close()
+    return dict(summarize(latencies, elapsed), rows=options.history_rows)
+
+
+SCENARIOS = {
+    "prompt_build": prompt_build,
+    "network_generate": network_generate,
+    "network_stream": network_stream,
+    "parse": parse,
+    "pdf_read": pdf_read,
+    "headless_e2e": headless_e2e,
+    "history": history,
+    "rate_limited": rate_limited,
+    "hedged": hedged,
+    "few_shot_lookup": few_shot_lookup,
+    "coalesced_burst": coalesced_burst,
+}
+
+
+def add_options(parser):
+    """Adds the options shared by the scenario runner and `python -m benchmarks`; returns their actions."""
+    return [
+        parser.add_argument("--iterations", type=int, default=200, help="operations per scenario"),
+        parser.add_argument("--concurrency", type=int, default=4, help="concurrent requests in network scenarios"),
+        parser.add_argument("--latency", type=float, default=0.02, help="mock server delay per request, seconds"),
+        parser.add_argument("--jitter", type=float, default=0.0, help="extra random mock latency, up to this many seconds"),
+        parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests that fail"),
+        parser.add_argument("--error-status", type=int, default=503, help="status code for injected failures"),
+        parser.add_argument("--story-chars", type=int, default=4000, help="size of mock stories and parsed responses"),
+        parser.add_argument("--chunk-chars", type=int, default=64, help="characters per streamed event"),
+        parser.add_argument("--pdf-pages", type=int, default=40, help="pages per generated PDF"),
+        parser.add_argument("--pdf-files", type=int, default=3, help="generated PDFs to read"),
+        parser.add_argument("--history-rows", type=int, default=20000, help="stories stored for the history scenario"),
+        parser.add_argument("--examples", type=int, default=12000, help="synthetic examples for the few_shot_lookup scenario"),
+        parser.add_argument("--quota-requests", type=int, default=20, help="mock quota per window for the rate_limited scenario"),
+        parser.add_argument("--quota-window", type=float, default=1.0, help="mock quota window in seconds"),
+        parser.add_argument("--tail-rate", type=float, default=0.03, help="fraction of slow mock requests in the hedged scenario"),
+        parser.add_argument("--tail-latency", type=float, default=0.5, help="extra seconds for those slow requests"),
+        parser.add_argument("--hedge-percentile", type=float, default=95.0, help="latency percentile that triggers a hedge"),
+        parser.add_argument("--hedge-max-extra", type=float, default=0.1, help="most extra requests hedging may add, as a fraction"),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one benchmark scenario and print its result as JSON.")
+    parser.add_argument("name", choices=sorted(SCENARIOS))
+    add_options(parser)
+    options = parser.parse_args(argv)
+
+    result = SCENARIOS[options.name](options)
+    result["peak_rss_mb"] = peak_rss_mb(include_children=True)
+    json.dump(result, sys.stdout)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measures desktop app cold start: an import-time breakdown and time-to-first-paint.
+
+Usage: python -m benchmarks.startup [--runs N] [--top N] [--json results.json]
+
+The import breakdown comes from `python -X importtime`. Time-to-first-paint launches the
+app with STORY_APP_STARTUP_PROBE set, which closes the window right after it is drawn; it
+needs a display and is skipped without one.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_MODULE = "desktop_story_generator"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_breakdown(module=APP_MODULE):
+    """Returns [(cumulative_us, self_us, depth, name)] for every import made by the module."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    return rows
+
+
+def time_to_first_paint(runs):
+    """Launches the app `runs` times and returns the wall-clock seconds until its first paint."""
+    env = dict(os.environ, STORY_APP_STARTUP_PROBE="1", GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "startup-probe"))
+    samples = []
+    for _ in range(runs):
+        launched = time.time()
+        result = subprocess.run([sys.executable, f"{APP_MODULE}.py"], cwd=REPO_ROOT, env=env,
+                                capture_output=True, text=True, timeout=60)
+        marker = next((line for line in result.stdout.splitlines() if line.startswith("FIRST_PAINT")), None)
+        if marker is None:
+            raise RuntimeError((result.stderr.strip().splitlines() or ["app exited without painting"])[-1])
+        samples.append(float(marker.split()[1]) - launched)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure desktop app startup time.")
+    parser.add_argument("--runs", type=int, default=5, help="app launches for time-to-first-paint")
+    parser.add_argument("--top", type=int, default=15, help="imports to list")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    rows = import_breakdown()
+    app_row = next(row for row in rows if row[3] == APP_MODULE)
+    direct = sorted((row for row in rows if row[2] == app_row[2] + 1), reverse=True)
+    print(f"import {APP_MODULE}: {app_row[0] / 1000:.1f} ms")
+    for cumulative_us, self_us, _, name in direct[:args.top]:
+        print(f"  {name:<30} {cumulative_us / 1000:8.1f} ms cumulative {self_us / 1000:8.1f} ms self")
+
+    results = {"import_ms": app_row[0] / 1000,
+               "imports": {name: cumulative_us / 1000 for cumulative_us, _, _, name in direct}}
+    try:
+        samples = time_to_first_paint(args.runs)
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        print(f"time-to-first-paint skipped: {e}")
+    else:
+        results["first_paint_ms"] = [s * 1000 for s in samples]
+        print(f"time-to-first-paint: median {statistics.median(samples) * 1000:.0f} ms, "
+              f"min {min(samples) * 1000:.0f} ms over {len(samples)} runs")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Latency percentiles and memory figures shared by the benchmark scenarios."""
+import sys
+
+from perf_trace import percentile
+
+
+def summarize(latencies, elapsed, operations=None):
+    """Turns per-operation latencies (seconds) and wall time into a result dict in milliseconds."""
+    ordered = sorted(latencies)
+    operations = len(ordered) if operations is None else operations
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "operations": operations,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_per_s": round(operations / elapsed, 2) if elapsed > 0 else None,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else None,
+        "min_ms": ms(ordered[0]) if ordered else None,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else None,
+    }
+
+
+def peak_rss_mb(include_children=False):
+    """Peak resident set size of this process (and optionally its finished children), or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: psutil reports the peak working set if it is installed
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2 ** 20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if include_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+    return round(peak / scale, 1)
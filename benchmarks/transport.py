@@ -0,0 +1,68 @@
+"""Compares a fresh connection per request (the old bare requests.post) with the pooled GeminiClient.
+
+Usage: python -m benchmarks.transport [--requests N] [--latency SECONDS]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import requests
+
+from benchmarks.mock_gemini import MockGeminiServer
+from gemini_client import ClientConfig, GeminiClient
+
+
+def _bare_post(api_base, prompt):
+    url = f"{api_base}/gemini-2.0-flash:generateContent?key=bench"
+    payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    response = requests.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
+    response.raise_for_status()
+    return response.json()
+
+
+def _run(label, server, call, count):
+    server.connections = server.requests = 0
+    timings = []
+    for i in range(count):
+        started = time.perf_counter()
+        call(f"prompt {i}")
+        timings.append(time.perf_counter() - started)
+    return {
+        "mode": label,
+        "requests": count,
+        "connections": server.connections,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": statistics.median(timings) * 1000,
+        "total_s": sum(timings),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="server-side delay per request")
+    args = parser.parse_args(argv)
+
+    server = MockGeminiServer(latency=args.latency).start()
+    try:
+        client = GeminiClient("bench", ClientConfig(api_base=server.api_base))
+        stop_event = threading.Event()
+        results = [
+            _run("new connection per request", server, lambda p: _bare_post(server.api_base, p), args.requests),
+            _run("pooled GeminiClient", server, lambda p: client.generate(p, stop_event), args.requests),
+        ]
+        client.close()
+    finally:
+        server.stop()
+
+    for r in results:
+        print(f"{r['mode']:<28} {r['requests']:>5} requests  {r['connections']:>5} connections  "
+              f"mean {r['mean_ms']:7.2f} ms  p50 {r['p50_ms']:7.2f} ms  total {r['total_s']:6.2f} s")
+    saved = results[0]["mean_ms"] - results[1]["mean_ms"]
+    print(f"Saved {saved:.2f} ms per request by reusing connections.")
+
+
+if __name__ == "__main__":
+    main()
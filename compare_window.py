@@ -0,0 +1,74 @@
+"""Side-by-side view of one topic generated with every prompting method."""
+import tkinter as tk
+from tkinter import scrolledtext
+
+import ttkbootstrap as ttk
+
+METHOD_TITLES = {"zero-shot": "Zero-shot", "few-shot": "Few-shot", "chain-of-thought": "Chain-of-Thought"}
+
+
+def describe_result(result):
+    """One-line latency and token summary for a MethodResult."""
+    if result.error:
+        return f"Failed after {result.latency:.1f} s"
+    if result.from_cache:
+        return "From cache (no tokens used)"
+    usage = result.usage or {}
+    prompt_tokens, output_tokens = usage.get("promptTokenCount"), usage.get("candidatesTokenCount")
+    if prompt_tokens is None and output_tokens is None:
+        return f"{result.latency:.1f} s"
+    return f"{result.latency:.1f} s · {prompt_tokens or 0} prompt / {output_tokens or 0} output tokens"
+
+
+class CompareWindow(ttk.Toplevel):
+    """One column per method, filled in as each result arrives. on_use(method, story) takes a story to the main window."""
+    def __init__(self, master, topic, methods, on_use, on_close):
+        super().__init__(master)
+        self.title(f"Compare methods: {topic[:60]}")
+        self.geometry("1200x640")
+        self.on_use = on_use
+        self.on_close = on_close
+        self.columns = {}
+        self.grid_rowconfigure(0, weight=1)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        for i, method in enumerate(methods):
+            self.grid_columnconfigure(i, weight=1, uniform="method")
+            frame = ttk.Frame(self, padding=(10, 10))
+            frame.grid(row=0, column=i, sticky="nsew")
+            frame.grid_columnconfigure(0, weight=1)
+            frame.grid_rowconfigure(2, weight=1)
+            ttk.Label(frame, text=METHOD_TITLES.get(method, method), font=("Helvetica", 12, "bold")).grid(row=0, column=0, sticky="w")
+            stats = ttk.Label(frame, text="Generating...", font=("Helvetica", 10), bootstyle="info")
+            stats.grid(row=1, column=0, sticky="w", pady=(0, 5))
+            text = scrolledtext.ScrolledText(frame, wrap=tk.WORD, font=("Helvetica", 11), bd=1, relief=tk.SUNKEN)
+            text.grid(row=2, column=0, sticky="nsew")
+            use_button = ttk.Button(frame, text="Use This Story", bootstyle="success", cursor="hand2", state=tk.DISABLED,
+                                    command=lambda m=method: self._use(m))
+            use_button.grid(row=3, column=0, sticky="ew", pady=(5, 0))
+            self.columns[method] = {"stats": stats, "text": text, "button": use_button, "story": None}
+
+    def show_result(self, result):
+        column = self.columns.get(result.method)
+        if column is None:
+            return
+        column["text"].delete(1.0, tk.END)
+        column["text"].insert(tk.END, result.story if result.error is None else result.error)
+        column["stats"].config(text=describe_result(result), bootstyle="danger" if result.error else "success")
+        if result.error is None:
+            column["story"] = result.story
+            column["button"].config(state=tk.NORMAL)
+
+    def show_canceled(self):
+        for column in self.columns.values():
+            if column["story"] is None:
+                column["stats"].config(text="Canceled", bootstyle="warning")
+
+    def _use(self, method):
+        story = self.columns[method]["story"]
+        if story is not None:
+            self.on_use(method, story)
+
+    def close(self):
+        self.on_close()
+        self.destroy()
@@ -1,74 +1,53 @@
 # Updated
+import time
+_PROCESS_START = time.perf_counter()
+
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, filedialog
-import requests
-import json
 import threading
-import pyttsx3
+import json
 import os
+from collections import namedtuple
 from dotenv import load_dotenv
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-import fitz # Import for PDF reading
+# fitz (PDF), pyttsx3 (TTS) and gemini_client (HTTP) are imported on first use to keep startup fast
+import perf_trace
+from app_config import data_path, env_number, estimate_tokens
+from job_queue import BACKGROUND, CANCELED, DONE, FAILED, INTERACTIVE, QUEUED, RUNNING, JobScheduler
+from story_cache import get_default_cache
+from story_history import get_default_history
+from story_parser import StoryStreamParser, parse_generated_story
+from story_prompts import generate_zero_shot_prompt, generate_few_shot_prompt, generate_chain_of_thought_prompt
+from story_view import FrameMonitor, StoryView
 
 # Load environment variables from .env file
 load_dotenv()
 
-# --- PROMPT GENERATION FUNCTIONS ---
-def generate_zero_shot_prompt(user_prompt):
-    """Generates a zero-shot prompt."""
-    return f"Write a short story about: {user_prompt}"
-
-def generate_few_shot_prompt(user_prompt):
-    """Generates a few-shot prompt with concise examples."""
-    return f"""Examples:
-Prompt: Brave knight quest.
-Story: Sir Reginald, brave and true, sought the Dragon's Tear. Through enchanted forests and over treacherous mountains, he faced goblins and riddles. He found the dragon, not fierce, but guarding a single, glowing tear. It healed his ailing village, proving courage comes in many forms.
-
-Prompt: Alien discovery.
-Story: Commander Eva landed on Kepler-186f. Bioluminescent flora pulsed. She met beings of pure light, communicating through shifting patterns. They were a living cosmic library, sharing wisdom through ethereal dances.
-
-Now, write a short story about: {user_prompt}"""
+VoiceInfo = namedtuple("VoiceInfo", ["id", "name", "gender"])
 
-def generate_chain_of_thought_prompt(user_prompt):
-    """Generates a chain-of-thought prompt with concise steps."""
-    return f"""Let's think step by step to create a compelling short story about: {user_prompt}.
-
-1. Character: Define main character, desire, obstacle.
-2. Plot: Outline intro, rising action (obstacle), climax, falling action, resolution.
-3. Setting: Describe atmosphere.
-4. Story: Write, incorporating these elements."""
-
-def get_story_from_gemini(full_prompt, api_key, stop_event):
-    """Calls the Gemini API to generate a story with a stop event."""
-    if not api_key:
-        return "Error: API key is missing. Please set it in a .env file."
-
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-    payload = {"contents": [{"role": "user", "parts": [{"text": full_prompt}]}]}
+def is_failure_text(text):
+    """True for the error and cancellation messages shown in place of a story."""
+    return "Error:" in text or "Could not generate" in text or "Canceled" in text
 
+def load_cached_voices():
+    """Returns the voice list saved by the previous run, or an empty list."""
     try:
-        response = requests.post(api_url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
-        response.raise_for_status()
+        with open(data_path("voices.json"), encoding="utf-8") as file:
+            return [VoiceInfo(*voice) for voice in json.load(file)]
+    except (OSError, ValueError, TypeError):
+        return []
 
-        if stop_event.is_set():
-            return "Generation canceled by user."
-
-        result = response.json()
-
-        if result.get("candidates") and len(result["candidates"]) > 0 and result["candidates"][0].get("content"):
-            return result["candidates"][0]["content"]["parts"][0]["text"]
-        else:
-            error_message = result.get("error", {}).get("message", "Unknown API error.")
-            return f"Could not generate a story. Error: {error_message}"
-    except requests.exceptions.RequestException as e:
-        return f"An error occurred while connecting to the API: {e}"
-    except json.JSONDecodeError:
-        return "Failed to decode JSON response from the API."
-    except Exception as e:
-        return f"An unexpected error occurred: {e}"
+def save_cached_voices(voices):
+    try:
+        with open(data_path("voices.json"), "w", encoding="utf-8") as file:
+            json.dump([list(voice) for voice in voices], file)
+    except OSError:
+        pass
 
 class StoryGeneratorApp:
+    POLL_MS = 50 # how often _poll_jobs applies job updates
+
     def __init__(self, master):
         self.master = master
         self.master.title("AI Story Generator")
@@ -77,19 +56,28 @@ class StoryGeneratorApp:
 
         self.API_KEY = os.getenv("GEMINI_API_KEY")
 
-        # Initialize TTS engine
-        try:
-            self.tts_engine = pyttsx3.init()
-            self.voices = self.tts_engine.getProperty('voices')
-            self.tts_engine_ready = True
-        except Exception as e:
-            self.tts_engine = None
-            self.tts_engine_ready = False
-            messagebox.showwarning("TTS Warning", f"Text-to-Speech engine could not be initialized: {e}\nVoice features will be disabled.")
-
-        # Threading control
-        self.api_stop_event = threading.Event()
-        self.generation_thread = None
+        # The TTS engine starts in the background; until then the voice lists come from the last run's cache
+        self.tts_engine = None
+        self.tts_engine_ready = False
+        self.voices = load_cached_voices()
+        self.narration = None
+        self.narration_stop_event = threading.Event()
+
+        # Generation jobs run on a bounded worker pool; the output shows one of them at a time
+        self.scheduler = JobScheduler(max_workers=env_number("STORY_GENERATION_WORKERS", 2, int))
+        self.displayed_job = None
+        self.queue_panel = None
+        self.progress_running = False
+        self.pdf_reading = False
+        self.history_sidebar = None
+        self.compare_windows = {} # job id -> CompareWindow for "Compare all methods" runs
+        self.pdf_cancel_event = threading.Event()
+        self.source_text = None # Text of an uploaded document, summarized into the prompt at generation time
+
+        # Gaps between _poll_jobs ticks show how long the UI thread was blocked
+        self.frame_monitor = FrameMonitor(self.POLL_MS / 1000)
+        self.perf_panel = None
+        self._pending_status = None # (message, bootstyle) waiting for the next idle pass
 
         # New: Language mapping
         self.language_map = {
@@ -104,9 +92,48 @@ class StoryGeneratorApp:
         self.setup_ui()
         self.update_language_options()
         self.update_tts_options()
+        threading.Thread(target=self._init_tts_thread, daemon=True).start()
+        self._poll_jobs()
+
+    def _init_tts_thread(self):
+        """Initializes the TTS engine and enumerates its voices off the UI thread."""
+        try:
+            with perf_trace.span("tts.init"):
+                import pyttsx3
+                engine = pyttsx3.init()
+                voices = [VoiceInfo(v.id, v.name, v.gender) for v in engine.getProperty('voices')]
+        except Exception as e:
+            self.master.after(0, self._on_tts_failed, e)
+            return
+        save_cached_voices(voices)
+        self.master.after(0, self._on_tts_ready, engine, voices)
+
+    def _on_tts_ready(self, engine, voices):
+        from narration import NarrationPipeline
+        self.tts_engine = engine
+        self.narration = NarrationPipeline(engine)
+        # With cached voices the user could already pick a language, voice and rate; the engine takes those
+        choices_shown = bool(self.voices)
+        self.voices = voices
+        self.tts_engine_ready = True
+        self.update_language_options()
+        if choices_shown:
+            self.set_tts_rate(self.rate_slider.get())
+        else:
+            self.update_tts_options()
+        # A story finished before the engine was ready
+        if self.copy_button.instate(["!disabled"]):
+            self.read_button.config(state=tk.NORMAL)
+
+    def _on_tts_failed(self, error):
+        self.voices = []
+        self.update_language_options()
+        self.update_tts_options()
+        messagebox.showwarning("TTS Warning", f"Text-to-Speech engine could not be initialized: {error}\nVoice features will be disabled.")
 
     def setup_ui(self):
         self.master.grid_columnconfigure(0, weight=1)
+        self.master.grid_columnconfigure(1, weight=0)
         self.master.grid_rowconfigure(5, weight=1)
 
         # --- HEADER FRAME ---
@@ -149,26 +176,49 @@ class StoryGeneratorApp:
         self.method_radio_buttons = [
             ttk.Radiobutton(method_frame, text="Zero-shot", variable=self.prompt_method, value="zero-shot", bootstyle="info, toolbutton"),
             ttk.Radiobutton(method_frame, text="Few-shot", variable=self.prompt_method, value="few-shot", bootstyle="info, toolbutton"),
-            ttk.Radiobutton(method_frame, text="Chain-of-Thought", variable=self.prompt_method, value="chain-of-thought", bootstyle="info, toolbutton")
+            ttk.Radiobutton(method_frame, text="Chain-of-Thought", variable=self.prompt_method, value="chain-of-thought", bootstyle="info, toolbutton"),
+            ttk.Radiobutton(method_frame, text="Long-form", variable=self.prompt_method, value="long-form", bootstyle="info, toolbutton")
         ]
         for i, rb in enumerate(self.method_radio_buttons):
             rb.grid(row=1, column=i, padx=(0, 5) if i == 0 else 5)
 
+        self.stream_output = tk.BooleanVar(value=True)
+        self.stream_check = ttk.Checkbutton(method_frame, text="Stream output", variable=self.stream_output, bootstyle="info, round-toggle")
+        self.stream_check.grid(row=1, column=len(self.method_radio_buttons), padx=(15, 0))
+
+        self.regenerate = tk.BooleanVar(value=False)
+        self.regenerate_check = ttk.Checkbutton(method_frame, text="Regenerate (skip cache)", variable=self.regenerate, bootstyle="info, round-toggle")
+        self.regenerate_check.grid(row=1, column=len(self.method_radio_buttons) + 1, padx=(15, 0))
+
+        self.compare_methods = tk.BooleanVar(value=False)
+        self.compare_check = ttk.Checkbutton(method_frame, text="Compare all methods", variable=self.compare_methods, bootstyle="info, round-toggle")
+        self.compare_check.grid(row=1, column=len(self.method_radio_buttons) + 2, padx=(15, 0))
+
         # --- CONTROL BUTTONS & PROGRESS BAR ---
         control_frame = ttk.Frame(self.master, padding=(10, 5))
         control_frame.grid(row=3, column=0, sticky="ew")
-        control_frame.grid_columnconfigure(0, weight=1)
-        control_frame.grid_columnconfigure(1, weight=1)
-        control_frame.grid_columnconfigure(2, weight=1)
+        for column in (0, 2, 3, 4):
+            control_frame.grid_columnconfigure(column, weight=1)
 
         self.generate_button = ttk.Button(control_frame, text="Generate Story", command=self.start_story_generation, bootstyle="primary", cursor="hand2")
         self.generate_button.grid(row=0, column=0, padx=(0, 5), sticky="ew")
 
+        # Extra variations queue behind interactive work and skip the cache so each one is a new sample
+        variations_frame = ttk.Frame(control_frame)
+        variations_frame.grid(row=0, column=1, padx=5)
+        ttk.Label(variations_frame, text="Variations:", font=("Helvetica", 10)).grid(row=0, column=0, padx=(0, 5))
+        self.variations = tk.IntVar(value=1)
+        self.variations_spinbox = ttk.Spinbox(variations_frame, from_=1, to=10, width=3, textvariable=self.variations, state="readonly")
+        self.variations_spinbox.grid(row=0, column=1)
+
         self.cancel_button = ttk.Button(control_frame, text="Cancel", command=self.cancel_generation, bootstyle="danger", state=tk.DISABLED, cursor="hand2")
-        self.cancel_button.grid(row=0, column=1, padx=(5, 5), sticky="ew")
+        self.cancel_button.grid(row=0, column=2, padx=(5, 5), sticky="ew")
 
         self.clear_button = ttk.Button(control_frame, text="Clear", command=self.clear_fields, bootstyle="secondary", cursor="hand2")
-        self.clear_button.grid(row=0, column=2, padx=(5, 0), sticky="ew")
+        self.clear_button.grid(row=0, column=3, padx=(5, 5), sticky="ew")
+
+        self.queue_button = ttk.Button(control_frame, text="Queue", command=self.open_queue_panel, bootstyle="secondary-outline", cursor="hand2")
+        self.queue_button.grid(row=0, column=4, padx=(5, 0), sticky="ew")
 
         self.progress_bar = ttk.Progressbar(self.master, orient="horizontal", mode="indeterminate", bootstyle="primary")
         self.progress_bar.grid(row=4, column=0, padx=10, pady=(5, 10), sticky="ew")
@@ -186,9 +236,14 @@ class StoryGeneratorApp:
         ttk.Label(output_header_frame, text="Generated Story:", font=("Helvetica", 12, "bold")).grid(row=0, column=0, sticky="w", pady=(0, 5))
         self.copy_button = ttk.Button(output_header_frame, text="Copy", command=self.copy_story, bootstyle="info", cursor="hand2", state=tk.DISABLED)
         self.copy_button.grid(row=0, column=1, sticky="e", padx=(10, 0))
+        self.perf_button = ttk.Button(output_header_frame, text="Performance", command=self.open_perf_panel, bootstyle="secondary-outline", cursor="hand2")
+        self.perf_button.grid(row=0, column=2, sticky="e", padx=(5, 0))
+        self.history_button = ttk.Button(output_header_frame, text="History", command=self.toggle_history, bootstyle="secondary-outline", cursor="hand2")
+        self.history_button.grid(row=0, column=3, sticky="e", padx=(5, 0))
 
         self.story_output = scrolledtext.ScrolledText(output_frame, wrap=tk.WORD, font=("Helvetica", 11), height=15, bd=1, relief=tk.SUNKEN)
         self.story_output.grid(row=1, column=0, sticky="nsew")
+        self.story_view = StoryView(self.story_output)
 
         # --- TTS CONTROLS & SAVE BUTTON ---
         tts_frame = ttk.Frame(self.master, padding=(10, 5))
@@ -240,6 +295,7 @@ class StoryGeneratorApp:
             self.language_combo, self.voice_combo
         ]
         self.controllable_widgets.extend(self.method_radio_buttons)
+        self.controllable_widgets.extend([self.stream_check, self.regenerate_check, self.compare_check, self.variations_spinbox])
 
     def update_prompt_char_count(self, event=None):
         char_count = len(self.prompt_entry.get())
@@ -247,7 +303,7 @@ class StoryGeneratorApp:
 
     def update_language_options(self):
         """Populates the language combobox with available options."""
-        if self.tts_engine_ready:
+        if self.voices:
             available_languages = set()
             for voice in self.voices:
                 lang_code_parts = voice.id.split('_')
@@ -257,8 +313,11 @@ class StoryGeneratorApp:
                         available_languages.add(self.reverse_language_map[lang_code])
             
             sorted_languages = sorted(list(available_languages))
+            self.language_combo.config(state="readonly")
             self.language_combo['values'] = sorted_languages
-            if "English" in sorted_languages:
+            if self.language_combo.get() in sorted_languages:
+                pass # Keep the user's choice when the live voice list replaces the cached one
+            elif "English" in sorted_languages:
                 self.language_combo.set("English")
             elif sorted_languages:
                 self.language_combo.set(sorted_languages[0])
@@ -269,7 +328,7 @@ class StoryGeneratorApp:
 
     def update_voice_options(self, event=None):
         """Populates the voice combobox based on the selected language."""
-        if self.tts_engine_ready:
+        if self.voices:
             selected_language_name = self.language_combo.get()
             selected_lang_code = self.language_map.get(selected_language_name, "en") # Default to English
 
@@ -282,21 +341,27 @@ class StoryGeneratorApp:
             self.voice_combo['values'] = voice_names
             
             if voice_names:
-                self.voice_combo.set(voice_names[0])
-                self.tts_engine.setProperty('voice', filtered_voices[0].id)
+                # Keep the current voice while the language still offers it, e.g. one picked from the cached list
+                current = self.voice_combo.get()
+                index = voice_names.index(current) if current in voice_names else 0
+                self.voice_combo.set(voice_names[index])
+                if self.tts_engine_ready:
+                    self.tts_engine.setProperty('voice', filtered_voices[index].id)
                 self.voice_combo.config(state="readonly")
             else:
                 self.voice_combo.set("No voices found")
                 self.voice_combo.config(state="disabled")
-                self.tts_engine.setProperty('voice', None)
+                if self.tts_engine_ready:
+                    self.tts_engine.setProperty('voice', None)
         else:
             self.voice_combo.config(state="disabled")
             
     def update_tts_options(self):
         """Sets the rate slider value."""
         if self.tts_engine_ready:
+            self.rate_slider.config(state="normal")
             self.rate_slider.set(self.tts_engine.getProperty('rate'))
-        else:
+        elif not self.voices:
             self.rate_slider.config(state="disabled")
 
     def set_tts_voice(self, event):
@@ -312,109 +377,398 @@ class StoryGeneratorApp:
             self.tts_engine.setProperty('rate', int(float(value)))
 
     def show_status(self, message, bootstyle="secondary"):
+        # Only the latest message is drawn, once the UI thread is idle
+        if self._pending_status is None:
+            self.master.after_idle(self._apply_status)
+        self._pending_status = (message, bootstyle)
+
+    def _apply_status(self):
+        message, bootstyle = self._pending_status
+        self._pending_status = None
         self.status_bar.config(text=message, bootstyle=bootstyle)
-        self.master.update_idletasks()
 
     def set_inputs_state(self, state):
         for widget in self.controllable_widgets:
             widget.config(state=state)
         if state == tk.NORMAL:
+            self.variations_spinbox.config(state="readonly")
             self.language_combo.config(state="readonly")
             self.voice_combo.config(state="readonly" if self.voice_combo['values'] else "disabled")
 
     def start_story_generation(self):
+        """Queues the prompt (and any extra variations) and shows the first one as it generates."""
         user_prompt = self.prompt_entry.get().strip()
-        if not user_prompt:
+        if not user_prompt and not self.source_text:
             messagebox.showerror("Input Error", "Please enter a story prompt.")
             return
 
-        self.story_output.delete(1.0, tk.END)
-        self.show_status("Generating story...", "info")
-        self.set_inputs_state(tk.DISABLED)
-        self.cancel_button.config(state=tk.NORMAL)
+        # Snapshot the settings now; workers must not read Tk variables
+        topic = user_prompt or self.pdf_file_label.cget("text") or "source document"
+        request = {
+            "prompt": user_prompt,
+            "topic": topic,
+            "source_text": self.source_text,
+            "method": self.prompt_method.get(),
+            "stream": self.stream_output.get(),
+            "regenerate": self.regenerate.get(),
+        }
+        if self.compare_methods.get():
+            self.start_method_comparison(request)
+            return
+        if request["method"] == "long-form":
+            job = self.scheduler.submit(lambda job: self._longform_job(job, request), f"long-form: {topic[:40]}", INTERACTIVE)
+            self._display_job(job)
+            self.show_status("Outlining the story...", "info")
+            return
+        label = f"{request['method']}: {topic[:40]}"
+        count = self.variations.get()
+
+        job = self.scheduler.submit(lambda job: self._generation_job(job, request), label, INTERACTIVE)
+        for i in range(2, count + 1):
+            variation = dict(request, regenerate=True, stream=False)
+            self.scheduler.submit(lambda job, r=variation: self._generation_job(job, r), f"{label} (variation {i})", BACKGROUND)
+        self._display_job(job)
+        self.show_status("Generating story..." if count == 1 else f"Generating story and {count - 1} more variations...", "info")
+
+    def _display_job(self, job):
+        """Points the output at a job; its streamed text and result will show there."""
+        self.displayed_job = job
+        self.story_view.clear()
+        self.story_view.take_stats()
         self.read_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.DISABLED)
         self.save_button.config(state=tk.DISABLED)
         self.copy_button.config(state=tk.DISABLED)
-        self.progress_bar.start()
-        
-        self.api_stop_event.clear()
-        self.generation_thread = threading.Thread(target=self._generate_story_thread, args=(user_prompt, ))
-        self.generation_thread.start()
+        self._update_job_indicators()
 
-    def _generate_story_thread(self, user_prompt):
-        selected_method = self.prompt_method.get()
+    def _generation_job(self, job, request):
+        """Runs on a scheduler worker. Returns the result shown by _update_gui_after_generation, or None if canceled."""
+        from gemini_client import GeminiError, get_story_result_from_gemini, stream_story_result_from_gemini
+        selected_method = request["method"]
         full_prompt = ""
+        trace_id = perf_trace.start_trace()
 
-        if selected_method == "zero-shot":
-            full_prompt = generate_zero_shot_prompt(user_prompt)
-        elif selected_method == "few-shot":
-            full_prompt = generate_few_shot_prompt(user_prompt)
-        elif selected_method == "chain-of-thought":
-            full_prompt = generate_chain_of_thought_prompt(user_prompt)
+        try:
+            user_prompt = self._prepare_source_prompt(request["prompt"], request["source_text"], job)
+        except GeminiError as e:
+            return {"story": f"Could not summarize the source document. Error: {e}", "from_cache": False, "timing": None}
+
+        with perf_trace.span("prompt.build", method=selected_method):
+            if selected_method == "zero-shot":
+                full_prompt = generate_zero_shot_prompt(user_prompt)
+            elif selected_method == "few-shot":
+                full_prompt = generate_few_shot_prompt(user_prompt)
+            elif selected_method == "chain-of-thought":
+                full_prompt = generate_chain_of_thought_prompt(user_prompt)
+
+        job.post("status", f"Generating story (approx. {int(len(full_prompt)/4)} tokens)...")
+        started = time.perf_counter()
+        if request["stream"]:
+            stream_parser = StoryStreamParser(selected_method)
+            def on_chunk(chunk):
+                reset, text = stream_parser.feed(chunk)
+                if reset or text:
+                    job.post("chunk", text, reset)
+            generated_story, from_cache, model = stream_story_result_from_gemini(full_prompt, self.API_KEY, job.cancel_event,
+                                                                                 on_chunk, regenerate=request["regenerate"])
+            reset, text = stream_parser.flush()
+            if reset or text:
+                job.post("chunk", text, reset)
+        else:
+            generated_story, from_cache, model = get_story_result_from_gemini(full_prompt, self.API_KEY, job.cancel_event,
+                                                                              regenerate=request["regenerate"])
 
-        self.master.after(0, lambda: self.show_status(f"Generating story (approx. {int(len(full_prompt)/4)} tokens)...", "info"))
-        generated_story = get_story_from_gemini(full_prompt, self.API_KEY, self.api_stop_event)
+        if job.canceled:
+            return None
 
-        processed_story_text = self.parse_generated_story(generated_story, selected_method)
-        self.master.after(0, self._update_gui_after_generation, processed_story_text)
+        with perf_trace.span("parse", method=selected_method, chars=len(generated_story)):
+            processed_story_text = self.parse_generated_story(generated_story, selected_method)
+        history = get_default_history()
+        if history is not None and not is_failure_text(processed_story_text):
+            history.add(request["topic"], selected_method, processed_story_text, model=model,
+                        latency=round(time.perf_counter() - started, 3), from_cache=from_cache)
+            job.post("history")
+        return {"story": processed_story_text, "from_cache": from_cache,
+                "timing": {"trace": trace_id, "method": selected_method, "stream": request["stream"]}}
+
+    def _longform_job(self, job, request):
+        """Runs on a scheduler worker: outline, then chapters in parallel, shown and saved in order as they finish."""
+        from gemini_client import GeminiError, describe_error
+        from longform import ChapterFile, default_output_path, format_chapter, generate_longform, longform_settings
+        trace_id = perf_trace.start_trace()
+        chapters, words, workers, retries = longform_settings()
+        output = ChapterFile(default_output_path(request["topic"]))
+        started = time.perf_counter()
+
+        def on_outline(outline):
+            output.write_title(outline)
+            # The streamed pieces add up to exactly LongformResult.text, so the final text is not drawn again
+            job.post("chunk", outline.title, True)
+            job.post("status", f"Writing {len(outline.chapters)} chapters in parallel...")
+
+        def on_chapter(plan, text):
+            output.write_chapter(plan, text)
+            job.post("chunk", "\n\n" + format_chapter(plan, text))
+            job.post("status", f"Chapter {plan.number} done (saving to {output.path})...")
 
-    def parse_generated_story(self, generated_story, selected_method):
-        # Clean markdown
-        processed_story_text = generated_story.replace('**', '').replace('*', '').strip()
-        
-        # Remove extra prompt details based on method
-        if selected_method == "few-shot":
-            story_marker = "Story:"
-            if story_marker in processed_story_text:
-                processed_story_text = processed_story_text.rsplit(story_marker, 1)[-1].strip()
-            # The model might also just continue the text without a 'Story:' marker
-            elif "Now, write a short story about:" in processed_story_text:
-                processed_story_text = processed_story_text.rsplit("Now, write a short story about:", 1)[-1].strip()
-
-        elif selected_method == "chain-of-thought":
-            story_marker = "4. Story:"
-            if story_marker in processed_story_text:
-                processed_story_text = processed_story_text.rsplit(story_marker, 1)[-1].strip()
-            # If marker is not found, attempt to clean up the response
+        try:
+            user_prompt = self._prepare_source_prompt(request["prompt"], request["source_text"], job)
+            result = generate_longform(user_prompt, self.API_KEY, job.cancel_event, chapters, words, workers, retries,
+                                       on_outline, on_chapter, request["regenerate"])
+        except GeminiError as e:
+            if job.canceled:
+                return None
+            return {"story": f"{describe_error(e)}\nChapters finished so far are in {output.path}",
+                    "from_cache": False, "timing": None}
+        history = get_default_history()
+        if history is not None:
+            history.add(request["topic"], "long-form", result.text, model=", ".join(result.models),
+                        latency=round(time.perf_counter() - started, 3))
+            job.post("history")
+        return {"story": result.text, "from_cache": False,
+                "timing": {"trace": trace_id, "method": "long-form", "stream": True}}
+
+    def start_method_comparison(self, request):
+        """Generates the prompt with every method at once and shows the results side by side."""
+        from compare_window import CompareWindow
+        from story_prompts import PROMPT_BUILDERS
+        job = self.scheduler.submit(lambda job: self._compare_job(job, request), f"compare: {request['topic'][:40]}", INTERACTIVE)
+        self.compare_windows[job.id] = CompareWindow(self.master, request["topic"], list(PROMPT_BUILDERS),
+                                                     on_use=self.use_compared_story, on_close=job.cancel)
+        self.show_status("Generating the story with every prompting method...", "info")
+
+    def _compare_job(self, job, request):
+        """Runs on a scheduler worker; each method's MethodResult is posted as it finishes."""
+        from gemini_client import GeminiError
+        from story_compare import compare_methods
+        # A trace of its own, so spans are not filed under the worker's previous generation
+        perf_trace.start_trace()
+        try:
+            user_prompt = self._prepare_source_prompt(request["prompt"], request["source_text"], job)
+        except GeminiError as e:
+            raise RuntimeError(f"Could not summarize the source document. Error: {e}") from e
+        history = get_default_history()
+
+        def on_result(result):
+            job.post("method_result", result)
+            if history is not None and result.error is None:
+                history.add(request["topic"], result.method, result.story, model=result.model,
+                            latency=round(result.latency, 3), usage=result.usage, from_cache=result.from_cache)
+                job.post("history")
+
+        return compare_methods(user_prompt, self.API_KEY, job.cancel_event, on_result,
+                               max_workers=env_number("STORY_COMPARE_WORKERS", 3, int), regenerate=request["regenerate"])
+
+    def _show_comparison(self, job):
+        """Raises a running comparison's window, or reopens a finished one from its results."""
+        from compare_window import CompareWindow
+        window = self.compare_windows.get(job.id)
+        if window is not None and window.winfo_exists():
+            window.lift()
+            return
+        if not isinstance(job.result, list):
+            return # Closed, and so canceled, before it finished
+        window = CompareWindow(self.master, job.label, [result.method for result in job.result],
+                               on_use=self.use_compared_story, on_close=lambda: None)
+        for result in job.result:
+            window.show_result(result)
+
+    def use_compared_story(self, method, story):
+        """Moves a story from the compare window into the main output."""
+        self.displayed_job = None
+        self._update_job_indicators()
+        self._update_gui_after_generation(story)
+        self.show_status(f"Using the {method} story from the comparison.", "success")
+
+    # --- JOB EVENTS (UI thread) ---
+    def _poll_jobs(self):
+        """Applies updates posted by generation jobs, then checks again shortly."""
+        for job, kind, payload in self.scheduler.poll():
+            if kind == "history":
+                if self.history_sidebar is not None:
+                    self.history_sidebar.story_added()
+                continue
+            if job.id in self.compare_windows:
+                self._update_compare_window(job, kind, payload)
+                continue
+            if job is not self.displayed_job:
+                if kind == DONE:
+                    self.show_status(f"Finished: {job.label} ({self.scheduler.pending_count()} still in the queue).", "info")
+                continue
+            if kind == "status":
+                self.show_status(payload[0], "info")
+            elif kind == "chunk":
+                self._append_story_chunk(*payload)
+            elif kind in (DONE, FAILED, CANCELED):
+                self._show_job_result(job)
+        self._update_job_indicators()
+        self.frame_monitor.tick()
+        self.master.after(self.POLL_MS, self._poll_jobs)
+
+    def _update_compare_window(self, job, kind, payload):
+        window = self.compare_windows[job.id]
+        if not window.winfo_exists():
+            del self.compare_windows[job.id]
+            return
+        if kind == "status":
+            self.show_status(payload[0], "info")
+        elif kind == "method_result":
+            window.show_result(payload[0])
+        elif kind == DONE:
+            self.show_status("Comparison finished.", "success")
+        elif kind == FAILED:
+            self.show_status(f"Comparison failed: {job.error}", "danger")
+        elif kind == CANCELED:
+            window.show_canceled()
+            self.show_status("Comparison canceled.", "danger")
+        if kind in (DONE, FAILED, CANCELED):
+            del self.compare_windows[job.id]
+
+    def _show_job_result(self, job):
+        if job.status == CANCELED:
+            self.story_view.set_text("Story generation was canceled.")
+            self.show_status("Generation canceled.", "danger")
+        elif job.status == FAILED:
+            self._update_gui_after_generation(f"An unexpected error occurred: {job.error}")
+        elif job.result is not None:
+            timing = job.result["timing"]
+            if timing:
+                timing = dict(timing, started=job.started)
+            self._update_gui_after_generation(job.result["story"], job.result["from_cache"], timing)
+
+    def show_job(self, job):
+        """Shows a job from the queue view: its result if finished, otherwise its progress from now on."""
+        if job.id in self.compare_windows or isinstance(job.result, list):
+            self._show_comparison(job)
+            return
+        self._display_job(job)
+        if job.status in (DONE, FAILED, CANCELED):
+            if job.status == DONE and job.result is not None:
+                # Already timed when it first finished
+                self._update_gui_after_generation(job.result["story"], job.result["from_cache"])
             else:
-                lines = processed_story_text.split('\n')
-                story_lines = [line for line in lines if not line.strip().startswith(('1.', '2.', '3.', 'Character:', 'Plot:', 'Setting:'))]
-                processed_story_text = '\n'.join(story_lines).strip()
-        
-        return processed_story_text.strip()
-    
-    def _update_gui_after_generation(self, generated_story):
-        self.progress_bar.stop()
-        self.set_inputs_state(tk.NORMAL)
-        self.cancel_button.config(state=tk.DISABLED)
-        self.story_output.delete(1.0, tk.END)
-        self.story_output.insert(tk.END, generated_story)
+                self._show_job_result(job)
+        else:
+            self.show_status(f"Showing {job.label} ({job.status})...", "info")
+
+    def _update_job_indicators(self):
+        pending = self.scheduler.pending_count()
+        self.queue_button.config(text=f"Queue ({pending})" if pending else "Queue")
+        if self.pdf_reading:
+            return # The progress bar and Cancel button belong to the PDF read for now
+        if pending and not self.progress_running:
+            self.progress_bar.start()
+        elif not pending and self.progress_running:
+            self.progress_bar.stop()
+        self.progress_running = bool(pending)
+        job = self.displayed_job
+        self.cancel_button.config(state=tk.NORMAL if job is not None and job.status in (QUEUED, RUNNING) else tk.DISABLED)
+
+    def toggle_history(self):
+        """Shows or hides the history sidebar, creating it on first use."""
+        from history_sidebar import HistorySidebar
+        history = get_default_history()
+        if history is None:
+            self.show_status("Story history is turned off (STORY_HISTORY_DISABLED is set).", "warning")
+            return
+        if self.history_sidebar is None:
+            self.history_sidebar = HistorySidebar(self.master, history, self.open_history_story)
+        elif self.history_sidebar.winfo_ismapped():
+            self.history_sidebar.grid_remove()
+            return
+        else:
+            self.history_sidebar.reload()
+        self.history_sidebar.grid(row=0, column=1, rowspan=8, sticky="nsew")
+
+    def open_history_story(self, record):
+        """Shows a stored story without calling the API."""
+        self.displayed_job = None
+        self._update_job_indicators()
+        self._update_gui_after_generation(record.story)
+        when = time.strftime("%b %d %H:%M", time.localtime(record.created_at))
+        self.show_status(f"Opened from history: {record.method} story from {when}.", "success")
+
+    def open_queue_panel(self):
+        """Opens the queue view, or raises it if it is already open."""
+        from queue_panel import QueuePanel
+        if self.queue_panel is not None and self.queue_panel.winfo_exists():
+            self.queue_panel.lift()
+            return
+        self.queue_panel = QueuePanel(self.master, self.scheduler, self.show_job)
+
+    def _prepare_source_prompt(self, user_prompt, source_text, job):
+        """Reduces an uploaded document, or an oversized typed prompt, to a brief that fits the prompt budget."""
+        from doc_summarizer import DocumentSummarizer, compose_source_prompt
+        from gemini_client import get_client
+
+        summarizer = DocumentSummarizer.for_client(get_client(self.API_KEY))
+        if source_text is None:
+            if estimate_tokens(user_prompt) <= summarizer.brief_tokens:
+                return user_prompt
+            source_text, user_prompt = user_prompt, ""
 
-        if "Error:" in generated_story or "Could not generate" in generated_story or "Canceled" in generated_story:
+        report = lambda message: job.post("status", message)
+        with perf_trace.span("summarize", chars=len(source_text)):
+            brief = summarizer.build_brief(source_text, job.cancel_event, report)
+        return compose_source_prompt(user_prompt, brief)
+
+    def _append_story_chunk(self, chunk, reset=False):
+        """Appends cleaned streamed text to the output while the generation is still live."""
+        self.story_view.append(chunk, reset)
+
+    def parse_generated_story(self, generated_story, selected_method):
+        return parse_generated_story(generated_story, selected_method)
+    
+    @staticmethod
+    def _render_recorder(generated_story, timing):
+        """The set_text callback that records the final render under the generation's trace, or None if untimed."""
+        if not timing:
+            return None
+        trace_id = timing["trace"]
+        def on_rendered(seconds, slices):
+            # Wall time until the last slice is in; the UI stays live in between
+            perf_trace.record("render", seconds, trace_id, chars=len(generated_story), slices=slices)
+        return on_rendered
+
+    def _update_gui_after_generation(self, generated_story, from_cache=False, timing=None):
+        """Shows the final story. timing carries the trace id, start time and labels for the generation's spans."""
+        stream_seconds, stream_slices = self.story_view.take_stats()
+        if timing:
+            trace_id = timing["trace"]
+            if stream_slices:
+                perf_trace.record("render.stream", stream_seconds, trace_id, chunks=stream_slices)
+            perf_trace.record("generation", time.monotonic() - timing["started"], trace_id,
+                              method=timing["method"], stream=timing["stream"], cached=from_cache)
+        self.story_view.set_text(generated_story, self._render_recorder(generated_story, timing))
+
+        if is_failure_text(generated_story):
             self.show_status("Story generation failed or was canceled.", "danger")
         else:
-            self.show_status("Story generated successfully!", "success")
+            if from_cache:
+                stats = get_default_cache().stats()
+                self.show_status(f"Story loaded from cache (hits: {stats['hits']}, misses: {stats['misses']}).", "success")
+            else:
+                self.show_status("Story generated successfully!", "success")
             self.save_button.config(state=tk.NORMAL)
             self.copy_button.config(state=tk.NORMAL)
             if self.tts_engine_ready:
                 self.read_button.config(state=tk.NORMAL)
 
     def cancel_generation(self):
-        self.api_stop_event.set()
-        self.show_status("Canceling story generation...", "warning")
-        if self.generation_thread and self.generation_thread.is_alive():
-            self.progress_bar.stop()
-            self.set_inputs_state(tk.NORMAL)
-            self.cancel_button.config(state=tk.DISABLED)
-            self.story_output.delete(1.0, tk.END)
-            self.story_output.insert(tk.END, "Story generation was canceled.")
-            self.show_status("Generation canceled.", "danger")
+        """Cancels the job shown in the output; other queued jobs keep going."""
+        if self.displayed_job is not None and self.displayed_job.status in (QUEUED, RUNNING):
+            self.show_status("Canceling story generation...", "warning")
+            # The scheduler posts the cancellation, and _poll_jobs resets the output
+            self.displayed_job.cancel()
 
     def clear_fields(self):
         self.prompt_entry.delete(0, tk.END)
-        self.story_output.delete(1.0, tk.END)
+        self.story_view.clear()
         self.pdf_file_label.config(text="")
+        self.source_text = None
+        # Anything still generating stays in the queue view
+        self.displayed_job = None
+        self._update_job_indicators()
         self.char_count_label.config(text="Characters: 0")
         self.save_button.config(state=tk.DISABLED)
         self.read_button.config(state=tk.DISABLED)
@@ -427,7 +781,7 @@ class StoryGeneratorApp:
             messagebox.showwarning("TTS Not Ready", "Text-to-Speech engine is not available.")
             return
 
-        story_text = self.story_output.get(1.0, tk.END).strip()
+        story_text = self.story_view.text().strip()
         if not story_text or "Error:" in story_text or "Canceled" in story_text:
             self.show_status("No story to read.", "warning")
             return
@@ -438,17 +792,19 @@ class StoryGeneratorApp:
         self.copy_button.config(state=tk.DISABLED)
         self.show_status("Reading story...", "info")
 
-        threading.Thread(target=self._read_story_thread, args=(story_text,)).start()
+        self.narration_stop_event = threading.Event()
+        threading.Thread(target=self._read_story_thread, args=(story_text, self.narration_stop_event), daemon=True).start()
 
-    def _read_story_thread(self, text):
-        if self.tts_engine:
-            self.tts_engine.say(text)
-            self.tts_engine.runAndWait()
-        self.master.after(0, self._update_tts_buttons_after_speech)
+    def _read_story_thread(self, text, stop_event):
+        voice_id, rate = self.tts_engine.getProperty('voice'), self.tts_engine.getProperty('rate')
+        report = lambda number, count: self.master.after(0, self.show_status, f"Reading sentence {number} of {count}...", "info")
+        if self.narration.narrate(text, voice_id, rate, stop_event, report):
+            self.master.after(0, self._update_tts_buttons_after_speech)
 
     def stop_reading_story(self):
         if self.tts_engine:
-            self.tts_engine.stop()
+            self.narration_stop_event.set()
+            self.narration.stop()
             self.show_status("Story narration stopped.", "warning")
             self._update_tts_buttons_after_speech()
 
@@ -460,17 +816,25 @@ class StoryGeneratorApp:
         self.show_status("Ready.", "success" if "success" in self.status_bar.cget("bootstyle") else "secondary")
 
     def save_story(self):
-        story_text = self.story_output.get(1.0, tk.END).strip()
+        story_text = self.story_view.text().strip()
         if not story_text:
             messagebox.showwarning("Save Error", "No story to save.")
             return
 
+        filetypes = [("Text files", "*.txt"), ("Markdown files", "*.md")]
+        if self.tts_engine_ready:
+            filetypes.append(("Narration audio (WAV)", "*.wav"))
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("Text files", "*.txt"), ("Markdown files", "*.md"), ("All files", "*.*")],
+            filetypes=filetypes + [("All files", "*.*")],
             title="Save Story As"
         )
-        if file_path:
+        if file_path and file_path.lower().endswith(".wav") and self.tts_engine_ready:
+            self.save_button.config(state=tk.DISABLED)
+            self.read_button.config(state=tk.DISABLED)
+            self.show_status("Rendering narration...", "info")
+            threading.Thread(target=self._export_narration_thread, args=(story_text, file_path), daemon=True).start()
+        elif file_path:
             try:
                 with open(file_path, "w", encoding="utf-8") as file:
                     file.write(story_text)
@@ -478,8 +842,39 @@ class StoryGeneratorApp:
             except Exception as e:
                 self.show_status(f"Failed to save file: {e}", "danger")
 
+    def _export_narration_thread(self, text, file_path):
+        voice_id, rate = self.tts_engine.getProperty('voice'), self.tts_engine.getProperty('rate')
+        report = lambda done, total: self.master.after(0, self.show_status, f"Rendering narration: {done} of {total} sentences...", "info")
+        try:
+            self.narration.export(text, voice_id, rate, file_path, on_progress=report)
+            self.master.after(0, self._finish_narration_export, f"Narration saved to {os.path.basename(file_path)}", "success")
+        except Exception as e:
+            self.master.after(0, self._finish_narration_export, f"Failed to export narration: {e}", "danger")
+
+    def _finish_narration_export(self, message, bootstyle):
+        self.save_button.config(state=tk.NORMAL)
+        self.read_button.config(state=tk.NORMAL)
+        self.show_status(message, bootstyle)
+
+    def close(self):
+        """Stops background generation and narration work and closes the window."""
+        self.scheduler.shutdown()
+        self.narration_stop_event.set()
+        if self.narration:
+            self.narration.close()
+        perf_trace.get_tracer().flush()
+        self.master.destroy()
+
+    def open_perf_panel(self):
+        """Opens the live performance panel, or raises it if it is already open."""
+        from perf_panel import PerfPanel
+        if self.perf_panel is not None and self.perf_panel.winfo_exists():
+            self.perf_panel.lift()
+            return
+        self.perf_panel = PerfPanel(self.master, frame_monitor=self.frame_monitor)
+
     def copy_story(self):
-        story_text = self.story_output.get(1.0, tk.END).strip()
+        story_text = self.story_view.text().strip()
         if story_text:
             self.master.clipboard_clear()
             self.master.clipboard_append(story_text)
@@ -496,29 +891,66 @@ class StoryGeneratorApp:
             return
 
         self.show_status("Reading PDF file...", "info")
-        extracted_text = self.read_pdf_text(file_path)
+        self.set_inputs_state(tk.DISABLED)
+        self.pdf_cancel_event = threading.Event()
+        self.pdf_reading = True
+        self.cancel_button.config(state=tk.NORMAL, command=self.cancel_pdf_ingest)
+        self.progress_bar.stop()
+        self.progress_running = False
+        self.progress_bar.config(mode="determinate", value=0)
+        threading.Thread(target=self._read_pdf_thread, args=(file_path, self.pdf_cancel_event), daemon=True).start()
+
+    def _read_pdf_thread(self, file_path, cancel_event):
+        from pdf_ingest import PDFIngestCanceled, read_pdf_text
+        extracted_text, error = None, None
+        try:
+            extracted_text = read_pdf_text(file_path, lambda done, total: self.master.after(0, self._update_pdf_progress, done, total), cancel_event)
+        except PDFIngestCanceled:
+            pass
+        except Exception as e:
+            error = e
+        self.master.after(0, self._finish_pdf_upload, file_path, extracted_text, error)
+
+    def _update_pdf_progress(self, done, total):
+        if self.pdf_cancel_event.is_set():
+            return
+        self.progress_bar.config(maximum=total, value=done)
+        self.show_status(f"Reading PDF: page {done} of {total}...", "info")
+
+    def cancel_pdf_ingest(self):
+        self.pdf_cancel_event.set()
+        self.show_status("Canceling PDF reading...", "warning")
+
+    def _finish_pdf_upload(self, file_path, extracted_text, error):
+        self.progress_bar.config(mode="indeterminate", value=0)
+        self.set_inputs_state(tk.NORMAL)
+        self.pdf_reading = False
+        self.cancel_button.config(command=self.cancel_generation)
+        self._update_job_indicators()
+
+        if self.pdf_cancel_event.is_set():
+            self.show_status("PDF reading canceled.", "warning")
+            return
+        if error is not None:
+            messagebox.showerror("PDF Error", f"Could not read PDF: {error}")
 
         if extracted_text:
-            self.prompt_entry.delete(0, tk.END)
-            self.prompt_entry.insert(0, extracted_text)
-            self.update_prompt_char_count()
-            self.pdf_file_label.config(text=f"Loaded: {os.path.basename(file_path)}")
-            self.show_status("PDF content loaded into prompt entry.", "success")
+            # Keep the document out of the entry; it is summarized into the prompt when generating
+            self.source_text = extracted_text
+            self.pdf_file_label.config(text=f"Loaded: {os.path.basename(file_path)} (~{len(extracted_text) // 4} tokens)")
+            self.show_status("PDF loaded as source material. Enter a topic, or generate straight from the document.", "success")
         else:
             self.show_status("Failed to read PDF. It might be password-protected or corrupt.", "danger")
+            self.source_text = None
             self.pdf_file_label.config(text="")
 
-    def read_pdf_text(self, pdf_path):
-        try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
-        except Exception as e:
-            messagebox.showerror("PDF Error", f"Could not read PDF: {e}")
-            return None
+def report_first_paint(root):
+    """Records time-to-first-paint. With STORY_APP_STARTUP_PROBE set, prints it and closes the app."""
+    root.update()
+    elapsed = time.perf_counter() - _PROCESS_START
+    if os.getenv("STORY_APP_STARTUP_PROBE"):
+        print(f"FIRST_PAINT {time.time():.6f} {elapsed:.6f}", flush=True)
+        root.destroy()
 
 if __name__ == "__main__":
     if os.getenv("GEMINI_API_KEY") is None:
@@ -527,4 +959,6 @@ if __name__ == "__main__":
         app_theme = "solar"
         root = ttk.Window(themename=app_theme)
         app = StoryGeneratorApp(root)
+        root.protocol("WM_DELETE_WINDOW", app.close)
+        root.after_idle(report_first_paint, root)
         root.mainloop()
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""Map-reduce summarization that turns long source documents into a compact story brief.
+
+Source text is split into token-bounded chunks, the chunks are summarized concurrently
+(each summary is cached by the chunk's hash), and the summaries are reduced into one brief
+that fits the prompt budget of generate_*_prompt. The brief is cached by the document's hash,
+and jobs that need the same brief or chunk summary at the same time share one build of it.
+"""
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app_config import CHARS_PER_TOKEN, env_number, estimate_tokens
+from single_flight import Detached, get_default_flight
+from story_cache import get_default_cache, make_cache_key
+
+CHUNK_SUMMARY_PROMPT = """Summarize this source material for a storyteller. Keep the characters, setting, key events and tone. Use at most {words} words.
+
+{text}"""
+
+REDUCE_PROMPT = """Combine these partial summaries of one document into a single brief for writing a short story. Keep the main characters, setting, central conflict and tone. Use at most {words} words.
+
+{text}"""
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _pieces(text, max_chars):
+    """Yields paragraphs, falling back to sentences and then hard cuts for oversized ones."""
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            if paragraph:
+                yield paragraph
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            for start in range(0, len(sentence), max_chars):
+                yield sentence[start:start + max_chars]
+
+
+def split_into_chunks(text, max_tokens):
+    """Packs the text into chunks of at most max_tokens (estimated), breaking on paragraphs where possible."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks, current, current_len = [], [], 0
+    for piece in _pieces(text, max_chars):
+        if current and current_len + len(piece) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current, current_len = [], 0
+        current.append(piece)
+        current_len += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class DocumentSummarizer:
+    """Reduces source documents to a brief of at most brief_tokens.
+
+    generate(prompt, stop_event) must return the model's text and raise on failure. With a
+    SingleFlight, concurrent requests for the same brief or chunk summary share one build, and
+    a caller that stops waiting raises canceled.
+    """
+    def __init__(self, generate, model, cache=None, chunk_tokens=3000, brief_tokens=500, max_workers=4,
+                 flight=None, canceled=Detached):
+        self.generate = generate
+        self.model = model
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self.brief_tokens = brief_tokens
+        self.max_workers = max_workers
+        self.flight = flight
+        self.canceled = canceled
+
+    @classmethod
+    def for_client(cls, client):
+        """Builds a summarizer on a GeminiClient, configured from STORY_* environment variables."""
+        from gemini_client import GenerationCanceled
+        return cls(lambda prompt, stop_event: client.generate(prompt, stop_event).text,
+                   client.config.model,
+                   cache=get_default_cache(),
+                   chunk_tokens=env_number("STORY_CHUNK_TOKENS", 3000, int),
+                   brief_tokens=env_number("STORY_BRIEF_TOKENS", 500, int),
+                   max_workers=env_number("STORY_SUMMARY_WORKERS", 4, int),
+                   flight=get_default_flight(),
+                   canceled=GenerationCanceled)
+
+    def _words(self, tokens):
+        # A token is roughly three quarters of an English word
+        return max(50, tokens * 3 // 4)
+
+    def _cached(self, key, produce, stop_event):
+        """Returns the cached text for key, or produce(stop_event), built once for concurrent callers and cached."""
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[0]
+
+        def build(call_stop):
+            text = produce(call_stop)
+            if self.cache is not None:
+                self.cache.put(key, self.model, text)
+            return text
+
+        if self.flight is None:
+            return build(stop_event)
+        return self.flight.do(key, build, stop_event, self.canceled)
+
+    def summarize_chunk(self, chunk, stop_event):
+        chunk_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+        words = self._words(self.brief_tokens)
+        key = make_cache_key(chunk_hash, self.model, {"task": "chunk-summary", "words": words})
+        return self._cached(key, lambda call_stop: self.generate(CHUNK_SUMMARY_PROMPT.format(words=words, text=chunk),
+                                                                 call_stop).strip(), stop_event)
+
+    def build_brief(self, text, stop_event=None, progress=None):
+        """Returns text unchanged if it already fits the brief budget, otherwise a map-reduced brief.
+
+        progress(message) is called with human-readable stage updates while this caller builds the brief.
+        """
+        stop_event = stop_event or threading.Event()
+        if estimate_tokens(text) <= self.brief_tokens:
+            return text
+        document_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        key = make_cache_key(document_hash, self.model, {"task": "brief", "words": self._words(self.brief_tokens),
+                                                         "chunk_tokens": self.chunk_tokens})
+        if progress:
+            progress("Summarizing document...")
+        return self._cached(key, lambda call_stop: self._map_reduce(text, call_stop, progress), stop_event)
+
+    def _map_reduce(self, text, stop_event, progress):
+        # Map: summarize chunks concurrently; repeat on the joined summaries until they fit one request
+        mapped = False
+        while estimate_tokens(text) > self.chunk_tokens:
+            mapped = True
+            chunks = split_into_chunks(text, self.chunk_tokens)
+            summaries = [None] * len(chunks)
+            done = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summarize") as pool:
+                futures = {pool.submit(self.summarize_chunk, chunk, stop_event): i for i, chunk in enumerate(chunks)}
+                try:
+                    for future in as_completed(futures):
+                        summaries[futures[future]] = future.result()
+                        done += 1
+                        if progress:
+                            progress(f"Summarizing document: part {done} of {len(chunks)}...")
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            joined = "\n\n".join(summaries)
+            if len(joined) >= len(text):
+                # The model ignored the length limit; stop rather than loop forever
+                joined = joined[:self.chunk_tokens * CHARS_PER_TOKEN]
+            text = joined
+
+        # Reduce: merge the partial summaries into one brief
+        if progress:
+            progress("Condensing document summary...")
+        template = REDUCE_PROMPT if mapped else CHUNK_SUMMARY_PROMPT
+        return self.generate(template.format(words=self._words(self.brief_tokens), text=text), stop_event).strip()
+
+
+def compose_source_prompt(topic, brief):
+    """Combines the user's topic with a document brief into the text handed to generate_*_prompt."""
+    topic = topic.strip() or "a story inspired by the source material"
+    return f"{topic}\n\nBase the story on this brief of the source material:\n{brief}"
@@ -0,0 +1,138 @@
+"""Few-shot example retrieval: a BM25 index over prompt/story pairs, built once in memory.
+
+Term weights are computed when the index is built, so a lookup only sums precomputed
+weights over the postings of the query's few terms and keeps the best k with a heap.
+Terms found in more than half of the examples carry almost no BM25 weight and are left
+out of the index, and each postings list keeps only its MAX_POSTINGS highest-weight
+entries, so a lookup stays well under a millisecond with tens of thousands of examples.
+Only a handful of candidates are ever needed, and they come from the top of those lists.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, namedtuple
+
+from app_config import env_number, estimate_tokens
+
+Example = namedtuple("Example", ["prompt", "story"])
+
+DEFAULT_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "few_shot_examples.jsonl")
+
+MAX_POSTINGS = 256
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about an and are as at be but by for from has have he her his i in is it its of on or she so
+that the their them they this to was were with who write story short tale
+""".split())
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def load_examples(path):
+    """Reads {"prompt": ..., "story": ...} objects, one per line, skipping blank and malformed lines."""
+    examples = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            prompt, story = entry.get("prompt"), entry.get("story")
+            if isinstance(prompt, str) and isinstance(story, str) and prompt.strip() and story.strip():
+                examples.append(Example(prompt.strip(), story.strip()))
+    return examples
+
+
+class ExampleStore:
+    """Ranks stored examples against a topic with BM25 (k1, b) over each example's prompt and story.
+
+    The prompt counts prompt_weight times, since it says what the example is about more
+    directly than the story does.
+    """
+    def __init__(self, examples, k1=1.2, b=0.75, prompt_weight=3):
+        self.examples = list(examples)
+        self._postings = {}  # term -> {example index: BM25 weight}
+        documents = [Counter(tokenize(example.prompt) * prompt_weight + tokenize(example.story))
+                     for example in self.examples]
+        total = len(documents)
+        # Examples made only of stopwords have no terms; they never match, but must not divide by zero
+        average_length = (sum(sum(counts.values()) for counts in documents) / total if total else 0.0) or 1.0
+        frequency = Counter(term for counts in documents for term in counts)
+        for index, counts in enumerate(documents):
+            length_norm = k1 * (1 - b + b * sum(counts.values()) / average_length)
+            for term, count in counts.items():
+                df = frequency[term]
+                if df * 2 > total and total > 1:
+                    continue
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                self._postings.setdefault(term, {})[index] = idf * count * (k1 + 1) / (count + length_norm)
+        for term, postings in self._postings.items():
+            if len(postings) > MAX_POSTINGS:
+                self._postings[term] = dict(heapq.nlargest(MAX_POSTINGS, postings.items(), key=lambda posting: posting[1]))
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_examples(path))
+
+    def __len__(self):
+        return len(self.examples)
+
+    def search(self, topic, k=10):
+        """Returns up to k (score, Example) pairs for the topic, best first. Only examples sharing a term score."""
+        postings = sorted((self._postings[term] for term in set(tokenize(topic)) if term in self._postings),
+                          key=len, reverse=True)
+        if not postings:
+            return []
+        # Start from a copy of the longest list, so the Python-level loop covers only the rest
+        scores = dict(postings[0])
+        for weights in postings[1:]:
+            for index, weight in weights.items():
+                scores[index] = scores.get(index, 0.0) + weight
+        best = heapq.nlargest(k, scores, key=scores.__getitem__)
+        return [(scores[index], self.examples[index]) for index in best]
+
+    def select(self, topic, k=2, token_budget=160, estimate=estimate_tokens):
+        """Picks up to k of the most relevant examples whose combined size fits token_budget.
+
+        Falls back to the first examples in the store when nothing matches the topic.
+        """
+        candidates = [example for _, example in self.search(topic, k * 4)] or self.examples[:k * 4]
+        chosen, used = [], 0
+        for example in candidates:
+            size = estimate(example.prompt) + estimate(example.story)
+            if used + size <= token_budget:
+                chosen.append(example)
+                used += size
+                if len(chosen) == k:
+                    break
+        return tuple(chosen)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_default_store():
+    """Returns the shared store, loaded from STORY_EXAMPLES_PATH or the bundled few_shot_examples.jsonl."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            path = os.getenv("STORY_EXAMPLES_PATH") or DEFAULT_EXAMPLES_PATH
+            try:
+                _default_store = ExampleStore.from_file(path)
+            except OSError:
+                _default_store = ExampleStore([])
+        return _default_store
+
+def few_shot_settings():
+    """(examples per prompt, token budget for them) from STORY_FEW_SHOT_K and STORY_FEW_SHOT_TOKENS."""
+    return env_number("STORY_FEW_SHOT_K", 2, int), env_number("STORY_FEW_SHOT_TOKENS", 160, int)
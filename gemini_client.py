@@ -0,0 +1,594 @@
+"""Pooled, fault-tolerant HTTP client for the Gemini API."""
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import perf_trace
+from app_config import env_flag, env_number, estimate_tokens
+from hedging import HedgePolicy
+from rate_limiter import QuotaPaused, get_default_limiter
+from single_flight import get_default_flight, normalize_prompt
+from story_cache import get_default_cache, make_cache_key
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta/models"
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Upstream failures worth another attempt; anything else in 4xx is the caller's problem
+RETRYABLE_STATUS_CODES = frozenset({500, 502, 503, 504})
+RATE_LIMITED = 429
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)s\s*$")
+
+GenerationResult = namedtuple("GenerationResult", ["text", "model", "usage", "latency"])
+
+
+# --- ERRORS ---
+class GeminiError(Exception):
+    """Base class for failures talking to the Gemini API."""
+
+class GeminiAPIError(GeminiError):
+    """The API answered with an error status or an error body."""
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class RateLimitError(GeminiAPIError):
+    """The API kept answering 429, or asked for a longer wait than the client will make."""
+    def __init__(self, message, retry_after):
+        super().__init__(message, RATE_LIMITED)
+        self.retry_after = retry_after
+
+class GeminiConnectionError(GeminiError):
+    """The API could not be reached, even after retrying."""
+
+class GeminiResponseError(GeminiError):
+    """The API answered with something that is not a usable response."""
+
+class CircuitOpenError(GeminiError):
+    """Requests are being refused because the API has been failing."""
+    def __init__(self, retry_in):
+        super().__init__(f"The Gemini API is unavailable; retrying in {retry_in:.0f}s.")
+        self.retry_in = retry_in
+
+class GenerationCanceled(GeminiError):
+    """The caller's stop event was set before the request finished."""
+    def __init__(self):
+        super().__init__("Generation canceled by user.")
+
+
+# --- CONFIGURATION ---
+class ClientConfig:
+    """Transport settings for GeminiClient. Every field can be overridden from the environment."""
+    def __init__(self, api_base=DEFAULT_API_BASE, model=DEFAULT_MODEL, pool_size=10,
+                 connect_timeout=5.0, read_timeout=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0,
+                 breaker_threshold=5, breaker_reset_timeout=30.0, rate_limit_max_wait=60.0,
+                 hedge=False, hedge_percentile=95.0, hedge_max_extra=0.1, hedge_model=None):
+        self.api_base = api_base.rstrip("/")
+        self.model = model
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self.rate_limit_max_wait = rate_limit_max_wait
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_extra = hedge_max_extra
+        self.hedge_model = hedge_model
+
+    @classmethod
+    def from_env(cls):
+        """Builds a config from GEMINI_* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            api_base=os.getenv("GEMINI_API_BASE") or defaults.api_base,
+            model=os.getenv("GEMINI_MODEL") or defaults.model,
+            pool_size=env_number("GEMINI_POOL_SIZE", defaults.pool_size, int),
+            connect_timeout=env_number("GEMINI_CONNECT_TIMEOUT", defaults.connect_timeout),
+            read_timeout=env_number("GEMINI_READ_TIMEOUT", defaults.read_timeout),
+            max_retries=env_number("GEMINI_MAX_RETRIES", defaults.max_retries, int),
+            backoff_base=env_number("GEMINI_BACKOFF_BASE", defaults.backoff_base),
+            backoff_max=env_number("GEMINI_BACKOFF_MAX", defaults.backoff_max),
+            breaker_threshold=env_number("GEMINI_BREAKER_THRESHOLD", defaults.breaker_threshold, int),
+            breaker_reset_timeout=env_number("GEMINI_BREAKER_RESET", defaults.breaker_reset_timeout),
+            rate_limit_max_wait=env_number("GEMINI_RATE_LIMIT_MAX_WAIT", defaults.rate_limit_max_wait),
+            hedge=env_flag("GEMINI_HEDGE", defaults.hedge),
+            hedge_percentile=env_number("GEMINI_HEDGE_PERCENTILE", defaults.hedge_percentile),
+            hedge_max_extra=env_number("GEMINI_HEDGE_MAX_EXTRA_PERCENT", defaults.hedge_max_extra * 100) / 100,
+            hedge_model=os.getenv("GEMINI_HEDGE_MODEL") or defaults.hedge_model,
+        )
+
+
+# --- CIRCUIT BREAKER ---
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, then lets a single probe through once the reset timeout passes."""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def before_request(self):
+        """Raises CircuitOpenError while the breaker is open."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            elapsed = self._clock() - self._opened_at
+            if self._state == self.OPEN and elapsed >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(max(self.reset_timeout - elapsed, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+# --- TIMED TRANSPORT ---
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        with perf_trace.span("http.connect", host=self.host):
+            super().connect()
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # Covers DNS, TCP and the TLS handshake
+        with perf_trace.span("http.connect", host=self.host):
+            super().connect()
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class _TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose new connections record an http.connect span; reused ones record nothing."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+
+# --- CLIENT ---
+def _extract_chunk_text(event_data):
+    """Returns the text carried by one (possibly partial) response."""
+    candidates = event_data.get("candidates") or []
+    if not candidates or not candidates[0].get("content"):
+        return ""
+    return "".join(part.get("text", "") for part in candidates[0]["content"].get("parts", []))
+
+def _error_message(response):
+    try:
+        return response.json().get("error", {}).get("message") or response.reason
+    except ValueError:
+        return response.reason or f"HTTP {response.status_code}"
+
+def _retry_delay(response):
+    """Seconds the API asked us to wait: the Retry-After header, else a RetryInfo retryDelay in the error body."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        details = response.json().get("error", {}).get("details") or []
+    except (ValueError, AttributeError):
+        return None
+    for detail in details:
+        match = _DURATION.match(str(detail.get("retryDelay", ""))) if isinstance(detail, dict) else None
+        if match:
+            return float(match.group(1))
+    return None
+
+def _close_on_stop(response, stop_event, done_event):
+    """Closes a streaming response as soon as the stop event is set."""
+    while not done_event.is_set():
+        if stop_event.wait(0.05):
+            response.close()
+            return
+
+class GeminiClient:
+    """Keeps a pooled keep-alive session to the Gemini API with timeouts, retries, a circuit breaker and a rate limiter."""
+    def __init__(self, api_key, config=None, limiter=None):
+        self.api_key = api_key
+        self.config = config or ClientConfig.from_env()
+        self.limiter = limiter or get_default_limiter()
+        self.hedger = HedgePolicy(self.config.hedge_percentile, self.config.hedge_max_extra) if self.config.hedge else None
+        self.breaker = CircuitBreaker(self.config.breaker_threshold, self.config.breaker_reset_timeout)
+        self.session = requests.Session()
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=self.config.pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def close(self):
+        self.session.close()
+
+    def _url(self, model, stream):
+        action = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+        return f"{self.config.api_base}/{model}:{action}key={self.api_key}"
+
+    def _settle(self, estimated, usage):
+        if self.limiter is not None:
+            self.limiter.settle(estimated, usage.get("promptTokenCount"))
+
+    def _backoff_delay(self, attempt):
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt)))
+
+    def _post(self, url, payload, stop_event, stream, tokens=0):
+        """Sends one request, retrying transient failures and rate limits. Returns a response with a 2xx status.
+
+        tokens is the estimated prompt size charged to the rate limiter for each attempt. Every
+        attempt that gets past the circuit breaker settles it, so a half-open probe is always released.
+        """
+        body = json.dumps(payload)
+        timeout = (self.config.connect_timeout, self.config.read_timeout)
+        attempt = 0
+        while True:
+            if stop_event.is_set():
+                raise GenerationCanceled()
+            try:
+                # A pause longer than we would wait ourselves (e.g. a daily quota) fails fast for every caller
+                if self.limiter is not None and not self.limiter.acquire(tokens, stop_event,
+                                                                         self.config.rate_limit_max_wait):
+                    raise GenerationCanceled()
+            except QuotaPaused as e:
+                raise RateLimitError(str(e), e.remaining) from None
+            self.breaker.before_request()
+            try:
+                response = self.session.post(url, data=body, timeout=timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.breaker.record_failure()
+                failure = GeminiConnectionError(str(e))
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            else:
+                # elapsed runs from sending the request until the response headers are parsed
+                perf_trace.record("http.ttfb", response.elapsed.total_seconds(),
+                                  status=response.status_code, attempt=attempt)
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response
+                message = _error_message(response)
+                if response.status_code == RATE_LIMITED:
+                    # A quota answer means the API is up; a probe that gets one must not leave the breaker half-open
+                    self.breaker.record_success()
+                    delay = _retry_delay(response)
+                    response.close()
+                    if delay is None:
+                        delay = min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt))
+                    # Every caller sharing the limiter pauses, not just this one, even if this one gives up
+                    if self.limiter is not None:
+                        self.limiter.back_off(delay)
+                    if attempt >= self.config.max_retries or delay > self.config.rate_limit_max_wait:
+                        raise RateLimitError(message, delay)
+                    if self.limiter is None and stop_event.wait(delay):
+                        raise GenerationCanceled()
+                    attempt += 1
+                    continue
+                response.close()
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    # The API is healthy, it just rejected this request
+                    self.breaker.record_success()
+                    raise GeminiAPIError(message, response.status_code)
+                self.breaker.record_failure()
+                failure = GeminiAPIError(message, response.status_code)
+
+            if attempt >= self.config.max_retries:
+                raise failure
+            if stop_event.wait(self._backoff_delay(attempt)):
+                raise GenerationCanceled()
+            attempt += 1
+
+    def generate(self, prompt, stop_event=None, model=None):
+        """Generates a complete response for the prompt, hedging slow requests if the config enables it."""
+        stop_event = stop_event or threading.Event()
+        model = model or self.config.model
+        if self.hedger is not None:
+            return self._generate_hedged(prompt, stop_event, model)
+        return self._generate_once(prompt, stop_event, model)
+
+    def _generate_hedged(self, prompt, stop_event, model):
+        """Races a duplicate request (on hedge_model, if set) against one that outlives the hedge delay.
+
+        The first success wins and the other attempt is stopped; an error only counts once both have failed.
+        """
+        outcomes = queue.SimpleQueue()
+        attempt_stops = []
+
+        def launch(attempt_model, hedged):
+            attempt_stop = threading.Event()
+            attempt_stops.append(attempt_stop)
+            def run():
+                try:
+                    outcomes.put((hedged, self._generate_once(prompt, attempt_stop, attempt_model), None))
+                except Exception as e:
+                    outcomes.put((hedged, None, e))
+            # Each attempt records its spans under the caller's trace
+            threading.Thread(target=contextvars.copy_context().run, args=(run,),
+                             name="gemini-hedge" if hedged else "gemini-primary", daemon=True).start()
+
+        delay = self.hedger.start_request()
+        started = time.perf_counter()
+        launch(model, False)
+        pending, hedge_due, failure = 1, delay is not None, None
+        while pending:
+            timeout = 0.05
+            if hedge_due:
+                timeout = min(timeout, max(0.0, started + delay - time.perf_counter()))
+            try:
+                hedged, result, error = outcomes.get(timeout=timeout)
+            except queue.Empty:
+                if stop_event.is_set():
+                    for attempt_stop in attempt_stops:
+                        attempt_stop.set()
+                    raise GenerationCanceled()
+                if hedge_due and time.perf_counter() - started >= delay:
+                    hedge_due = False
+                    if self.hedger.try_hedge():
+                        perf_trace.record("hedge", delay, model=self.config.hedge_model or model)
+                        launch(self.config.hedge_model or model, True)
+                        pending += 1
+                continue
+            pending -= 1
+            if error is None:
+                for attempt_stop in attempt_stops:
+                    attempt_stop.set() # Abort the loser
+                # From the original request's start, so a winning hedge does not shrink the window
+                self.hedger.observe(time.perf_counter() - started)
+                self.hedger.record_win(hedged)
+                return result
+            failure = failure or error
+            hedge_due = False # A fast failure is not a slow request
+        raise failure
+
+    def _generate_once(self, prompt, stop_event, model):
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        started = time.perf_counter()
+        tokens = estimate_tokens(prompt)
+        # Defer the body so its download is timed apart from time-to-first-byte
+        response = self._post(self._url(model, stream=False), payload, stop_event, stream=True, tokens=tokens)
+        if stop_event.is_set():
+            # Canceled, or a hedge already won: skip the download
+            response.close()
+            raise GenerationCanceled()
+        try:
+            with perf_trace.span("http.download"):
+                content = response.content
+            with perf_trace.span("json.decode", bytes=len(content)):
+                result = json.loads(content)
+        except ValueError:
+            raise GeminiResponseError("Failed to decode JSON response from the API.")
+        finally:
+            response.close()
+
+        if stop_event.is_set():
+            raise GenerationCanceled()
+        usage = result.get("usageMetadata", {})
+        self._settle(tokens, usage)
+        text = _extract_chunk_text(result)
+        if not text:
+            raise GeminiAPIError(result.get("error", {}).get("message", "Unknown API error."))
+        return GenerationResult(text, model, usage, time.perf_counter() - started)
+
+    def stream(self, prompt, stop_event, on_chunk, model=None):
+        """Streams a response, calling on_chunk with each piece of text as it arrives.
+
+        Setting stop_event closes the connection immediately.
+        """
+        model = model or self.config.model
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        started = time.perf_counter()
+        tokens = estimate_tokens(prompt)
+        response = self._post(self._url(model, stream=True), payload, stop_event, stream=True, tokens=tokens)
+
+        # Watch the stop event so a cancel drops the connection instead of waiting for the server
+        done_event = threading.Event()
+        threading.Thread(target=_close_on_stop, args=(response, stop_event, done_event), daemon=True).start()
+
+        parts, usage = [], {}
+        download_started = time.perf_counter()
+        decode_seconds = 0.0
+        try:
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if stop_event.is_set():
+                    break
+                if not line or not line.startswith("data:"):
+                    continue
+                decode_started = time.perf_counter()
+                event_data = json.loads(line[len("data:"):].strip())
+                decode_seconds += time.perf_counter() - decode_started
+                if event_data.get("error"):
+                    raise GeminiAPIError(event_data["error"].get("message", "Unknown API error."))
+                usage = event_data.get("usageMetadata", usage)
+                chunk = _extract_chunk_text(event_data)
+                if chunk:
+                    if not parts:
+                        perf_trace.record("http.first_chunk", time.perf_counter() - started)
+                    parts.append(chunk)
+                    on_chunk(chunk)
+        except json.JSONDecodeError:
+            raise GeminiResponseError("Failed to decode JSON response from the API.")
+        except (requests.exceptions.RequestException, AttributeError, ValueError) as e:
+            # Closing the response from the watcher surfaces here as a broken read
+            if stop_event.is_set():
+                raise GenerationCanceled()
+            raise GeminiConnectionError(str(e))
+        finally:
+            done_event.set()
+            response.close()
+            perf_trace.record("http.download", time.perf_counter() - download_started, chunks=len(parts))
+            perf_trace.record("json.decode", decode_seconds, stream=True)
+            self._settle(tokens, usage)
+
+        if stop_event.is_set():
+            raise GenerationCanceled()
+        if not parts:
+            raise GeminiAPIError("Empty response from the API.")
+        return GenerationResult("".join(parts), model, usage, time.perf_counter() - started)
+
+
+# --- SHARED CLIENT ---
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key):
+    """Returns the process-wide client for an API key, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = GeminiClient(api_key)
+        return client
+
+def describe_error(error):
+    """Turns a client error into the message shown in the story output."""
+    if isinstance(error, GenerationCanceled):
+        return str(error)
+    if isinstance(error, RateLimitError):
+        return (f"Could not generate a story. Error: the Gemini API rate limit was reached; try again in about "
+                f"{max(1, round(error.retry_after))} seconds. Setting GEMINI_RPM and GEMINI_TPM to your quota avoids this.")
+    if isinstance(error, GeminiConnectionError):
+        return f"An error occurred while connecting to the API: {error}"
+    if isinstance(error, GeminiResponseError):
+        return str(error)
+    return f"Could not generate a story. Error: {error}"
+
+def _generate_with_cache(full_prompt, api_key, regenerate, produce, stop_event, flight=None, client=None):
+    """Serves a prompt from the response cache, or calls produce(client, stop_event) and caches its text.
+
+    client defaults to the shared client for api_key. With a SingleFlight, concurrent cache
+    misses for the same normalized prompt, model and hedge model share one produce call.
+    Returns (GenerationResult, from_cache); a cached result has no usage and zero latency. Responses
+    are filed under the requested model but remember the model that wrote them, e.g. a hedge's.
+    """
+    client = client or get_client(api_key)
+    cache = get_default_cache()
+    key = make_cache_key(full_prompt, client.config.model)
+    if cache is not None and not regenerate:
+        cached = cache.get(key)
+        if cached is not None:
+            text, model = cached
+            return GenerationResult(text, model, {}, 0.0), True
+
+    def call(call_stop):
+        result = produce(client, call_stop)
+        if cache is not None:
+            # The key is the one lookups use; the stored model keeps a hedge win credited to the hedge model
+            cache.put(key, result.model, result.text)
+        return result
+
+    if flight is None:
+        return call(stop_event), False
+    flight_key = make_cache_key(normalize_prompt(full_prompt), client.config.model,
+                                {"hedge_model": client.config.hedge_model})
+    return flight.do(flight_key, call, stop_event, GenerationCanceled), False
+
+def generate_story(full_prompt, api_key, stop_event=None, regenerate=False, client=None):
+    """Returns the story for a prompt, raising GeminiError on failure.
+
+    Identical prompts are answered from the on-disk cache, and identical requests already in
+    flight are joined rather than sent again. regenerate skips both, for callers that want a
+    distinct sample, and replaces the cached response. client overrides the shared client.
+    """
+    result, _ = generate_story_result(full_prompt, api_key, stop_event, regenerate, client)
+    return result.text
+
+def generate_story_result(full_prompt, api_key, stop_event=None, regenerate=False, client=None):
+    """Like generate_story, but returns (GenerationResult, from_cache) so callers can see usage and latency."""
+    if not api_key:
+        raise GeminiError("API key is missing. Please set it in a .env file.")
+    stop_event = stop_event or threading.Event()
+    return _generate_with_cache(full_prompt, api_key, regenerate,
+                                lambda client, call_stop: client.generate(full_prompt, call_stop), stop_event,
+                                None if regenerate else get_default_flight(), client)
+
+def stream_story(full_prompt, api_key, stop_event, on_chunk, regenerate=False):
+    """Streams the story for a prompt through on_chunk and returns it, raising GeminiError on failure.
+
+    A cache hit is delivered as a single chunk.
+    """
+    result, _ = stream_story_result(full_prompt, api_key, stop_event, on_chunk, regenerate)
+    return result.text
+
+def stream_story_result(full_prompt, api_key, stop_event, on_chunk, regenerate=False):
+    """Like stream_story, but returns (GenerationResult, from_cache)."""
+    if not api_key:
+        raise GeminiError("API key is missing. Please set it in a .env file.")
+    result, cached = _generate_with_cache(full_prompt, api_key, regenerate,
+                                          lambda client, call_stop: client.stream(full_prompt, call_stop, on_chunk),
+                                          stop_event)
+    if cached:
+        on_chunk(result.text)
+    return result, cached
+
+def _story_or_error(api_key, call):
+    """Runs call() for a (GenerationResult, from_cache) and returns (text, from_cache, model), with failures as error text.
+
+    model is the model that wrote the text, or None for an error.
+    """
+    if not api_key:
+        return "Error: API key is missing. Please set it in a .env file.", False, None
+    try:
+        result, from_cache = call()
+        return result.text, from_cache, result.model
+    except GeminiError as e:
+        return describe_error(e), False, None
+    except Exception as e:
+        return f"An unexpected error occurred: {e}", False, None
+
+def get_story_from_gemini(full_prompt, api_key, stop_event, regenerate=False):
+    """Calls the Gemini API to generate a story with a stop event."""
+    return get_story_result_from_gemini(full_prompt, api_key, stop_event, regenerate)[0]
+
+def get_story_result_from_gemini(full_prompt, api_key, stop_event, regenerate=False):
+    """Like get_story_from_gemini, but returns (story, from_cache, model) for this call alone."""
+    return _story_or_error(api_key, lambda: generate_story_result(full_prompt, api_key, stop_event, regenerate))
+
+def stream_story_from_gemini(full_prompt, api_key, stop_event, on_chunk, regenerate=False):
+    """Streams a story from the Gemini API, calling on_chunk with each piece of text as it arrives."""
+    return stream_story_result_from_gemini(full_prompt, api_key, stop_event, on_chunk, regenerate)[0]
+
+def stream_story_result_from_gemini(full_prompt, api_key, stop_event, on_chunk, regenerate=False):
+    """Like stream_story_from_gemini, but returns (story, from_cache, model) for this call alone."""
+    return _story_or_error(api_key, lambda: stream_story_result(full_prompt, api_key, stop_event, on_chunk, regenerate))
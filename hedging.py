@@ -0,0 +1,72 @@
+"""When to send a duplicate ("hedge") request for a generation that is running unusually long.
+
+The hedge delay is a percentile of recently observed latencies, so only the slow tail is
+duplicated. Each request earns a fraction of a hedge credit, and each hedge spends a whole
+one, so hedges never add more than that fraction of extra load.
+"""
+import threading
+from collections import deque
+
+from perf_trace import percentile
+
+
+class HedgePolicy:
+    """Rolling latency window plus the hedge budget.
+
+    percentile: latency percentile after which a request is hedged.
+    max_extra: hedges allowed per request, e.g. 0.1 for at most 10% extra load.
+    min_samples: latencies needed before any hedging, so a cold start does not hedge everything.
+    min_delay: floor for the hedge delay in seconds.
+    burst: most unspent credit kept, so a quiet spell cannot fund a flood of hedges.
+    """
+    def __init__(self, percentile=95, max_extra=0.1, min_samples=20, min_delay=0.25, window=200, burst=2.0):
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._credit = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds):
+        """Adds the latency of a completed request to the window."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def start_request(self):
+        """Counts a request, earning its share of hedge credit, and returns the hedge delay (None: do not hedge)."""
+        with self._lock:
+            self.requests += 1
+            self._credit = min(self.burst, self._credit + self.max_extra)
+            if len(self._latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, percentile(sorted(self._latencies), self.percentile))
+
+    def try_hedge(self):
+        """Spends a credit on a hedge; False if the extra-load budget is used up."""
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            self.hedges += 1
+            return True
+
+    def record_win(self, hedged):
+        with self._lock:
+            if hedged:
+                self.hedge_wins += 1
+
+    def stats(self):
+        with self._lock:
+            ordered = sorted(self._latencies)
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "samples": len(ordered),
+                "delay": max(self.min_delay, percentile(ordered, self.percentile)) if len(ordered) >= self.min_samples else None,
+            }
@@ -0,0 +1,110 @@
+"""Searchable sidebar over the story history, loading one page at a time as the list scrolls."""
+import time
+import tkinter as tk
+
+import ttkbootstrap as ttk
+
+
+class HistorySidebar(ttk.Frame):
+    """Lists past stories newest first; on_open(record) is called with the full record of a chosen story."""
+    PAGE_SIZE = 50
+    SEARCH_DELAY_MS = 250
+
+    def __init__(self, master, history, on_open, **kwargs):
+        super().__init__(master, padding=(10, 10), **kwargs)
+        self.history = history
+        self.on_open = on_open
+        self._query = ""
+        self._last_id = None   # keyset cursor: id of the oldest row loaded so far
+        self._exhausted = False
+        self._page_pending = False
+        self._search_job = None
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        ttk.Label(self, text="History", font=("Helvetica", 12, "bold")).grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 5))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(self, textvariable=self.search_var, bootstyle="info")
+        search_entry.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        search_entry.bind("<KeyRelease>", self._schedule_search)
+
+        self.table = ttk.Treeview(self, columns=("when", "method"), show="tree headings", height=20, bootstyle="info")
+        self.table.heading("#0", text="Prompt")
+        self.table.column("#0", width=170)
+        self.table.heading("when", text="When")
+        self.table.column("when", width=80)
+        self.table.heading("method", text="Method")
+        self.table.column("method", width=70)
+        self.table.grid(row=2, column=0, sticky="nsew")
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.table.yview)
+        scrollbar.grid(row=2, column=1, sticky="ns")
+        self.table.configure(yscrollcommand=lambda first, last: self._on_scroll(scrollbar, first, last))
+        self.table.bind("<Double-1>", lambda event: self.open_selected())
+
+        button_frame = ttk.Frame(self)
+        button_frame.grid(row=3, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        button_frame.grid_columnconfigure(0, weight=1)
+        button_frame.grid_columnconfigure(1, weight=1)
+        ttk.Button(button_frame, text="Open", command=self.open_selected, bootstyle="info", cursor="hand2").grid(row=0, column=0, sticky="ew", padx=(0, 5))
+        ttk.Button(button_frame, text="Delete", command=self.delete_selected, bootstyle="danger-outline", cursor="hand2").grid(row=0, column=1, sticky="ew", padx=(5, 0))
+
+        self.reload()
+
+    def _on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # Fetch the next page once the view gets near the bottom of what is loaded
+        if float(last) > 0.9 and not self._exhausted and not self._page_pending:
+            self._page_pending = True
+            self.after_idle(self._load_page)
+
+    def _schedule_search(self, event=None):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(self.SEARCH_DELAY_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_job = None
+        query = self.search_var.get().strip()
+        if query != self._query:
+            self._query = query
+            self.reload()
+
+    def reload(self):
+        """Clears the list and loads the first page for the current search."""
+        self.table.delete(*self.table.get_children())
+        self._last_id, self._exhausted = None, False
+        self._load_page()
+
+    def _load_page(self):
+        self._page_pending = False
+        if self._exhausted:
+            return
+        if self._query:
+            entries = self.history.search(self._query, self._last_id, self.PAGE_SIZE)
+        else:
+            entries = self.history.list(self._last_id, self.PAGE_SIZE)
+        if len(entries) < self.PAGE_SIZE:
+            self._exhausted = True
+        for entry in entries:
+            if not self.table.exists(str(entry.id)):
+                when = time.strftime("%b %d %H:%M", time.localtime(entry.created_at))
+                self.table.insert("", tk.END, iid=str(entry.id), text=entry.prompt[:60] or entry.preview[:60],
+                                  values=(when, entry.method))
+        if entries:
+            self._last_id = entries[-1].id
+
+    def story_added(self):
+        """Shows a newly recorded story if the list is at its newest page."""
+        if not self._query and not self.table.yview()[0]:
+            self.reload()
+
+    def open_selected(self):
+        for item in self.table.selection()[:1]:
+            record = self.history.get(int(item))
+            if record is not None:
+                self.on_open(record)
+
+    def delete_selected(self):
+        for item in self.table.selection():
+            self.history.delete(int(item))
+            self.table.delete(item)
@@ -0,0 +1,172 @@
+"""Prioritized background jobs on a bounded worker pool, reporting back through one polled queue.
+
+Each job gets its own cancel event, so canceling one never affects another, and a job that
+finishes after being canceled is simply ignored. Workers never touch Tk: everything a job
+wants to show (progress, streamed text, its result) is posted to the scheduler's event queue,
+which the UI thread drains with poll().
+"""
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+# Lower runs first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+QUEUED, RUNNING, DONE, FAILED, CANCELED = "queued", "running", "done", "failed", "canceled"
+
+
+class Job:
+    """One unit of work. func(job) runs on a worker; it should check job.cancel_event and may job.post() updates."""
+    def __init__(self, job_id, func, label, priority, scheduler):
+        self.id = job_id
+        self.func = func
+        self.label = label
+        self.priority = priority
+        self.cancel_event = threading.Event()
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self._scheduler = scheduler
+
+    @property
+    def canceled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def elapsed(self):
+        """Seconds spent running so far (or in total once finished), or None while queued."""
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+    def post(self, kind, *payload):
+        """Sends an update to the UI thread. Dropped once the job is canceled."""
+        if not self.canceled:
+            self._scheduler.events.put((self, kind, payload))
+
+    def cancel(self):
+        self._scheduler.cancel(self.id)
+
+
+class JobScheduler:
+    """Runs jobs by priority, then submission order, on at most max_workers threads."""
+    def __init__(self, max_workers=2, history=200):
+        self.max_workers = max_workers
+        self.events = queue.SimpleQueue()
+        self._history = history
+        self._ids = itertools.count(1)
+        self._heap = []
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._workers = []
+        self._busy = 0
+        self._shutdown = False
+
+    def submit(self, func, label, priority=INTERACTIVE):
+        """Queues func(job) and returns the Job. Workers start on demand."""
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("The scheduler has been shut down.")
+            job = Job(next(self._ids), func, label, priority, self)
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (priority, job.id, job))
+            if len(self._workers) < self.max_workers and len(self._heap) > len(self._workers) - self._busy:
+                worker = threading.Thread(target=self._work, name=f"job-worker-{len(self._workers) + 1}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify()
+            self._trim_history()
+        self.events.put((job, QUEUED, ()))
+        return job
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED, CANCELED)]
+        for job_id in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[job_id]
+
+    def _next_job(self):
+        with self._condition:
+            while True:
+                while self._heap and self._heap[0][2].status != QUEUED:
+                    heapq.heappop(self._heap) # Canceled while waiting
+                if self._heap:
+                    job = heapq.heappop(self._heap)[2]
+                    job.status, job.started = RUNNING, time.monotonic()
+                    self._busy += 1
+                    return job
+                if self._shutdown:
+                    return None
+                self._condition.wait()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self.events.put((job, RUNNING, ()))
+            try:
+                result, error = job.func(job), None
+            except Exception as e:
+                result, error = None, e
+            with self._condition:
+                self._busy -= 1
+                job.finished = time.monotonic()
+                if job.status == RUNNING:
+                    job.result, job.error = result, error
+                    job.status = FAILED if error is not None else DONE
+            if job.status != CANCELED:
+                self.events.put((job, job.status, ()))
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job. Returns False if it had already finished."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in (QUEUED, RUNNING):
+                return False
+            job.status = CANCELED
+            if job.finished is None and job.started is None:
+                job.finished = time.monotonic()
+            job.cancel_event.set()
+        self.events.put((job, CANCELED, ()))
+        return True
+
+    def cancel_all(self):
+        for job in self.jobs():
+            self.cancel(job.id)
+
+    def jobs(self):
+        """All tracked jobs, oldest first."""
+        with self._condition:
+            return list(self._jobs.values())
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def pending_count(self):
+        """Jobs that are queued or running."""
+        with self._condition:
+            return sum(1 for job in self._jobs.values() if job.status in (QUEUED, RUNNING))
+
+    def poll(self, limit=500):
+        """Drains up to limit (job, kind, payload) events. Call from the UI thread."""
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def shutdown(self):
+        """Cancels everything and lets the workers exit."""
+        self.cancel_all()
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
@@ -0,0 +1,246 @@
+"""Long-form stories: a chain-of-thought outline first, then every chapter generated in parallel.
+
+Each chapter prompt carries the whole outline plus the summaries of the chapters on either
+side, so chapters written at the same time still join up. Finished chapters are handed on
+strictly in order, and a chapter that fails is retried on its own. So is an outline that
+cannot be parsed.
+
+Usage: python longform.py "A lighthouse keeper's secret" [-o story.txt] [--chapters 5] [--words 400]
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+import perf_trace
+from app_config import data_subdir, env_number
+from gemini_client import GeminiError, GeminiResponseError, GenerationCanceled, describe_error, generate_story_result
+from story_parser import parse_generated_story
+from story_prompts import generate_chain_of_thought_prompt
+
+ChapterPlan = namedtuple("ChapterPlan", ["number", "title", "summary"])
+Outline = namedtuple("Outline", ["title", "chapters"])
+LongformResult = namedtuple("LongformResult", ["outline", "chapters", "text", "models"])
+
+_OUTLINE_TITLE = re.compile(r"^\s*Title\s*:\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+_NUMBER_WORDS = {word: number for number, word in enumerate(
+    "one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen "
+    "sixteen seventeen eighteen nineteen twenty".split(), 1)}
+# "Chapter 1: Title - summary", optionally as a list item, with the number in digits or words
+_OUTLINE_CHAPTER = re.compile(r"^\s*(?:(?:[-*•]|\d+[.)])\s*)?Chapter\s+(\d+|" + "|".join(_NUMBER_WORDS) + r")\b"
+                              r"\s*[:.)-]\s*(.+?)(?:\s+[-–—:]|:)\s+(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+_CHAPTER_HEADING = re.compile(r"^\s*(?:#+\s*)?Chapter\s+\d+[^\n]*\n+", re.IGNORECASE)
+
+
+# --- PROMPTS ---
+def build_outline_prompt(topic, chapters):
+    """The chain-of-thought prompt, asking for a chapter outline instead of the story."""
+    return f"""{generate_chain_of_thought_prompt(topic)}
+
+Do not write the story yet. Reply only with an outline of {chapters} chapters in exactly this format:
+Title: <story title>
+Chapter 1: <chapter title> - <two sentences on what happens>
+Chapter 2: <chapter title> - <two sentences on what happens>
+(and so on up to Chapter {chapters})"""
+
+def build_chapter_prompt(topic, outline, index, words):
+    """Prompt for chapter index (0-based) with the outline and its neighbours' summaries as context."""
+    plan = outline.chapters[index]
+    overview = "\n".join(f"Chapter {c.number}: {c.title}" for c in outline.chapters)
+    context = []
+    if index > 0:
+        previous = outline.chapters[index - 1]
+        context.append(f"The previous chapter ({previous.title}): {previous.summary}")
+    if index + 1 < len(outline.chapters):
+        following = outline.chapters[index + 1]
+        context.append(f"The next chapter ({following.title}): {following.summary}")
+    neighbours = "\n".join(context) or "This is the only chapter."
+    return f"""You are writing a story about: {topic}
+Title: {outline.title}
+
+Outline:
+{overview}
+
+{neighbours}
+
+Write Chapter {plan.number}, "{plan.title}": {plan.summary}
+Write about {words} words of story prose only, with no heading or commentary. Start where the previous chapter leaves off and end where the next one picks up."""
+
+def parse_outline(text, chapters):
+    """Reads the title and chapter plans from an outline response. Raises GeminiResponseError if there are none."""
+    cleaned = text.replace("*", "").replace("#", "")
+    title = _OUTLINE_TITLE.search(cleaned)
+    plans, seen = [], set()
+    for match in _OUTLINE_CHAPTER.finditer(cleaned):
+        number = match.group(1).lower()
+        number = int(number) if number.isdigit() else _NUMBER_WORDS[number]
+        if number not in seen:
+            seen.add(number)
+            plans.append(ChapterPlan(number, match.group(2).strip(), match.group(3).strip()))
+    if not plans:
+        raise GeminiResponseError("The outline did not contain any chapters.")
+    plans.sort(key=lambda plan: plan.number)
+    # Renumber so a skipped or repeated number cannot leave a gap in the finished story
+    plans = [ChapterPlan(i, plan.title, plan.summary) for i, plan in enumerate(plans[:chapters], 1)]
+    return Outline(title.group(1).strip() if title else "Untitled", plans)
+
+def clean_chapter(text):
+    return _CHAPTER_HEADING.sub("", parse_generated_story(text, "zero-shot"), count=1).strip()
+
+def format_chapter(plan, text):
+    return f"Chapter {plan.number}: {plan.title}\n\n{text}"
+
+
+# --- GENERATION ---
+def _write_chapter(topic, outline, index, words, api_key, stop_event, retries, regenerate):
+    """Generates one chapter, retrying only this chapter on failure. Returns (text, model)."""
+    prompt = build_chapter_prompt(topic, outline, index, words)
+    for attempt in range(retries + 1):
+        try:
+            with perf_trace.span("longform.chapter", chapter=index + 1, attempt=attempt):
+                # A retry must not be served the response that just failed to parse
+                result, _ = generate_story_result(prompt, api_key, stop_event, regenerate or attempt > 0)
+                text = clean_chapter(result.text)
+            if text:
+                return text, result.model
+            failure = GeminiResponseError("The chapter came back empty.")
+        except GenerationCanceled:
+            raise
+        except GeminiError as e:
+            failure = e
+    raise GeminiError(f"Chapter {index + 1} failed after {retries + 1} attempts: {describe_error(failure)}")
+
+def _write_outline(topic, chapters, api_key, stop_event, retries, regenerate):
+    """Generates and parses the outline, retrying like a chapter. Returns (outline, model)."""
+    prompt = build_outline_prompt(topic, chapters)
+    for attempt in range(retries + 1):
+        try:
+            with perf_trace.span("longform.outline", chapters=chapters, attempt=attempt):
+                # An outline that failed to parse is cached too; a retry must ask again
+                result, _ = generate_story_result(prompt, api_key, stop_event, regenerate or attempt > 0)
+                return parse_outline(result.text, chapters), result.model
+        except GenerationCanceled:
+            raise
+        except GeminiError as e:
+            failure = e
+    raise GeminiError(f"The outline failed after {retries + 1} attempts: {describe_error(failure)}")
+
+def generate_longform(topic, api_key, stop_event=None, chapters=5, words=400, max_workers=4, retries=2,
+                      on_outline=None, on_chapter=None, regenerate=False):
+    """Outlines topic, writes its chapters concurrently and returns a LongformResult.
+
+    on_outline(outline) is called once the outline is ready, and on_chapter(plan, text) once per
+    chapter, in chapter order, from the calling thread. Raises GeminiError if the outline or a
+    chapter cannot be generated; chapters already handed to on_chapter stay delivered.
+    """
+    stop_event = stop_event or threading.Event()
+    outline, outline_model = _write_outline(topic, chapters, api_key, stop_event, retries, regenerate)
+    if on_outline:
+        on_outline(outline)
+
+    # Chapters share their own stop event so one failing for good stops the rest
+    chapters_stop = threading.Event()
+    texts = {}
+    models = [outline_model]
+    next_index = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(outline.chapters))), thread_name_prefix="chapter")
+    try:
+        futures = {pool.submit(_write_chapter, topic, outline, index, words, api_key, chapters_stop, retries, regenerate): index
+                   for index in range(len(outline.chapters))}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            if stop_event.is_set():
+                raise GenerationCanceled()
+            for future in done:
+                texts[futures[future]], model = future.result()
+                if model not in models:
+                    models.append(model)
+            # Hand on every chapter that is now next in line
+            while next_index in texts:
+                if on_chapter:
+                    on_chapter(outline.chapters[next_index], texts[next_index])
+                next_index += 1
+    finally:
+        chapters_stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    ordered = [texts[i] for i in range(len(outline.chapters))]
+    text = outline.title + "\n\n" + "\n\n".join(format_chapter(plan, chapter) for plan, chapter in zip(outline.chapters, ordered))
+    return LongformResult(outline, ordered, text, models)
+
+
+# --- OUTPUT FILE ---
+def default_output_path(topic):
+    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")[:40] or "story"
+    return os.path.join(data_subdir("longform"), f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}.txt")
+
+class ChapterFile:
+    """Appends the title and then each chapter to a text file as soon as it is ready."""
+    def __init__(self, path):
+        self.path = path
+
+    def write_title(self, outline):
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write(outline.title + "\n")
+
+    def write_chapter(self, plan, text):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("\n" + format_chapter(plan, text) + "\n")
+
+def longform_settings():
+    """(chapters, words per chapter, workers, retries per chapter) from STORY_LONGFORM_* variables."""
+    return (env_number("STORY_LONGFORM_CHAPTERS", 5, int), env_number("STORY_LONGFORM_WORDS", 400, int),
+            env_number("STORY_LONGFORM_WORKERS", 4, int), env_number("STORY_LONGFORM_RETRIES", 2, int))
+
+
+def main(argv=None):
+    chapters, words, workers, retries = longform_settings()
+    parser = argparse.ArgumentParser(description="Generate a long-form story chapter by chapter.")
+    parser.add_argument("topic")
+    parser.add_argument("-o", "--output", help="text file to write (default: a new file in the data directory)")
+    parser.add_argument("--chapters", type=int, default=chapters, help=f"chapters in the outline (default {chapters})")
+    parser.add_argument("--words", type=int, default=words, help=f"target words per chapter (default {words})")
+    parser.add_argument("-w", "--workers", type=int, default=workers, help=f"chapters generated at once (default {workers})")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("GEMINI_API_KEY not found. Please create a .env file with GEMINI_API_KEY='YOUR_API_KEY_HERE'", file=sys.stderr)
+        return 2
+
+    output = ChapterFile(args.output or default_output_path(args.topic))
+    stop_event = threading.Event()
+    started = time.perf_counter()
+
+    def on_outline(outline):
+        output.write_title(outline)
+        print(f"Outline: {outline.title} ({len(outline.chapters)} chapters)", file=sys.stderr)
+
+    def on_chapter(plan, text):
+        output.write_chapter(plan, text)
+        print(f"Chapter {plan.number} written ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+    try:
+        generate_longform(args.topic, api_key, stop_event, max(1, args.chapters), args.words, args.workers, retries,
+                          on_outline, on_chapter)
+    except KeyboardInterrupt:
+        stop_event.set()
+        print("Interrupted; chapters finished so far are in " + output.path, file=sys.stderr)
+        return 130
+    except GeminiError as e:
+        print(f"{describe_error(e)}\nChapters finished so far are in {output.path}", file=sys.stderr)
+        return 1
+    print(f"Story written to {output.path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
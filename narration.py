@@ -0,0 +1,289 @@
+"""Sentence-level narration with background pre-rendering and an on-disk audio cache.
+
+The first sentence is spoken straight away on the live TTS engine while a separate worker
+process renders the rest to WAV files with save_to_file. Rendered sentences are cached by
+text, voice and rate, so replays and exports do not synthesize them again; the least recently
+used files are deleted once the cache outgrows its entry or size limit. Playing rendered
+files needs winsound (Windows); elsewhere every sentence is spoken live and rendering only
+happens for exports.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import perf_trace
+from app_config import data_subdir, env_number
+
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+|\n+")
+
+_render_engine = None
+
+
+def split_sentences(text):
+    """Splits text into sentences at terminal punctuation and line breaks."""
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence and sentence.strip()]
+
+
+# --- RENDER WORKER (runs in its own process) ---
+def _init_render_engine():
+    global _render_engine
+    import pyttsx3
+    _render_engine = pyttsx3.init()
+
+
+def _render_sentence(text, voice_id, rate, path):
+    if voice_id:
+        _render_engine.setProperty('voice', voice_id)
+    _render_engine.setProperty('rate', rate)
+    partial_path = path[:-len(".wav")] + ".part.wav"
+    _render_engine.save_to_file(text, partial_path)
+    _render_engine.runAndWait()
+    # Publish atomically so a half-written file is never played
+    os.replace(partial_path, path)
+    return path
+
+
+# --- AUDIO CACHE ---
+class AudioCache:
+    """Rendered sentence audio on disk, keyed by text, voice and rate.
+
+    Holds at most max_entries files and max_bytes of audio, deleting the least recently used
+    files first. Recency survives restarts through the files' modification times.
+    """
+    PARTIAL_MAX_AGE = 3600  # seconds before an unfinished render left by a crash is deleted
+
+    def __init__(self, directory=None, max_entries=2000, max_bytes=256 * 1024 * 1024):
+        self.directory = directory or data_subdir("audio_cache")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # path -> size, least recently used first
+        self._bytes = 0
+        self._load()
+
+    @classmethod
+    def from_env(cls):
+        """Sized by STORY_AUDIO_CACHE_MAX_ENTRIES and STORY_AUDIO_CACHE_MAX_MB (defaults 2000 and 256)."""
+        return cls(max_entries=env_number("STORY_AUDIO_CACHE_MAX_ENTRIES", 2000, int),
+                   max_bytes=int(env_number("STORY_AUDIO_CACHE_MAX_MB", 256) * 1024 * 1024))
+
+    def _load(self):
+        found = []
+        cutoff = time.time() - self.PARTIAL_MAX_AGE
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith(".part.wav"):
+                        if stat.st_mtime < cutoff:
+                            os.remove(path)
+                    elif name.endswith(".wav"):
+                        found.append((stat.st_mtime, path, stat.st_size))
+                except OSError:
+                    continue
+        with self._lock:
+            for _, path, size in sorted(found):
+                self._files[path] = size
+                self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._files and (len(self._files) > self.max_entries or self._bytes > self.max_bytes):
+            path, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def path_for(self, text, voice_id, rate):
+        key = hashlib.sha256(json.dumps([text, voice_id, int(rate)]).encode("utf-8")).hexdigest()
+        shard = os.path.join(self.directory, key[:2])
+        os.makedirs(shard, exist_ok=True)
+        return os.path.join(shard, key + ".wav")
+
+    def get(self, text, voice_id, rate):
+        """Returns the rendered file for a sentence, or None if it has not been rendered."""
+        path = self.path_for(text, voice_id, rate)
+        with self._lock:
+            if not os.path.exists(path):
+                if path in self._files:
+                    self._bytes -= self._files.pop(path)
+                return None
+            if path not in self._files:
+                # Rendered by a render that finished after close(), or by another instance
+                self._files[path] = os.path.getsize(path)
+                self._bytes += self._files[path]
+            self._files.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def add(self, path):
+        """Records a newly rendered file as the most recently used one, evicting older files if over a limit."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+            self._evict()
+
+    def remove_partial(self):
+        """Deletes unfinished renders (*.part.wav) left by sentences that were canceled mid-render."""
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".part.wav"):
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._files), "bytes": self._bytes}
+
+
+# --- PLAYBACK ---
+class WinsoundPlayer:
+    """Plays WAV files asynchronously with the Windows winsound module."""
+    def __init__(self):
+        import winsound
+        self._winsound = winsound
+
+    def play(self, path, stop_event):
+        """Plays a file and blocks until it ends or stop_event is set."""
+        with wave.open(path, "rb") as audio:
+            duration = audio.getnframes() / float(audio.getframerate())
+        self._winsound.PlaySound(path, self._winsound.SND_FILENAME | self._winsound.SND_ASYNC)
+        if stop_event.wait(duration):
+            self.stop()
+
+    def stop(self):
+        self._winsound.PlaySound(None, self._winsound.SND_PURGE)
+
+
+def default_player():
+    """Returns a file player for this platform, or None if rendered audio cannot be played back."""
+    if sys.platform == "win32":
+        try:
+            return WinsoundPlayer()
+        except ImportError:
+            return None
+    return None
+
+
+def concatenate_wav(paths, out_path):
+    """Joins WAV files that share one audio format into a single file."""
+    with wave.open(out_path, "wb") as out:
+        params = None
+        for path in paths:
+            with wave.open(path, "rb") as audio:
+                if params is None:
+                    params = audio.getparams()
+                    out.setparams(params)
+                elif audio.getparams()[:3] != params[:3]:
+                    raise ValueError("Rendered sentences use different audio formats.")
+                out.writeframes(audio.readframes(audio.getnframes()))
+
+
+# --- PIPELINE ---
+class NarrationPipeline:
+    """Speaks text sentence by sentence while pre-rendering upcoming sentences in a worker process."""
+    def __init__(self, engine, cache=None, player=None):
+        self.engine = engine
+        self.cache = cache or AudioCache.from_env()
+        self.player = player if player is not None else default_player()
+        self._renderer = None
+        self._renderer_lock = threading.Lock()
+
+    def _render_pool(self):
+        with self._renderer_lock:
+            if self._renderer is None:
+                self._renderer = ProcessPoolExecutor(max_workers=1, initializer=_init_render_engine)
+            return self._renderer
+
+    def prerender(self, sentences, voice_id, rate):
+        """Queues every uncached sentence for rendering. Returns {sentence: future}."""
+        pool = self._render_pool()
+        futures = {}
+        for sentence in sentences:
+            if sentence not in futures and self.cache.get(sentence, voice_id, rate) is None:
+                path = self.cache.path_for(sentence, voice_id, rate)
+                futures[sentence] = pool.submit(_render_sentence, sentence, voice_id, rate, path)
+                futures[sentence].add_done_callback(lambda future, path=path: self._rendered(future, path))
+        return futures
+
+    def _rendered(self, future, path):
+        if not future.cancelled() and future.exception() is None:
+            self.cache.add(path)
+
+    def narrate(self, text, voice_id, rate, stop_event, on_progress=None):
+        """Speaks the text, stopping at the next sentence boundary once stop_event is set.
+
+        on_progress(sentence_number, sentence_count) is called before each sentence.
+        Returns True if every sentence was spoken.
+        """
+        sentences = split_sentences(text)
+        if self.player:
+            self.prerender(sentences[1:], voice_id, rate)
+        for i, sentence in enumerate(sentences):
+            if stop_event.is_set():
+                return False
+            if on_progress:
+                on_progress(i + 1, len(sentences))
+            path = self.cache.get(sentence, voice_id, rate) if self.player else None
+            with perf_trace.span("tts.sentence", chars=len(sentence), rendered=bool(path)):
+                if path:
+                    self.player.play(path, stop_event)
+                else:
+                    self.engine.say(sentence)
+                    self.engine.runAndWait()
+        return not stop_event.is_set()
+
+    def stop(self):
+        if self.player:
+            self.player.stop()
+        self.engine.stop()
+
+    def export(self, text, voice_id, rate, out_path, stop_event=None, on_progress=None):
+        """Renders any missing sentences and writes the whole narration to one WAV file.
+
+        on_progress(rendered, total) is called as sentences finish. Returns False if stopped.
+        """
+        stop_event = stop_event or threading.Event()
+        sentences = split_sentences(text)
+        with perf_trace.span("tts.export", sentences=len(sentences)) as span_attrs:
+            pending = set(self.prerender(sentences, voice_id, rate).values())
+            span_attrs["rendered"] = len(pending)
+            total = len(set(sentences))
+            while pending:
+                if stop_event.is_set():
+                    span_attrs["canceled"] = True
+                    return False
+                finished, pending = wait(pending, timeout=0.1)
+                for future in finished:
+                    future.result()
+                if on_progress:
+                    on_progress(total - len(pending), total)
+            concatenate_wav([self.cache.path_for(s, voice_id, rate) for s in sentences], out_path)
+        return True
+
+    def close(self):
+        """Stops the render worker without waiting for queued sentences, then removes partial renders."""
+        with self._renderer_lock:
+            if self._renderer is not None:
+                self._renderer.shutdown(wait=False, cancel_futures=True)
+                self._renderer = None
+        self.cache.remove_partial()
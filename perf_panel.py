@@ -0,0 +1,133 @@
+"""Optional window showing live stage latencies recorded by perf_trace."""
+import tkinter as tk
+
+import ttkbootstrap as ttk
+
+import perf_trace
+from rate_limiter import get_default_limiter
+
+# Stages in the order a generation goes through them; anything else is listed after
+STAGE_ORDER = ("generation", "prompt.build", "summarize", "ratelimit.wait", "http.connect", "http.ttfb",
+               "http.first_chunk", "http.download", "json.decode", "parse", "render.stream", "render",
+               "ui.frame", "pdf.read", "tts.init", "tts.sentence", "tts.export")
+
+# Columns of the recent generations table: heading, the spans summed into it
+GENERATION_COLUMNS = (
+    ("Upstream", ("http.ttfb", "http.download")),
+    ("Parse", ("parse",)),
+    ("Render", ("render.stream", "render")),
+)
+
+
+def _ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def describe_budget(budget):
+    """One line summarizing the shared rate limiter's remaining budget."""
+    if budget is None:
+        return "Rate limiting is off (STORY_RATE_LIMIT_DISABLED is set)."
+    parts = []
+    for label, available, limit in (("requests", budget["requests_available"], budget["requests_per_minute"]),
+                                    ("tokens", budget["tokens_available"], budget["tokens_per_minute"])):
+        parts.append(f"{label}: unlimited" if available is None else f"{label}: {available}/{limit} per min")
+    parts.append(f"{budget['waiting']} waiting, {budget['throttled']} throttled (429)")
+    if budget["paused_for"] > 0:
+        parts.append(f"paused {budget['paused_for']:.0f}s after a 429")
+    return "Rate limit - " + "; ".join(parts)
+
+
+def describe_frames(stats):
+    """One line summarizing UI-thread frame gaps from a story_view.FrameMonitor."""
+    if not stats["samples"]:
+        return "UI frames - no samples yet."
+    return (f"UI frames - gap p50 {_ms(stats['p50_ms'])}, p95 {_ms(stats['p95_ms'])}, p99 {_ms(stats['p99_ms'])}, "
+            f"max {_ms(stats['max_ms'])} ms; {stats['slow_frames']} slow")
+
+
+class PerfPanel(ttk.Toplevel):
+    """Per-stage count and p50/p95/p99 latencies, plus a breakdown of the latest generations."""
+    REFRESH_MS = 1000
+
+    def __init__(self, master, tracer=None, frame_monitor=None):
+        super().__init__(master)
+        self.title("Performance")
+        self.geometry("640x520")
+        self.tracer = tracer or perf_trace.get_tracer()
+        self.frame_monitor = frame_monitor
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_rowconfigure(3, weight=1)
+
+        ttk.Label(self, text="Stage latencies (ms, recent window)", font=("Helvetica", 12, "bold")).grid(row=0, column=0, sticky="w", padx=10, pady=(10, 5))
+        columns = ("count", "last", "p50", "p95", "p99")
+        self.stage_table = ttk.Treeview(self, columns=columns, height=10, bootstyle="info")
+        self.stage_table.heading("#0", text="Stage")
+        self.stage_table.column("#0", width=160)
+        for column in columns:
+            self.stage_table.heading(column, text=column)
+            self.stage_table.column(column, width=80, anchor="e")
+        self.stage_table.grid(row=1, column=0, sticky="nsew", padx=10)
+
+        ttk.Label(self, text="Recent generations (ms)", font=("Helvetica", 12, "bold")).grid(row=2, column=0, sticky="w", padx=10, pady=(10, 5))
+        columns = ("method", "total") + tuple(heading for heading, _ in GENERATION_COLUMNS)
+        self.generation_table = ttk.Treeview(self, columns=columns, show="headings", height=6, bootstyle="info")
+        for column in columns:
+            self.generation_table.heading(column, text=column.capitalize())
+            self.generation_table.column(column, width=90, anchor="w" if column == "method" else "e")
+        self.generation_table.grid(row=3, column=0, sticky="nsew", padx=10)
+
+        self.budget_label = ttk.Label(self, text="", font=("Helvetica", 10), bootstyle="info")
+        self.budget_label.grid(row=4, column=0, sticky="w", padx=10, pady=(10, 0))
+
+        self.frame_label = ttk.Label(self, text="", font=("Helvetica", 10), bootstyle="info")
+        self.frame_label.grid(row=5, column=0, sticky="w", padx=10, pady=(5, 0))
+
+        location = self.tracer.trace_path if self.tracer.enabled else "Tracing is off (STORY_TRACE_DISABLED is set)."
+        ttk.Label(self, text=location, font=("Helvetica", 9), bootstyle="secondary").grid(row=6, column=0, sticky="w", padx=10, pady=(5, 10))
+
+        self._refresh_job = None
+        self.refresh()
+
+    def _stage_rows(self):
+        stats = self.tracer.stats()
+        order = {name: i for i, name in enumerate(STAGE_ORDER)}
+        for name in sorted(stats, key=lambda n: (order.get(n, len(order)), n)):
+            row = stats[name]
+            yield name, (row["count"], _ms(row["last_ms"]), _ms(row["p50_ms"]), _ms(row["p95_ms"]), _ms(row["p99_ms"]))
+
+    def _generation_rows(self, limit=10):
+        by_trace = {}
+        for span in self.tracer.recent():
+            if span.get("trace") is not None:
+                by_trace.setdefault(span["trace"], []).append(span)
+        rows = []
+        for spans in by_trace.values():
+            total = next((s for s in spans if s["name"] == "generation"), None)
+            if total is None:
+                continue
+            values = [total.get("method", ""), _ms(total["ms"])]
+            for _, names in GENERATION_COLUMNS:
+                matching = [s["ms"] for s in spans if s["name"] in names]
+                values.append(_ms(sum(matching)) if matching else "-")
+            rows.append(values)
+        return rows[-limit:][::-1]
+
+    def refresh(self):
+        self.stage_table.delete(*self.stage_table.get_children())
+        for name, values in self._stage_rows():
+            self.stage_table.insert("", tk.END, text=name, values=values)
+        self.generation_table.delete(*self.generation_table.get_children())
+        for values in self._generation_rows():
+            self.generation_table.insert("", tk.END, values=values)
+        limiter = get_default_limiter()
+        self.budget_label.config(text=describe_budget(limiter.budget() if limiter is not None else None))
+        if self.frame_monitor is not None:
+            self.frame_label.config(text=describe_frames(self.frame_monitor.stats()))
+        self._refresh_job = self.after(self.REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+        super().destroy()
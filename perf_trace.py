@@ -0,0 +1,209 @@
+"""Timing spans for the hot paths, written to a rotating JSONL trace and a Prometheus text file.
+
+Recording a span costs a perf_counter call and a queue put; a background thread does the
+file writes. Spans recorded while a trace is active (see start_trace) carry its id, so one
+generation's prompt build, network, parse and render stages can be lined up afterwards.
+"""
+import contextlib
+import contextvars
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from app_config import data_subdir, env_number
+
+_current_trace = contextvars.ContextVar("story_trace", default=None)
+_trace_ids = itertools.count(1)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile (q in 0..100, may be a float such as 99.9) of an already sorted list, or None if empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(len(sorted_values) * q / 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Tracer:
+    """Keeps recent spans in memory for the perf panel and streams them to disk."""
+    def __init__(self, directory, max_bytes=5 * 2 ** 20, backups=3, window=500, metrics_interval=5.0, enabled=True):
+        self.enabled = enabled
+        self.trace_path = os.path.join(directory, "spans.jsonl")
+        self.metrics_path = os.path.join(directory, "metrics.prom")
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.metrics_interval = metrics_interval
+        self._window = window
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self._samples = {}  # span name -> deque of recent durations in seconds
+        self._totals = {}   # span name -> [count, sum of seconds] since start
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+
+    # --- RECORDING ---
+    def record(self, name, seconds, trace=None, **attrs):
+        """Records a finished span. trace defaults to the active trace of the calling context."""
+        if not self.enabled:
+            return
+        span = {"name": name, "ms": round(seconds * 1000, 3), "ts": round(time.time(), 3),
+                "trace": trace if trace is not None else _current_trace.get()}
+        span.update(attrs)
+        with self._lock:
+            self._recent.append(span)
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self._window)
+                self._totals[name] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="perf-trace", daemon=True)
+                self._writer.start()
+        self._queue.put(span)
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Times the body of a with block. Spans that raise are recorded with error set."""
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, **attrs)
+
+    # --- READING ---
+    def stats(self):
+        """Returns {span name: {count, last_ms, p50_ms, p95_ms, p99_ms}} over the recent window."""
+        with self._lock:
+            snapshot = {name: (list(samples), self._totals[name][0]) for name, samples in self._samples.items()}
+        result = {}
+        for name, (samples, count) in snapshot.items():
+            ordered = sorted(samples)
+            result[name] = {"count": count, "last_ms": samples[-1] * 1000,
+                            **{f"p{q}_ms": percentile(ordered, q) * 1000 for q in (50, 95, 99)}}
+        return result
+
+    def recent(self, limit=None):
+        """Returns the most recent spans, oldest first."""
+        with self._lock:
+            spans = list(self._recent)
+        return spans[-limit:] if limit else spans
+
+    # --- WRITING ---
+    def _rotate(self):
+        for i in range(self.backups, 0, -1):
+            source = self.trace_path if i == 1 else f"{self.trace_path}.{i - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.trace_path}.{i}")
+
+    def _write_spans(self, spans):
+        try:
+            if os.path.exists(self.trace_path) and os.path.getsize(self.trace_path) >= self.max_bytes:
+                self._rotate()
+            with open(self.trace_path, "a", encoding="utf-8") as file:
+                file.writelines(json.dumps(span) + "\n" for span in spans)
+        except OSError:
+            pass # Tracing must never break the app
+
+    def metrics_text(self):
+        """Prometheus text format: a summary per span name."""
+        with self._lock:
+            snapshot = {name: (sorted(samples), list(self._totals[name])) for name, samples in self._samples.items()}
+        lines = ["# HELP story_span_seconds Duration of story generator stages.",
+                 "# TYPE story_span_seconds summary"]
+        for name, (ordered, (count, total)) in sorted(snapshot.items()):
+            for q in (50, 95, 99):
+                lines.append(f'story_span_seconds{{span="{name}",quantile="{q / 100:g}"}} {percentile(ordered, q):.6f}')
+            lines.append(f'story_span_seconds_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'story_span_seconds_count{{span="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        """Rewrites the Prometheus text file."""
+        text = self.metrics_text()
+        partial_path = self.metrics_path + ".tmp"
+        try:
+            with open(partial_path, "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(partial_path, self.metrics_path)
+        except OSError:
+            pass
+
+    def _write_loop(self):
+        last_metrics, stale = 0.0, False
+        while True:
+            try:
+                spans = [self._queue.get(timeout=self.metrics_interval)]
+            except queue.Empty:
+                # Quiet for a while: make sure the last spans reach the metrics file
+                if stale:
+                    self.write_metrics()
+                    last_metrics, stale = time.monotonic(), False
+                continue
+            # Batch whatever else is already queued into one file write
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(span is None for span in spans):
+                self._write_spans([span for span in spans if span is not None])
+                self.write_metrics()
+                return
+            self._write_spans(spans)
+            stale = True
+            if time.monotonic() - last_metrics >= self.metrics_interval:
+                self.write_metrics()
+                last_metrics, stale = time.monotonic(), False
+
+    def flush(self, timeout=2.0):
+        """Writes everything recorded so far and stops the writer; a later span starts a new one."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join(timeout)
+
+
+# --- SHARED TRACER ---
+_default_tracer = None
+_default_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Returns the process-wide tracer, writing to <data dir>/traces. STORY_TRACE_DISABLED turns it off."""
+    global _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            enabled = not os.getenv("STORY_TRACE_DISABLED")
+            _default_tracer = Tracer(
+                data_subdir("traces") if enabled else "",
+                max_bytes=int(env_number("STORY_TRACE_MAX_MB", 5) * 2 ** 20),
+                backups=env_number("STORY_TRACE_BACKUPS", 3, int),
+                enabled=enabled,
+            )
+        return _default_tracer
+
+def record(name, seconds, trace=None, **attrs):
+    get_tracer().record(name, seconds, trace, **attrs)
+
+def span(name, **attrs):
+    return get_tracer().span(name, **attrs)
+
+def start_trace():
+    """Starts a new trace in the calling context and returns its id."""
+    trace_id = f"{os.getpid()}-{next(_trace_ids)}"
+    _current_trace.set(trace_id)
+    return trace_id
+
+def current_trace():
+    return _current_trace.get()
@@ -0,0 +1,74 @@
+"""Window listing queued, running and finished generation jobs."""
+import ttkbootstrap as ttk
+
+from job_queue import INTERACTIVE
+
+
+class QueuePanel(ttk.Toplevel):
+    """Shows every tracked job; finished ones can be opened in the main window, pending ones canceled."""
+    REFRESH_MS = 500
+
+    def __init__(self, master, scheduler, on_show):
+        super().__init__(master)
+        self.title("Generation Queue")
+        self.geometry("640x360")
+        self.scheduler = scheduler
+        self.on_show = on_show
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        columns = ("job", "priority", "status", "time")
+        self.table = ttk.Treeview(self, columns=columns, show="headings", height=12, bootstyle="info")
+        for column, heading, width, anchor in (("job", "Job", 330, "w"), ("priority", "Priority", 90, "w"),
+                                               ("status", "Status", 90, "w"), ("time", "Time (s)", 80, "e")):
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=width, anchor=anchor)
+        self.table.grid(row=0, column=0, sticky="nsew", padx=10, pady=(10, 5))
+        self.table.bind("<Double-1>", lambda event: self.show_selected())
+
+        button_frame = ttk.Frame(self, padding=(10, 5))
+        button_frame.grid(row=1, column=0, sticky="ew")
+        for i in range(3):
+            button_frame.grid_columnconfigure(i, weight=1)
+        ttk.Button(button_frame, text="Show Story", command=self.show_selected, bootstyle="info", cursor="hand2").grid(row=0, column=0, sticky="ew", padx=(0, 5))
+        ttk.Button(button_frame, text="Cancel Selected", command=self.cancel_selected, bootstyle="danger", cursor="hand2").grid(row=0, column=1, sticky="ew", padx=5)
+        ttk.Button(button_frame, text="Cancel All", command=self.scheduler.cancel_all, bootstyle="danger-outline", cursor="hand2").grid(row=0, column=2, sticky="ew", padx=(5, 0))
+
+        self._refresh_job = None
+        self.refresh()
+
+    def _selected_jobs(self):
+        return [job for job in (self.scheduler.get(int(item)) for item in self.table.selection()) if job is not None]
+
+    def show_selected(self):
+        for job in self._selected_jobs()[:1]:
+            self.on_show(job)
+
+    def cancel_selected(self):
+        for job in self._selected_jobs():
+            job.cancel()
+
+    def refresh(self):
+        jobs = self.scheduler.jobs()
+        shown = {str(job.id) for job in jobs}
+        for item in self.table.get_children():
+            if item not in shown:
+                self.table.delete(item)
+        # Newest first, so a fresh batch of variations is at the top
+        for index, job in enumerate(reversed(jobs)):
+            elapsed = job.elapsed
+            values = (job.label, "interactive" if job.priority == INTERACTIVE else "background", job.status,
+                      "" if elapsed is None else f"{elapsed:.1f}")
+            item = str(job.id)
+            if self.table.exists(item):
+                self.table.item(item, values=values)
+                self.table.move(item, "", index)
+            else:
+                self.table.insert("", index, iid=item, values=values)
+        self._refresh_job = self.after(self.REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+        super().destroy()
@@ -0,0 +1,155 @@
+"""Client-side request and token budgets for the Gemini API, shared by every generation thread.
+
+Two token buckets refill continuously: one holds requests per minute, the other estimated
+prompt tokens per minute. Callers wait in acquire() until both have room, so a burst of
+jobs is spread out instead of being rejected. When the API answers 429 anyway, back_off()
+holds every caller until the delay the server asked for has passed.
+"""
+import os
+import threading
+import time
+
+import perf_trace
+from app_config import env_number
+
+
+class QuotaPaused(Exception):
+    """acquire() will not wait out a 429 pause longer than the caller's max_pause."""
+    def __init__(self, remaining):
+        super().__init__(f"The API quota is exhausted; retrying in {remaining:.0f}s.")
+        self.remaining = remaining
+
+
+class TokenBucket:
+    """capacity units that refill evenly over period seconds, starting initial_fill full.
+
+    The level may go negative after a correction.
+    """
+    def __init__(self, capacity, period, clock, initial_fill=1.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._clock = clock
+        self.level = float(capacity) * initial_fill
+        self._updated = clock()
+
+    def refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+        return self.level
+
+    def wait_time(self, amount):
+        """Seconds until amount units are available (0 if they are now)."""
+        # A single request larger than the whole bucket waits for a full bucket, not forever
+        amount = min(amount, self.capacity)
+        level = self.refill()
+        return 0.0 if level >= amount else (amount - level) / self.rate
+
+
+class RateLimiter:
+    """Blocks callers until the request and token budgets allow another call. A limit of 0 means unlimited.
+
+    Both buckets start initial_fill full. A full start allows a burst on top of the steady rate,
+    so against a sliding-window quota a fresh limiter can briefly send up to twice the quota.
+    """
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, period=60.0, clock=time.monotonic,
+                 initial_fill=1.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._requests = (TokenBucket(requests_per_minute, period, clock, initial_fill)
+                          if requests_per_minute > 0 else None)
+        self._tokens = TokenBucket(tokens_per_minute, period, clock, initial_fill) if tokens_per_minute > 0 else None
+        self._condition = threading.Condition()
+        self._paused_until = 0.0
+        self.waiting = 0
+        self.granted = 0
+        self.throttled = 0       # 429 responses reported through back_off
+        self.wait_seconds = 0.0  # total time callers spent waiting
+
+    def _wait_time(self, tokens):
+        wait = self._paused_until - self._clock()
+        if self._requests is not None:
+            wait = max(wait, self._requests.wait_time(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.wait_time(tokens))
+        return wait
+
+    def acquire(self, tokens=0, stop_event=None, max_pause=None):
+        """Takes one request and tokens from the budget, waiting as needed. Returns False if stop_event is set first.
+
+        Raises QuotaPaused instead of waiting if a back_off() pause has more than max_pause seconds left.
+        """
+        started = time.perf_counter()
+        with self._condition:
+            self.waiting += 1
+            try:
+                while True:
+                    wait = self._wait_time(tokens)
+                    if wait <= 0:
+                        break
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+                    paused_for = self._paused_until - self._clock()
+                    if max_pause is not None and paused_for > max_pause:
+                        raise QuotaPaused(paused_for)
+                    # Short slices so a cancel is noticed promptly
+                    self._condition.wait(min(wait, 0.1))
+                if self._requests is not None:
+                    self._requests.level -= 1
+                if self._tokens is not None:
+                    self._tokens.level -= tokens
+                self.granted += 1
+            finally:
+                self.waiting -= 1
+            waited = time.perf_counter() - started
+            self.wait_seconds += waited
+        if waited > 0.001:
+            perf_trace.record("ratelimit.wait", waited, tokens=tokens)
+        return True
+
+    def settle(self, estimated, actual):
+        """Corrects the token budget once the API reports how many tokens a call really used."""
+        if self._tokens is None or actual is None:
+            return
+        with self._condition:
+            self._tokens.refill()
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level + estimated - actual)
+
+    def back_off(self, seconds):
+        """Holds every caller for at least seconds, after the API reported that a quota was exceeded."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self.throttled += 1
+
+    def budget(self):
+        """Current state for display: remaining requests and tokens (None if unlimited), pause and counters."""
+        with self._condition:
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "requests_available": None if self._requests is None else max(0, int(self._requests.refill())),
+                "tokens_per_minute": self.tokens_per_minute,
+                "tokens_available": None if self._tokens is None else max(0, int(self._tokens.refill())),
+                "paused_for": max(0.0, self._paused_until - self._clock()),
+                "waiting": self.waiting,
+                "granted": self.granted,
+                "throttled": self.throttled,
+                "wait_seconds": self.wait_seconds,
+            }
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+def get_default_limiter():
+    """Returns the process-wide limiter, sized by GEMINI_RPM and GEMINI_TPM (both unlimited by default).
+
+    STORY_RATE_LIMIT_DISABLED also turns off the shared pause after a 429.
+    """
+    global _default_limiter
+    if os.getenv("STORY_RATE_LIMIT_DISABLED"):
+        return None
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter(env_number("GEMINI_RPM", 0, int), env_number("GEMINI_TPM", 0, int))
+        return _default_limiter
@@ -0,0 +1,115 @@
+"""In-flight request coalescing: identical concurrent generations share one upstream call.
+
+The first caller for a key starts the call on its own thread; callers arriving while it runs
+wait for the same result instead of sending a duplicate request. Every caller can still give
+up on its own: cancelling detaches only that caller, and the upstream call is stopped once no
+one is waiting for it any more.
+"""
+import contextvars
+import os
+import threading
+import time
+
+import perf_trace
+
+
+def normalize_prompt(prompt):
+    """Collapses whitespace, so prompts that differ only in spacing or line breaks coalesce."""
+    return " ".join(prompt.split())
+
+
+class Detached(Exception):
+    """Raised to a caller that stopped waiting before the shared call finished."""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.stop = threading.Event()  # set once every caller has detached
+        self.callers = 1
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and hands its outcome to every caller of that key."""
+    def __init__(self, poll_interval=0.05):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.calls = 0      # upstream calls started
+        self.coalesced = 0  # callers that joined a call already in flight
+        self.detached = 0   # callers that left before their call finished
+        self.abandoned = 0  # calls stopped because every caller had left
+
+    def do(self, key, fn, stop_event=None, detached=Detached):
+        """Returns fn(stop_event) for key, or raises its exception, sharing one call among concurrent callers.
+
+        fn runs on a separate thread and gets the call's own stop event, set only when every
+        caller has left. If this caller's stop_event is set first, it detaches and the detached
+        exception class is raised.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                flight.callers += 1
+                self.coalesced += 1
+        if leader:
+            # Run in a copy of the leader's context, so spans recorded by fn keep its trace id
+            threading.Thread(target=contextvars.copy_context().run, args=(self._run, key, flight, fn),
+                             name="single-flight", daemon=True).start()
+        started = time.perf_counter()
+        while not flight.done.wait(self.poll_interval):
+            if stop_event is not None and stop_event.is_set():
+                self._detach(key, flight)
+                raise detached()
+        if not leader:
+            perf_trace.record("singleflight.shared", time.perf_counter() - started)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _run(self, key, flight, fn):
+        try:
+            flight.result = fn(flight.stop)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _detach(self, key, flight):
+        with self._lock:
+            flight.callers -= 1
+            self.detached += 1
+            if flight.callers == 0 and not flight.done.is_set():
+                flight.stop.set()
+                self.abandoned += 1
+                # Later callers start afresh instead of joining a call that is being stopped
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "calls": self.calls, "coalesced": self.coalesced,
+                    "detached": self.detached, "abandoned": self.abandoned}
+
+
+_default_flight = None
+_default_flight_lock = threading.Lock()
+
+def get_default_flight():
+    """Returns the process-wide SingleFlight, or None if STORY_SINGLE_FLIGHT_DISABLED is set."""
+    global _default_flight
+    if os.getenv("STORY_SINGLE_FLIGHT_DISABLED"):
+        return None
+    with _default_flight_lock:
+        if _default_flight is None:
+            _default_flight = SingleFlight()
+        return _default_flight
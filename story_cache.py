@@ -0,0 +1,121 @@
+"""Persistent, content-addressed cache of Gemini responses backed by SQLite."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app_config import data_path, env_number
+
+
+def make_cache_key(prompt, model, settings=None):
+    """Hashes the final prompt text, model name and generation settings into a cache key."""
+    material = json.dumps([prompt, model, settings or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Stores responses by key with size- and age-based eviction.
+
+    Entries older than ttl seconds are treated as misses. Once the cache holds more than
+    max_entries entries or max_bytes of text, the least recently used entries are evicted.
+    """
+    def __init__(self, path, max_entries=5000, max_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+        """)
+        self._conn.commit()
+
+    def get(self, key):
+        """Returns (response, model) for a key, or None on a miss. model is the one that wrote the response."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, model, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0], row[1]
+
+    def put(self, key, model, response):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least recently used until both limits are met
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """Returns the shared on-disk cache, or None when STORY_CACHE_DISABLED is set."""
+    global _default_cache
+    if os.getenv("STORY_CACHE_DISABLED"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(
+                data_path("response_cache.sqlite3"),
+                max_entries=env_number("STORY_CACHE_MAX_ENTRIES", 5000, int),
+                max_bytes=int(env_number("STORY_CACHE_MAX_MB", 64) * 1024 * 1024),
+                ttl=env_number("STORY_CACHE_TTL_HOURS", 7 * 24) * 3600,
+            )
+        return _default_cache
@@ -0,0 +1,52 @@
+"""Runs one topic through several prompting methods at once, reporting each result as it finishes.
+
+The methods share a small thread pool, so the total wait is roughly the slowest method
+rather than the sum of all of them.
+"""
+import contextvars
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from gemini_client import GeminiError, GenerationCanceled, describe_error, generate_story_result
+from story_parser import parse_generated_story
+from story_prompts import PROMPT_BUILDERS, build_prompt
+
+MethodResult = namedtuple("MethodResult", ["method", "story", "latency", "usage", "from_cache", "model", "error"])
+
+
+def run_method(method, topic, api_key, stop_event, regenerate=False):
+    """Generates and parses one method's story. Never raises; failures are reported in error."""
+    started = time.perf_counter()
+    try:
+        result, from_cache = generate_story_result(build_prompt(method, topic), api_key, stop_event, regenerate)
+        story = parse_generated_story(result.text, method)
+        return MethodResult(method, story, time.perf_counter() - started, result.usage, from_cache, result.model, None)
+    except GeminiError as e:
+        return MethodResult(method, None, time.perf_counter() - started, {}, False, None, describe_error(e))
+    except Exception as e:
+        return MethodResult(method, None, time.perf_counter() - started, {}, False, None, f"An unexpected error occurred: {e}")
+
+
+def compare_methods(topic, api_key, stop_event=None, on_result=None, methods=None, max_workers=3, regenerate=False):
+    """Generates topic with every method in methods (default: all) concurrently.
+
+    on_result(MethodResult) is called from a worker thread as each method finishes. Returns the
+    results in method order, or raises GenerationCanceled if stop_event is set first.
+    """
+    stop_event = stop_event or threading.Event()
+    methods = list(methods or PROMPT_BUILDERS)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(methods))), thread_name_prefix="compare") as pool:
+        # Each method runs in a copy of the caller's context, so its spans carry the caller's trace
+        futures = {pool.submit(contextvars.copy_context().run, run_method, method, topic, api_key, stop_event, regenerate): method
+                   for method in methods}
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.method] = result
+            if stop_event.is_set():
+                raise GenerationCanceled()
+            if on_result:
+                on_result(result)
+    return [results[method] for method in methods]
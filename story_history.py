@@ -0,0 +1,127 @@
+"""Persistent history of generated stories with full-text search, backed by SQLite and FTS5.
+
+Every query is bounded by an index: listing and search page newest-first with keyset
+pagination on the story id (WHERE id < last seen id), and list rows carry a short
+preview so the story text itself is only read when a story is opened.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from app_config import data_path
+
+PREVIEW_CHARS = 160
+
+HistoryEntry = namedtuple("HistoryEntry", ["id", "created_at", "prompt", "method", "preview"])
+StoryRecord = namedtuple("StoryRecord", ["id", "created_at", "prompt", "method", "model", "latency",
+                                         "prompt_tokens", "output_tokens", "from_cache", "story"])
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text):
+    """Turns free text into an FTS5 query matching every word as a prefix, with no operator surprises."""
+    return " ".join(f'"{word}"*' for word in _WORD.findall(text))
+
+
+class StoryHistory:
+    """Stores generated stories and pages through them by recency or by full-text match."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS stories (
+                id INTEGER PRIMARY KEY,
+                created_at REAL NOT NULL,
+                prompt TEXT NOT NULL,
+                method TEXT NOT NULL,
+                model TEXT,
+                latency REAL,
+                prompt_tokens INTEGER,
+                output_tokens INTEGER,
+                from_cache INTEGER NOT NULL DEFAULT 0,
+                preview TEXT NOT NULL,
+                story TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(
+                prompt, story, content='stories', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS stories_ai AFTER INSERT ON stories BEGIN
+                INSERT INTO stories_fts (rowid, prompt, story) VALUES (new.id, new.prompt, new.story);
+            END;
+            CREATE TRIGGER IF NOT EXISTS stories_ad AFTER DELETE ON stories BEGIN
+                INSERT INTO stories_fts (stories_fts, rowid, prompt, story) VALUES ('delete', old.id, old.prompt, old.story);
+            END;
+        """)
+        self._conn.commit()
+
+    def add(self, prompt, method, story, model=None, latency=None, usage=None, from_cache=False):
+        """Records a story and returns its id."""
+        usage = usage or {}
+        preview = " ".join(story[:PREVIEW_CHARS * 2].split())[:PREVIEW_CHARS]
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO stories (created_at, prompt, method, model, latency, prompt_tokens, output_tokens, "
+                "from_cache, preview, story) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), prompt, method, model, latency, usage.get("promptTokenCount"),
+                 usage.get("candidatesTokenCount"), int(from_cache), preview, story))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def list(self, before_id=None, limit=50):
+        """Returns up to limit entries, newest first, older than before_id if given."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, prompt, method, preview FROM stories WHERE id < ? ORDER BY id DESC LIMIT ?",
+                (before_id if before_id is not None else 2 ** 63 - 1, limit)).fetchall()
+        return [HistoryEntry(*row) for row in rows]
+
+    def search(self, text, before_id=None, limit=50):
+        """Returns up to limit entries whose prompt or story match every word in text, newest first."""
+        query = fts_query(text)
+        if not query:
+            return self.list(before_id, limit)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.id, s.created_at, s.prompt, s.method, s.preview FROM stories_fts "
+                "JOIN stories s ON s.id = stories_fts.rowid "
+                "WHERE stories_fts MATCH ? AND stories_fts.rowid < ? ORDER BY stories_fts.rowid DESC LIMIT ?",
+                (query, before_id if before_id is not None else 2 ** 63 - 1, limit)).fetchall()
+        return [HistoryEntry(*row) for row in rows]
+
+    def get(self, story_id):
+        """Returns the full record for a story, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created_at, prompt, method, model, latency, prompt_tokens, output_tokens, from_cache, story "
+                "FROM stories WHERE id = ?", (story_id,)).fetchone()
+        return StoryRecord(*row[:8], bool(row[8]), row[9]) if row else None
+
+    def delete(self, story_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM stories WHERE id = ?", (story_id,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_history = None
+_default_history_lock = threading.Lock()
+
+def get_default_history():
+    """Returns the shared history database, or None when STORY_HISTORY_DISABLED is set."""
+    global _default_history
+    if os.getenv("STORY_HISTORY_DISABLED"):
+        return None
+    with _default_history_lock:
+        if _default_history is None:
+            _default_history = StoryHistory(data_path("history.sqlite3"))
+        return _default_history
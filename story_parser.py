@@ -0,0 +1,155 @@
+"""Post-processing of model responses into clean story text.
+
+parse_generated_story strips markdown emphasis and any echoed prompt scaffolding with
+precompiled tables and patterns, copying only the part of the response it returns.
+StoryStreamParser does the same for a streamed response, one chunk at a time.
+"""
+import re
+
+_STRIP_MARKDOWN = str.maketrans("", "", "*")
+
+FEW_SHOT_MARKERS = ("Story:", "Now, write a short story about:")
+CHAIN_OF_THOUGHT_MARKERS = ("4. Story:",)
+SCAFFOLD_PREFIXES = ("1.", "2.", "3.", "Character:", "Plot:", "Setting:")
+
+# A chain-of-thought scaffold line together with the newline in front of it
+_SCAFFOLD_LINE = re.compile(r"\n[^\S\n]*(?:[123]\.|Character:|Plot:|Setting:)[^\n]*")
+
+_METHOD_MARKERS = {
+    "few-shot": FEW_SHOT_MARKERS,
+    "chain-of-thought": CHAIN_OF_THOUGHT_MARKERS,
+}
+
+
+def _drop_scaffold_lines(text):
+    return _SCAFFOLD_LINE.sub("", "\n" + text)
+
+
+def parse_generated_story(generated_story, selected_method):
+    """Strips markdown and any echoed prompt scaffolding from a generated story."""
+    cleaned = None
+    for marker in _METHOD_MARKERS.get(selected_method, ()):
+        position = generated_story.rfind(marker) if cleaned is None else -1
+        if position >= 0:
+            # Only the text after the last literal marker needs cleaning
+            story = generated_story[position + len(marker):].translate(_STRIP_MARKDOWN)
+            # ...but a marker broken up by emphasis, like "St*ory:", may still follow it
+            position = story.rfind(marker)
+            return (story if position < 0 else story[position + len(marker):]).strip()
+        if cleaned is not None or "*" in generated_story:
+            if cleaned is None:
+                cleaned = generated_story.translate(_STRIP_MARKDOWN)
+            position = cleaned.rfind(marker)
+            if position >= 0:
+                return cleaned[position + len(marker):].strip()
+
+    story = cleaned if cleaned is not None else generated_story.translate(_STRIP_MARKDOWN)
+    if selected_method == "chain-of-thought":
+        # No story marker: drop the step-by-step lines and keep the rest
+        story = _drop_scaffold_lines(story)
+    return story.strip()
+
+
+class StoryStreamParser:
+    """Cleans a streamed response incrementally for display.
+
+    feed(chunk) returns (reset, text). When reset is True a later marker has made everything
+    shown so far obsolete and text replaces it; otherwise text is appended. Once the stream
+    ends, flush() returns one more (reset, text) with anything still held back, so the streamed
+    text ends up equal to finish(), which is parse_generated_story on the whole response.
+    """
+    def __init__(self, selected_method):
+        self.selected_method = selected_method
+        self._markers = _METHOD_MARKERS.get(selected_method, ())
+        self._overlap = max((len(m) for m in self._markers), default=1) - 1
+        self._filter_lines = selected_method == "chain-of-thought"
+        self._chunks = []
+        self._tail = ""          # end of the cleaned stream, for markers split across chunks
+        self._active_rank = None # priority of the marker the shown text starts after
+        self._line = ""          # start of a line that may still turn out to be scaffolding
+        self._line_state = None  # "keep" or "drop" once the current line is decided
+        self._space = ""         # trailing whitespace held back until more text follows
+        self._started = False
+        self._shown = []         # text handed out since the last reset
+
+    def _find_marker(self, window):
+        """Returns the text after the best new marker in window, or None."""
+        for rank, marker in enumerate(self._markers):
+            if self._active_rank is not None and rank > self._active_rank:
+                break
+            # Only look at positions that could not have matched in an earlier window
+            start = max(len(self._tail) - len(marker) + 1, 0)
+            position = window.rfind(marker, start)
+            if position >= 0:
+                self._active_rank = rank
+                return window[position + len(marker):]
+        return None
+
+    def _filter(self, text):
+        """Drops scaffold lines, holding back the start of a line until it can be classified."""
+        out = []
+        lines = text.split("\n")
+        pieces = [line + "\n" for line in lines[:-1]]
+        if lines[-1]:
+            pieces.append(lines[-1])
+        for piece in pieces:
+            complete = piece.endswith("\n")
+            if self._line_state is None:
+                self._line += piece
+                head = self._line.rstrip("\n").lstrip()
+                if head.startswith(SCAFFOLD_PREFIXES):
+                    self._line_state = "drop"
+                elif complete or (head and not any(p.startswith(head) for p in SCAFFOLD_PREFIXES)):
+                    self._line_state = "keep"
+                    out.append(self._line)
+                if self._line_state is not None:
+                    self._line = ""
+            elif self._line_state == "keep":
+                out.append(piece)
+            if complete:
+                self._line, self._line_state = "", None
+        return "".join(out)
+
+    def _visible(self, text):
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        text = self._space + text
+        shown = text.rstrip()
+        self._space = text[len(shown):]
+        return shown
+
+    def feed(self, chunk):
+        self._chunks.append(chunk)
+        cleaned = chunk.translate(_STRIP_MARKDOWN)
+        window = self._tail + cleaned
+        story = self._find_marker(window) if self._markers else None
+        self._tail = window[-self._overlap:] if self._overlap else ""
+
+        reset = story is not None
+        if reset:
+            self._line, self._line_state, self._space, self._started = "", None, "", False
+        else:
+            story = cleaned
+        # Scaffold lines only need dropping until the story marker shows up
+        if self._filter_lines and self._active_rank is None:
+            story = self._filter(story)
+        text = self._visible(story)
+        if reset:
+            self._shown = []
+        self._shown.append(text)
+        return reset, text
+
+    def flush(self):
+        """Returns (reset, text) that turn the streamed text into finish(), e.g. a held-back partial last line."""
+        final = self.finish()
+        shown = "".join(self._shown)
+        self._shown = [final]
+        if final.startswith(shown):
+            return False, final[len(shown):]
+        return True, final
+
+    def finish(self):
+        return parse_generated_story("".join(self._chunks), self.selected_method)
@@ -0,0 +1,51 @@
+"""Prompt builders shared by the desktop app and headless tools."""
+from functools import lru_cache
+
+from example_store import Example, few_shot_settings, get_default_store
+
+# Used when the example store is empty, e.g. its file is missing
+DEFAULT_EXAMPLES = (
+    Example("Brave knight quest.", "Sir Reginald, brave and true, sought the Dragon's Tear. Through enchanted forests and over treacherous mountains, he faced goblins and riddles. He found the dragon, not fierce, but guarding a single, glowing tear. It healed his ailing village, proving courage comes in many forms."),
+    Example("Alien discovery.", "Commander Eva landed on Kepler-186f. Bioluminescent flora pulsed. She met beings of pure light, communicating through shifting patterns. They were a living cosmic library, sharing wisdom through ethereal dances."),
+)
+
+@lru_cache(maxsize=1024)
+def select_few_shot_examples(topic):
+    """The examples for a topic, memoized. Call with a normalized topic (see generate_few_shot_prompt)."""
+    k, token_budget = few_shot_settings()
+    return get_default_store().select(topic, k, token_budget) or DEFAULT_EXAMPLES[:k]
+
+# --- PROMPT GENERATION FUNCTIONS ---
+def generate_zero_shot_prompt(user_prompt):
+    """Generates a zero-shot prompt."""
+    return f"Write a short story about: {user_prompt}"
+
+def generate_few_shot_prompt(user_prompt):
+    """Generates a few-shot prompt with the stored examples most relevant to the topic."""
+    examples = select_few_shot_examples(" ".join(user_prompt.lower().split()))
+    shown = "\n\n".join(f"Prompt: {example.prompt}\nStory: {example.story}" for example in examples)
+    return f"""Examples:
+{shown}
+
+Now, write a short story about: {user_prompt}"""
+
+def generate_chain_of_thought_prompt(user_prompt):
+    """Generates a chain-of-thought prompt with concise steps."""
+    return f"""Let's think step by step to create a compelling short story about: {user_prompt}.
+
+1. Character: Define main character, desire, obstacle.
+2. Plot: Outline intro, rising action (obstacle), climax, falling action, resolution.
+3. Setting: Describe atmosphere.
+4. Story: Write, incorporating these elements."""
+
+PROMPT_BUILDERS = {
+    "zero-shot": generate_zero_shot_prompt,
+    "few-shot": generate_few_shot_prompt,
+    "chain-of-thought": generate_chain_of_thought_prompt,
+}
+
+def build_prompt(selected_method, user_prompt):
+    """Builds the full prompt for a prompting method name."""
+    if selected_method not in PROMPT_BUILDERS:
+        raise ValueError(f"Unknown prompting method: {selected_method}")
+    return PROMPT_BUILDERS[selected_method](user_prompt)
@@ -0,0 +1,449 @@
+"""Headless HTTP service that generates stories for other tools, on a single asyncio event loop.
+
+Endpoints:
+  POST /generate          {"topic": ..., "method": "zero-shot", "regenerate": false} -> story JSON
+  POST /generate/stream   same body; Server-Sent Events: "chunk" events, then "done" or "error"
+  GET  /methods           the prompting methods
+  GET  /health            readiness and current load
+  GET  /metrics           Prometheus text: request counters plus the perf_trace stage summaries
+
+At most --concurrency generations call the API at once. Up to --max-queue more wait for a
+slot; beyond that requests get 429, and ones that wait longer than --queue-timeout get 503,
+both with Retry-After. Only the blocking API calls run on threads.
+
+Usage: python story_server.py [--host 127.0.0.1] [--port 8080] [--concurrency 8] [--max-queue 32]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from dotenv import load_dotenv
+
+import perf_trace
+from app_config import env_number
+from gemini_client import CircuitOpenError, GeminiError, RateLimitError, generate_story_result, stream_story
+from story_parser import StoryStreamParser, parse_generated_story
+from rate_limiter import get_default_limiter
+from single_flight import get_default_flight
+from story_prompts import PROMPT_BUILDERS, build_prompt
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADER_LINES = 100
+DISCONNECT_POLL_SECONDS = 0.1
+
+
+class HTTPError(Exception):
+    """Ends a request with an error status and a JSON {"error": message} body."""
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Request:
+    def __init__(self, method, path, version, headers, body, reader=None):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.reader = reader  # the connection's stream, to notice a client that hangs up
+
+    @property
+    def disconnected(self):
+        return self.reader is not None and self.reader.at_eof()
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        return connection == "keep-alive" if self.version == "HTTP/1.0" else connection != "close"
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The body must be a JSON object.")
+        return data
+
+
+async def _read_line(reader, status, message):
+    """One line from the client; a line longer than the stream's limit ends the request with status."""
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HTTPError(status, message)
+
+
+async def read_request(reader):
+    """Parses one HTTP/1.x request, or returns None when the client has closed the connection."""
+    line = await _read_line(reader, HTTPStatus.BAD_REQUEST, "Request line too long.")
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line.")
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await _read_line(reader, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line too long.")
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers.")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request bodies are limited to {MAX_BODY_BYTES} bytes.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target.split("?", 1)[0], version.upper(), headers, body, reader)
+
+
+def response_head(status, content_type, length=None, keep_alive=True, extra=None):
+    status = HTTPStatus(status)
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+             "Connection: keep-alive" if keep_alive else "Connection: close"]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    lines.extend(f"{name}: {value}" for name, value in (extra or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class StoryServer:
+    """Serves generation requests with bounded upstream concurrency and a bounded wait queue."""
+    def __init__(self, api_key, concurrency=8, max_queue=32, queue_timeout=30.0):
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.started = time.time()
+        self.in_flight = 0
+        self.waiting = 0
+        self.responses = Counter()  # (route, status) -> count
+        self.rejected = Counter()   # status -> requests turned away for load
+        self._slots = None          # asyncio.Semaphore, created on the server's loop
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="story-server")
+        self._routes = {
+            ("POST", "/generate"): self.generate,
+            ("POST", "/generate/stream"): self.generate_stream,
+            ("GET", "/methods"): self.methods,
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.metrics,
+        }
+
+    async def serve(self, host, port, ready=None):
+        """Runs until canceled. ready(server) is called once the socket is listening."""
+        self._slots = asyncio.Semaphore(self.concurrency)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- CONNECTIONS ---
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await self.send_error(writer, "-", e, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = await self.dispatch(request, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    async def dispatch(self, request, writer):
+        """Handles one request and returns whether the connection can be reused."""
+        handler = self._routes.get((request.method, request.path))
+        # Unknown paths share one label so scanners cannot blow up the metrics
+        route = request.path if any(path == request.path for _, path in self._routes) else "other"
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                if route != "other":
+                    raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{request.method} is not supported on {request.path}.")
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint at {request.path}.")
+            status, keep_alive = await handler(request, writer)
+        except HTTPError as e:
+            status, keep_alive = e.status, request.keep_alive
+            await self.send_error(writer, route, e, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as e:
+            status, keep_alive = HTTPStatus.INTERNAL_SERVER_ERROR, False
+            await self.send_error(writer, route, HTTPError(status, f"An unexpected error occurred: {e}"), keep_alive)
+        else:
+            self.responses[route, int(status)] += 1
+        perf_trace.record("server.request", time.perf_counter() - started, route=route, status=int(status))
+        return keep_alive
+
+    async def send_json(self, writer, status, data, keep_alive=True, extra=None):
+        body = json.dumps(data).encode("utf-8")
+        writer.write(response_head(status, "application/json", len(body), keep_alive, extra) + body)
+        await writer.drain()
+
+    async def send_error(self, writer, route, error, keep_alive):
+        self.responses[route, int(error.status)] += 1
+        extra = {"Retry-After": error.retry_after} if error.retry_after is not None else None
+        await self.send_json(writer, error.status, {"error": str(error)}, keep_alive, extra)
+
+    # --- BACKPRESSURE ---
+    @contextlib.asynccontextmanager
+    async def upstream_slot(self):
+        """Holds one of the concurrency slots for the body, queueing briefly if they are all taken."""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected[HTTPStatus.TOO_MANY_REQUESTS] += 1
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, "Too many requests are waiting; try again shortly.", retry_after=1)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected[HTTPStatus.SERVICE_UNAVAILABLE] += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Timed out waiting for a free generation slot.",
+                            retry_after=max(1, round(self.queue_timeout / 2)))
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def _parse_generation_request(self, request):
+        if not self.api_key:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "GEMINI_API_KEY is not set on the server.")
+        data = request.json()
+        topic = next((data[f] for f in ("topic", "prompt") if isinstance(data.get(f), str) and data[f].strip()), None)
+        if topic is None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Expected a non-empty "topic".')
+        method = data.get("method", "zero-shot")
+        if method not in PROMPT_BUILDERS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown prompting method: {method}")
+        return topic.strip(), method, bool(data.get("regenerate", False))
+
+    # --- ENDPOINTS ---
+    async def generate(self, request, writer):
+        topic, method, regenerate = self._parse_generation_request(request)
+        loop = asyncio.get_running_loop()
+        full_prompt = build_prompt(method, topic)
+        stop_event = threading.Event()
+        started = time.perf_counter()
+        async with self.upstream_slot():
+            future = loop.run_in_executor(self._executor, generate_story_result, full_prompt, self.api_key,
+                                          stop_event, regenerate)
+            try:
+                result, from_cache = await self._result_unless_disconnected(request, future)
+            except RateLimitError as e:
+                raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, str(e), retry_after=max(1, round(e.retry_after)))
+            except CircuitOpenError as e:
+                # The breaker is shedding load on purpose, like a saturated queue
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, str(e), retry_after=max(1, round(e.retry_in)))
+            except GeminiError as e:
+                raise HTTPError(HTTPStatus.BAD_GATEWAY, str(e))
+            finally:
+                # A client that hangs up, or a handler that is cancelled, stops its upstream request;
+                # the slot is held until the worker has actually let go of it
+                stop_event.set()
+                await asyncio.wait((future,))
+                if not future.cancelled():
+                    future.exception()  # a worker stopped by a disconnect ends with GenerationCanceled; nothing is waiting for it
+        story = parse_generated_story(result.text, method)
+        await self.send_json(writer, HTTPStatus.OK, {
+            "topic": topic, "method": method, "story": story, "model": result.model, "usage": result.usage,
+            "from_cache": from_cache, "seconds": round(time.perf_counter() - started, 3),
+        }, request.keep_alive)
+        return HTTPStatus.OK, request.keep_alive
+
+    async def generate_stream(self, request, writer):
+        topic, method, regenerate = self._parse_generation_request(request)
+        loop = asyncio.get_running_loop()
+        full_prompt = build_prompt(method, topic)
+        events = asyncio.Queue()
+        stop_event = threading.Event()
+        parser = StoryStreamParser(method)
+
+        def on_chunk(chunk):
+            reset, text = parser.feed(chunk)
+            if reset or text:
+                loop.call_soon_threadsafe(events.put_nowait, ("chunk", {"text": text, "reset": reset}))
+
+        def produce():
+            try:
+                stream_story(full_prompt, self.api_key, stop_event, on_chunk, regenerate)
+                # Send whatever the parser was still holding back, e.g. a partial last line
+                reset, text = parser.flush()
+                if reset or text:
+                    loop.call_soon_threadsafe(events.put_nowait, ("chunk", {"text": text, "reset": reset}))
+                event = ("done", {"topic": topic, "method": method, "story": parser.finish()})
+            except RateLimitError as e:
+                event = ("error", {"error": str(e), "retry_after": e.retry_after})
+            except CircuitOpenError as e:
+                event = ("error", {"error": str(e), "retry_after": e.retry_in})
+            except GeminiError as e:
+                event = ("error", {"error": str(e)})
+            except Exception as e:
+                event = ("error", {"error": f"An unexpected error occurred: {e}"})
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        started = time.perf_counter()
+        async with self.upstream_slot():
+            # Headers go out only once a slot is held, so saturation can still be reported as 429/503
+            writer.write(response_head(HTTPStatus.OK, "text/event-stream", keep_alive=False,
+                                       extra={"Cache-Control": "no-cache"}))
+            future = loop.run_in_executor(self._executor, produce)
+            try:
+                while True:
+                    event, data = await self._next_event(events, future)
+                    if event != "chunk":
+                        data["seconds"] = round(time.perf_counter() - started, 3)
+                    writer.write(sse_event(event, data))
+                    await writer.drain()
+                    if event != "chunk":
+                        break
+            finally:
+                # A client that disconnects stops its upstream request too
+                stop_event.set()
+                await asyncio.wait((future,))
+        return HTTPStatus.OK, False
+
+    @staticmethod
+    async def _result_unless_disconnected(request, future):
+        """Awaits the worker's result, raising ConnectionResetError if the client hangs up first."""
+        while True:
+            done, _ = await asyncio.wait((future,), timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return future.result()
+            if request.disconnected:
+                raise ConnectionResetError("The client disconnected.")
+
+    @staticmethod
+    async def _next_event(events, future):
+        """The next queued event, or an "error" event if the worker ended without posting a final one."""
+        getter = asyncio.ensure_future(events.get())
+        try:
+            await asyncio.wait((getter, future), return_when=asyncio.FIRST_COMPLETED)
+            # Events are posted before the worker returns, so a finished worker has nothing left to send
+            if getter.done() or not events.empty():
+                return await getter
+        finally:
+            if not getter.done():
+                getter.cancel()
+        error = future.exception() if not future.cancelled() else None
+        return "error", {"error": f"An unexpected error occurred: {error or 'the generation stopped'}"}
+
+    async def methods(self, request, writer):
+        await self.send_json(writer, HTTPStatus.OK, {"methods": list(PROMPT_BUILDERS)}, request.keep_alive)
+        return HTTPStatus.OK, request.keep_alive
+
+    async def health(self, request, writer):
+        ready = bool(self.api_key)
+        limiter = get_default_limiter()
+        flight = get_default_flight()
+        status = HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE
+        await self.send_json(writer, status, {
+            "status": "ok" if ready else "no_api_key", "uptime": round(time.time() - self.started, 1),
+            "in_flight": self.in_flight, "waiting": self.waiting,
+            "concurrency": self.concurrency, "max_queue": self.max_queue,
+            "rate_limit": limiter.budget() if limiter is not None else None,
+            "coalescing": flight.stats() if flight is not None else None,
+        }, request.keep_alive)
+        return status, request.keep_alive
+
+    async def metrics(self, request, writer):
+        lines = ["# HELP story_server_responses_total Responses by route and status.",
+                 "# TYPE story_server_responses_total counter"]
+        for (route, status), count in sorted(self.responses.items()):
+            lines.append(f'story_server_responses_total{{route="{route}",status="{status}"}} {count}')
+        lines += ["# HELP story_server_rejected_total Requests turned away because the server was saturated.",
+                  "# TYPE story_server_rejected_total counter"]
+        for status in (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE):
+            lines.append(f'story_server_rejected_total{{status="{status.value}"}} {self.rejected[status]}')
+        lines += ["# TYPE story_server_in_flight gauge", f"story_server_in_flight {self.in_flight}",
+                  "# TYPE story_server_waiting gauge", f"story_server_waiting {self.waiting}"]
+        limiter = get_default_limiter()
+        if limiter is not None:
+            budget = limiter.budget()
+            for name, key in (("requests", "requests_available"), ("tokens", "tokens_available")):
+                if budget[key] is not None:
+                    lines += [f"# TYPE story_ratelimit_{name}_available gauge", f"story_ratelimit_{name}_available {budget[key]}"]
+            lines += ["# TYPE story_ratelimit_paused_seconds gauge", f"story_ratelimit_paused_seconds {budget['paused_for']:.3f}",
+                      "# TYPE story_ratelimit_waiting gauge", f"story_ratelimit_waiting {budget['waiting']}",
+                      "# TYPE story_ratelimit_throttled_total counter", f"story_ratelimit_throttled_total {budget['throttled']}",
+                      "# TYPE story_ratelimit_wait_seconds_total counter", f"story_ratelimit_wait_seconds_total {budget['wait_seconds']:.3f}"]
+        flight = get_default_flight()
+        if flight is not None:
+            stats = flight.stats()
+            lines += ["# HELP story_singleflight_coalesced_total Requests that shared an identical request already in flight.",
+                      "# TYPE story_singleflight_coalesced_total counter", f"story_singleflight_coalesced_total {stats['coalesced']}",
+                      "# TYPE story_singleflight_calls_total counter", f"story_singleflight_calls_total {stats['calls']}",
+                      "# TYPE story_singleflight_detached_total counter", f"story_singleflight_detached_total {stats['detached']}",
+                      "# TYPE story_singleflight_in_flight gauge", f"story_singleflight_in_flight {stats['in_flight']}"]
+        body = ("\n".join(lines) + "\n" + perf_trace.get_tracer().metrics_text()).encode("utf-8")
+        writer.write(response_head(HTTPStatus.OK, "text/plain; version=0.0.4", len(body), request.keep_alive) + body)
+        await writer.drain()
+        return HTTPStatus.OK, request.keep_alive
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve story generation over HTTP.")
+    parser.add_argument("--host", default=os.getenv("STORY_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=env_number("STORY_SERVER_PORT", 8080, int))
+    parser.add_argument("--concurrency", type=int, default=env_number("STORY_SERVER_CONCURRENCY", 8, int),
+                        help="generations calling the API at once (default 8)")
+    parser.add_argument("--max-queue", type=int, default=env_number("STORY_SERVER_MAX_QUEUE", 32, int),
+                        help="requests allowed to wait for a slot before 429s (default 32)")
+    parser.add_argument("--queue-timeout", type=float, default=env_number("STORY_SERVER_QUEUE_TIMEOUT", 30.0),
+                        help="seconds a request may wait for a slot before a 503 (default 30)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("Warning: GEMINI_API_KEY is not set; generate requests will get 503 until it is.", file=sys.stderr)
+
+    server = StoryServer(api_key, max(1, args.concurrency), max(0, args.max_queue), args.queue_timeout)
+    ready = lambda s: print(f"Serving stories on http://{args.host}:{s.sockets[0].getsockname()[1]}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        perf_trace.get_tracer().flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""The story output: the full text kept in Python, drawn into the Text widget a slice at a time.
+
+Inserting megabytes into a Tk Text widget in one call freezes the window until it has laid
+out every line. StoryView keeps the canonical text itself and inserts it in chunks, stopping
+after a few milliseconds and continuing from an after() callback so input and redraws get a
+turn in between. Save, copy and narration read the text from here instead of copying it back
+out of the widget.
+"""
+import time
+import tkinter as tk
+from collections import deque
+
+import perf_trace
+from perf_trace import percentile
+
+
+class StoryView:
+    """Owns the story text shown in widget (a Text or ScrolledText).
+
+    slice_seconds: UI-thread time spent inserting before yielding to the event loop.
+    chunk_chars: characters inserted per Text.insert call.
+    """
+    def __init__(self, widget, slice_seconds=0.008, chunk_chars=16384):
+        self.widget = widget
+        self.slice_seconds = slice_seconds
+        self.chunk_chars = chunk_chars
+        self._parts = []
+        self._pending = deque()  # text not yet in the widget
+        self._offset = 0         # characters of _pending[0] already inserted
+        self._follow = False     # keep the end in view while inserting
+        self._pump_job = None
+        self._on_rendered = None
+        self._render_started = 0.0
+        self.insert_seconds = 0.0
+        self.insert_slices = 0
+        self.widget.edit_modified(False)
+
+    @property
+    def rendering(self):
+        return bool(self._pending)
+
+    def text(self):
+        """The whole story, including anything not inserted yet and any edits made in the widget."""
+        # The modified flag is reset after each of our own inserts, so it is set only by the user
+        if not self._pending and self.widget.edit_modified():
+            self._parts = [self.widget.get("1.0", "end-1c")]
+            self.widget.edit_modified(False)
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def clear(self):
+        self._cancel_pump()
+        self._parts = []
+        self.widget.delete("1.0", tk.END)
+        self.widget.edit_modified(False)
+
+    def set_text(self, text, on_rendered=None):
+        """Replaces the story. on_rendered(seconds, slices) runs once the last chunk is in the widget."""
+        if text == self.text() and not self._pending:
+            # Already showing it, e.g. the final text of a stream that was rendered as it arrived
+            if on_rendered:
+                on_rendered(0.0, 0)
+            return
+        self.clear()
+        self._parts = [text]
+        self._follow = False
+        self._queue(text, on_rendered)
+
+    def append(self, text, reset=False):
+        """Adds streamed text to the end, keeping the end in view."""
+        if reset:
+            self.clear()
+        self._parts.append(text)
+        self._follow = True
+        self._queue(text, self._on_rendered)
+
+    def take_stats(self):
+        """(seconds spent inserting, slices) since the last call, then starts counting again."""
+        stats = (self.insert_seconds, self.insert_slices)
+        self.insert_seconds, self.insert_slices = 0.0, 0
+        return stats
+
+    def _queue(self, text, on_rendered):
+        if not text:
+            if on_rendered and not self._pending:
+                on_rendered(0.0, 0)
+            return
+        if not self._pending:
+            self._render_started = time.perf_counter()
+        self._pending.append(text)
+        self._on_rendered = on_rendered
+        if self._pump_job is None:
+            self._pump_job = self.widget.after_idle(self._pump)
+
+    def _cancel_pump(self):
+        if self._pump_job is not None:
+            self.widget.after_cancel(self._pump_job)
+            self._pump_job = None
+        self._pending.clear()
+        self._offset = 0
+        self._on_rendered = None
+
+    def _pump(self):
+        """Inserts chunks until slice_seconds has passed, then reschedules itself for the rest."""
+        self._pump_job = None
+        started = time.perf_counter()
+        while self._pending:
+            piece = self._pending[0]
+            chunk = piece[self._offset:self._offset + self.chunk_chars]
+            self.widget.insert(tk.END, chunk)
+            self._offset += len(chunk)
+            if self._offset >= len(piece):
+                self._pending.popleft()
+                self._offset = 0
+            if time.perf_counter() - started >= self.slice_seconds:
+                break
+        self.widget.edit_modified(False)
+        if self._follow:
+            self.widget.see(tk.END)
+        self.insert_seconds += time.perf_counter() - started
+        self.insert_slices += 1
+        if self._pending:
+            # A timer rather than after_idle, so pending redraws and input run first
+            self._pump_job = self.widget.after(1, self._pump)
+        elif self._on_rendered is not None:
+            on_rendered, self._on_rendered = self._on_rendered, None
+            on_rendered(time.perf_counter() - self._render_started, self.insert_slices)
+
+
+class FrameMonitor:
+    """Measures the gaps between ticks of a periodic UI-thread callback.
+
+    The callback is scheduled every interval seconds, so a longer gap is time the event loop
+    spent blocked: input and redraws waited that long. Gaps are kept for live percentiles, and
+    the worst gap of each report period is recorded as a "ui.frame" span when it was slow.
+    """
+    def __init__(self, interval, report_every=1.0, slow_factor=2.0, window=1200, clock=time.perf_counter):
+        self.interval = interval
+        self.report_every = report_every
+        self.slow_after = interval * slow_factor
+        self._clock = clock
+        self._gaps = deque(maxlen=window)
+        self._last = None
+        self._period_started = clock()
+        self._period_worst = 0.0
+        self.slow_frames = 0
+
+    def tick(self):
+        now = self._clock()
+        if self._last is not None:
+            gap = now - self._last
+            self._gaps.append(gap)
+            self._period_worst = max(self._period_worst, gap)
+            if gap > self.slow_after:
+                self.slow_frames += 1
+        self._last = now
+        if now - self._period_started >= self.report_every:
+            if self._period_worst > self.slow_after:
+                perf_trace.record("ui.frame", self._period_worst, interval_ms=round(self.interval * 1000))
+            self._period_started, self._period_worst = now, 0.0
+
+    def stats(self):
+        """Gap percentiles and maximum in ms over the recent window, plus the count of slow frames."""
+        ordered = sorted(self._gaps)
+        to_ms = lambda value: None if value is None else value * 1000
+        return {
+            "samples": len(ordered),
+            "p50_ms": to_ms(percentile(ordered, 50)),
+            "p95_ms": to_ms(percentile(ordered, 95)),
+            "p99_ms": to_ms(percentile(ordered, 99)),
+            "max_ms": to_ms(ordered[-1] if ordered else None),
+            "slow_frames": self.slow_frames,
+        }
@@ -0,0 +1,32 @@
+import json
+import os
+import tempfile
+import unittest
+
+from batch_generate import read_jobs
+
+
+class ReadJobsTest(unittest.TestCase):
+    def test_mixed_file_yields_a_record_per_line(self):
+        lines = ['{"topic": "a lighthouse keeper", "id": 7}', "[1, 2]", '"text"', "3", "null", "{not json",
+                 "", '{"prompt": "a dragon", "method": "few-shot"}', '{"title": "x", "method": "haiku"}', "{}"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "prompts.jsonl")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+            jobs = list(read_jobs(path, "zero-shot"))
+
+        self.assertEqual([line for line, _ in jobs], [1, 2, 3, 4, 5, 6, 8, 9, 10])
+        records = dict(jobs)
+        self.assertEqual(records[1], {"topic": "a lighthouse keeper", "method": "zero-shot", "id": 7})
+        for line in (2, 3, 4, 5):
+            self.assertIn("Expected a JSON object", records[line]["error"])
+        self.assertIn("Invalid JSON", records[6]["error"])
+        self.assertEqual(records[8], {"topic": "a dragon", "method": "few-shot"})
+        self.assertIn("Unknown prompting method", records[9]["error"])
+        self.assertIn("No topic found", records[10]["error"])
+        json.dumps(records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+
+from example_store import Example, ExampleStore, load_examples
+
+
+class LoadExamplesTest(unittest.TestCase):
+    def test_skips_malformed_lines(self):
+        lines = ['{"prompt": " a fox ", "story": " The fox ran. "}', "[1, 2]", '"text"', "null", "{not json", "",
+                 '{"prompt": 3, "story": "numbers"}', '{"prompt": "a list", "story": ["x"]}',
+                 '{"prompt": "  ", "story": "blank prompt"}', '{"prompt": "an owl", "story": "The owl hooted."}']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "examples.jsonl")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+            examples = load_examples(path)
+        self.assertEqual(examples, [Example("a fox", "The fox ran."), Example("an owl", "The owl hooted.")])
+
+
+class ExampleStoreTest(unittest.TestCase):
+    def test_ranks_by_topic(self):
+        store = ExampleStore([Example("a dragon", "The dragon slept."), Example("a lighthouse keeper", "The lamp burned.")])
+        self.assertEqual([example.prompt for _, example in store.search("lonely lighthouse")], ["a lighthouse keeper"])
+
+    def test_examples_without_terms(self):
+        store = ExampleStore([Example("the a", "of the")])
+        self.assertEqual(store.search("the dragon"), [])
+        self.assertEqual(store.select("the dragon"), (Example("the a", "of the"),))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import gemini_client
+from benchmarks.mock_gemini import MockGeminiServer
+from gemini_client import CircuitBreaker, ClientConfig, GeminiClient, GenerationResult, RateLimitError
+from rate_limiter import RateLimiter
+from story_cache import ResponseCache
+
+
+class CircuitBreakerProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockGeminiServer(quota_requests=1, quota_window=0.5).start()
+        self.addCleanup(self.server.stop)
+        config = ClientConfig(api_base=self.server.api_base, max_retries=0, breaker_threshold=1,
+                              breaker_reset_timeout=0.05)
+        self.client = GeminiClient("test", config, RateLimiter())
+        self.addCleanup(self.client.close)
+
+    def test_rate_limited_probe_closes_breaker(self):
+        stop_event = threading.Event()
+        self.client.generate("use up the quota", stop_event)
+        self.client.breaker.record_failure()
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+        time.sleep(0.1)
+
+        # The half-open probe is answered 429: the API is up, so the breaker must not stay half-open
+        with self.assertRaises(RateLimitError):
+            self.client.generate("probe", stop_event)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+        # Giving up on the request still pauses the other callers sharing the limiter
+        self.assertGreater(self.client.limiter.budget()["paused_for"], 0)
+
+        time.sleep(0.5)
+        self.assertTrue(self.client.generate("after the quota window", stop_event).text)
+
+
+class LongRetryAfterTest(unittest.TestCase):
+    def test_later_callers_fail_fast_during_a_long_pause(self):
+        server = MockGeminiServer(quota_requests=1, quota_window=30.0).start()
+        self.addCleanup(server.stop)
+        config = ClientConfig(api_base=server.api_base, max_retries=0, rate_limit_max_wait=1.0)
+        client = GeminiClient("test", config, RateLimiter())
+        self.addCleanup(client.close)
+        stop_event = threading.Event()
+        client.generate("use up the quota", stop_event)
+        with self.assertRaises(RateLimitError):
+            client.generate("asks for a long wait", stop_event)
+        requests_before = server.requests
+
+        # The next caller is told about the quota right away instead of blocking in the limiter
+        started = time.monotonic()
+        with self.assertRaises(RateLimitError) as raised:
+            client.generate("after the long Retry-After", stop_event)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertGreater(raised.exception.retry_after, config.rate_limit_max_wait)
+        self.assertEqual(server.requests, requests_before)
+
+
+class HedgeWinCacheTest(unittest.TestCase):
+    def test_hedge_win_is_served_from_cache_with_its_model(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = ResponseCache(os.path.join(directory.name, "cache.sqlite3"))
+        self.addCleanup(cache.close)
+        client = GeminiClient("test", ClientConfig(model="primary", hedge_model="hedge"), RateLimiter())
+        self.addCleanup(client.close)
+        produce = mock.Mock(return_value=GenerationResult("hedged story", "hedge", {}, 1.0))
+
+        with mock.patch.object(gemini_client, "get_default_cache", return_value=cache):
+            first, first_cached = gemini_client._generate_with_cache("prompt", "test", False, produce,
+                                                                     threading.Event(), client=client)
+            second, second_cached = gemini_client._generate_with_cache("prompt", "test", False, produce,
+                                                                       threading.Event(), client=client)
+        self.assertEqual((first.model, first_cached), ("hedge", False))
+        self.assertEqual((second.text, second.model, second_cached), ("hedged story", "hedge", True))
+        self.assertEqual(produce.call_count, 1)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from hedging import HedgePolicy
+
+
+class HedgePolicyTest(unittest.TestCase):
+    def test_no_hedge_delay_below_min_samples(self):
+        policy = HedgePolicy(percentile=50, min_samples=5, min_delay=0.0)
+        for _ in range(4):
+            policy.observe(1.0)
+            self.assertIsNone(policy.start_request())
+        policy.observe(1.0)
+        self.assertEqual(policy.start_request(), 1.0)
+        self.assertEqual(policy.stats()["delay"], 1.0)
+
+    def test_delay_is_the_percentile_with_a_floor(self):
+        policy = HedgePolicy(percentile=90, min_samples=10, min_delay=0.25)
+        for seconds in range(1, 11):
+            policy.observe(seconds / 100)
+        self.assertEqual(policy.start_request(), 0.25)
+        for _ in range(10):
+            policy.observe(2.0)
+        self.assertEqual(policy.start_request(), 2.0)
+
+    def test_credit_caps_hedges_at_max_extra(self):
+        # A fraction that adds up exactly in binary floating point
+        policy = HedgePolicy(max_extra=0.25, burst=2.0)
+        hedges = 0
+        for _ in range(100):
+            policy.start_request()
+            hedges += policy.try_hedge()
+        self.assertEqual(hedges, 25)
+        self.assertEqual(policy.stats()["hedges"], 25)
+
+    def test_unspent_credit_is_capped_at_burst(self):
+        policy = HedgePolicy(max_extra=0.5, burst=2.0)
+        for _ in range(100):
+            policy.start_request()
+        self.assertEqual([policy.try_hedge() for _ in range(3)], [True, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
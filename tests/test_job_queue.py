@@ -0,0 +1,47 @@
+import threading
+import time
+import unittest
+
+from job_queue import BACKGROUND, CANCELED, DONE, INTERACTIVE, QUEUED, RUNNING, JobScheduler
+
+
+class JobSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = JobScheduler(max_workers=1)
+        self.addCleanup(self.scheduler.shutdown)
+        # Holds the only worker so later jobs stay queued until the test lets it go
+        self.gate = threading.Event()
+        self.blocker = self.scheduler.submit(lambda job: self.gate.wait(5), "blocker")
+
+    def wait_for(self, *jobs, timeout=5):
+        deadline = time.monotonic() + timeout
+        while any(job.status in (QUEUED, RUNNING) for job in jobs) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_runs_by_priority_then_submission_order(self):
+        order = []
+        jobs = [self.scheduler.submit(lambda job, label=label: order.append(label), label, priority)
+                for label, priority in (("variation", BACKGROUND), ("first", INTERACTIVE), ("second", INTERACTIVE))]
+        self.gate.set()
+        self.wait_for(self.blocker, *jobs)
+        self.assertEqual(order, ["first", "second", "variation"])
+        self.assertTrue(all(job.status == DONE for job in jobs))
+
+    def test_cancel_before_start_never_runs(self):
+        ran = threading.Event()
+        canceled = self.scheduler.submit(lambda job: ran.set(), "canceled")
+        after = self.scheduler.submit(lambda job: "ok", "after")
+        canceled.cancel()
+        self.assertEqual(canceled.status, CANCELED)
+        self.assertTrue(canceled.cancel_event.is_set())
+        self.assertFalse(self.scheduler.cancel(canceled.id))
+        self.gate.set()
+        self.wait_for(self.blocker, after)
+        self.assertFalse(ran.is_set())
+        self.assertEqual((after.status, after.result), (DONE, "ok"))
+        kinds = [kind for job, kind, _ in self.scheduler.poll() if job is canceled]
+        self.assertEqual(kinds, [QUEUED, CANCELED])
+
+
+if __name__ == "__main__":
+    unittest.main()
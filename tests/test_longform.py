@@ -0,0 +1,80 @@
+import threading
+import unittest
+from unittest import mock
+
+import longform
+from gemini_client import GeminiError, GeminiResponseError, GenerationResult
+from longform import ChapterPlan, Outline, parse_outline
+
+
+def results(*texts):
+    return [(GenerationResult(text, "gemini-test", {}, 0.1), False) for text in texts]
+
+
+class ParseOutlineTest(unittest.TestCase):
+    def test_plain_format(self):
+        outline = parse_outline("Title: Tides\nChapter 1: Storm - The waves rise.\nChapter 2: Calm - They fall.", 5)
+        self.assertEqual(outline, Outline("Tides", [ChapterPlan(1, "Storm", "The waves rise."),
+                                                    ChapterPlan(2, "Calm", "They fall.")]))
+
+    def test_common_model_variations(self):
+        for line in ("- Chapter 1: Storm - waves", "* Chapter 1: Storm - waves", "• Chapter 1: Storm - waves",
+                     "1. Chapter 1: Storm - waves", "1) Chapter 1: Storm - waves", "Chapter 1: Storm: waves",
+                     "Chapter One: Storm - waves", "**Chapter 1:** Storm — waves", "Chapter 1. Storm - waves"):
+            with self.subTest(line=line):
+                self.assertEqual(parse_outline(line, 5).chapters, [ChapterPlan(1, "Storm", "waves")])
+
+    def test_mixed_lines_keep_every_chapter(self):
+        text = "Title: Tides\n1. Chapter 1: Storm - waves\nChapter 2: Calm - stillness\nSome commentary."
+        self.assertEqual([plan.title for plan in parse_outline(text, 5).chapters], ["Storm", "Calm"])
+
+    def test_sorts_renumbers_and_caps_chapters(self):
+        text = "Chapter 3: C - c\nChapter 1: A - a\nChapter 1: Again - again\nChapter 5: E - e"
+        self.assertEqual(parse_outline(text, 2).chapters, [ChapterPlan(1, "A", "a"), ChapterPlan(2, "C", "c")])
+
+    def test_no_chapters(self):
+        with self.assertRaises(GeminiResponseError):
+            parse_outline("Here is a lovely story idea.", 5)
+
+
+class WriteChapterTest(unittest.TestCase):
+    outline = Outline("Tides", [ChapterPlan(1, "Storm", "waves"), ChapterPlan(2, "Calm", "stillness")])
+
+    def test_empty_chapter_is_retried_past_the_cache(self):
+        replies = results("  \n", "The waves rose over the rocks.")
+        with mock.patch.object(longform, "generate_story_result", side_effect=replies) as generate:
+            text, model = longform._write_chapter("a lighthouse", self.outline, 0, 100, "key", threading.Event(), 2, False)
+        self.assertEqual((text, model), ("The waves rose over the rocks.", "gemini-test"))
+        self.assertEqual([call.args[3] for call in generate.call_args_list], [False, True])
+
+    def test_failed_request_is_retried(self):
+        replies = [GeminiError("upstream failed")] + results("The sea went still.")
+        with mock.patch.object(longform, "generate_story_result", side_effect=replies) as generate:
+            text, _ = longform._write_chapter("a lighthouse", self.outline, 1, 100, "key", threading.Event(), 2, False)
+        self.assertEqual(text, "The sea went still.")
+        self.assertEqual(generate.call_count, 2)
+
+    def test_regenerate_skips_the_cache_on_every_attempt(self):
+        with mock.patch.object(longform, "generate_story_result", side_effect=results("", "", "")) as generate:
+            with self.assertRaisesRegex(GeminiError, "Chapter 1 failed after 3 attempts"):
+                longform._write_chapter("a lighthouse", self.outline, 0, 100, "key", threading.Event(), 2, True)
+        self.assertEqual([call.args[3] for call in generate.call_args_list], [True, True, True])
+
+
+class WriteOutlineTest(unittest.TestCase):
+    def test_unparseable_outline_is_retried_past_the_cache(self):
+        replies = results("Here is a lovely story idea.", "Title: Tides\nChapter 1: Storm - The waves rise.")
+        with mock.patch.object(longform, "generate_story_result", side_effect=replies) as generate:
+            outline, model = longform._write_outline("a lighthouse", 3, "key", threading.Event(), 2, False)
+        self.assertEqual(outline.title, "Tides")
+        self.assertEqual(model, "gemini-test")
+        self.assertEqual([call.args[3] for call in generate.call_args_list], [False, True])
+
+    def test_gives_up_after_the_retries(self):
+        with mock.patch.object(longform, "generate_story_result", side_effect=results("no", "outline", "here")):
+            with self.assertRaisesRegex(GeminiError, "outline failed after 3 attempts"):
+                longform._write_outline("a lighthouse", 3, "key", threading.Event(), 2, False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from single_flight import Detached, SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight(poll_interval=0.01)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+        self.upstream_stop = None
+
+    def upstream(self, stop_event):
+        self.calls += 1
+        self.upstream_stop = stop_event
+        self.started.set()
+        self.release.wait(5)
+        return "story"
+
+    def wait_for_callers(self, count):
+        while self.flight.stats()["coalesced"] < count:
+            threading.Event().wait(0.01)
+
+    def test_concurrent_identical_keys_share_one_call(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(self.flight.do, "key", self.upstream) for _ in range(4)]
+            self.wait_for_callers(3)
+            self.release.set()
+            results = [future.result(5) for future in futures]
+        self.assertEqual(results, ["story"] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats(), {"in_flight": 0, "calls": 1, "coalesced": 3, "detached": 0, "abandoned": 0})
+
+    def test_cancelled_leader_detaches_without_failing_followers(self):
+        leader_stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            leader = pool.submit(self.flight.do, "key", self.upstream, leader_stop)
+            self.assertTrue(self.started.wait(5))
+            followers = [pool.submit(self.flight.do, "key", self.upstream) for _ in range(2)]
+            self.wait_for_callers(2)
+            leader_stop.set()
+            with self.assertRaises(Detached):
+                leader.result(5)
+            self.assertFalse(self.upstream_stop.is_set())
+            self.release.set()
+            self.assertEqual([follower.result(5) for follower in followers], ["story", "story"])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats()["detached"], 1)
+        self.assertEqual(self.flight.stats()["abandoned"], 0)
+
+    def test_call_is_stopped_once_every_caller_leaves(self):
+        stop_event = threading.Event()
+        stop_event.set()
+        with self.assertRaises(Detached):
+            self.flight.do("key", self.upstream, stop_event)
+        self.assertTrue(self.started.wait(5))
+        self.assertTrue(self.upstream_stop.wait(5))
+        self.assertEqual(self.flight.stats()["abandoned"], 1)
+        self.release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from story_cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.now = 1000.0
+        patcher = mock.patch("story_cache.time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ResponseCache(os.path.join(directory.name, "cache.sqlite3"), max_entries=2, max_bytes=1024, ttl=60)
+        self.addCleanup(self.cache.close)
+
+    def put(self, key, response="story"):
+        self.cache.put(key, "model", response)
+        self.now += 1
+
+    def test_hits_and_misses(self):
+        self.put("a", "once upon a time")
+        self.assertEqual(self.cache.get("a"), ("once upon a time", "model"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1, "bytes": 16})
+
+    def test_expired_entry_is_a_miss_and_removed(self):
+        self.put("a")
+        self.now += 61
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_evicts_least_recently_used_entry(self):
+        self.put("a")
+        self.put("b")
+        self.cache.get("a")
+        self.now += 1
+        self.put("c")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), ("story", "model"))
+        self.assertEqual(self.cache.get("c"), ("story", "model"))
+
+    def test_evicts_to_stay_under_max_bytes(self):
+        self.put("a", "x" * 600)
+        self.put("b", "y" * 600)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["bytes"], 600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from story_history import StoryHistory, fts_query
+
+
+class StoryHistoryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.history = StoryHistory(os.path.join(directory.name, "history.sqlite3"))
+        self.addCleanup(self.history.close)
+
+    def add(self, prompt, story="A quiet evening."):
+        return self.history.add(prompt, "zero-shot", story)
+
+    def test_list_pages_newest_first(self):
+        ids = [self.add(f"prompt {i}") for i in range(5)]
+        first = self.history.list(limit=2)
+        self.assertEqual([entry.id for entry in first], [ids[4], ids[3]])
+        second = self.history.list(before_id=first[-1].id, limit=2)
+        self.assertEqual([entry.id for entry in second], [ids[2], ids[1]])
+        self.assertEqual([entry.id for entry in self.history.list(before_id=ids[1], limit=2)], [ids[0]])
+
+    def test_search_pages_newest_first(self):
+        ids = [self.add(f"dragon {i}" if i % 2 else f"lighthouse {i}") for i in range(6)]
+        first = self.history.search("dragon", limit=2)
+        self.assertEqual([entry.id for entry in first], [ids[5], ids[3]])
+        second = self.history.search("dragon", before_id=first[-1].id, limit=2)
+        self.assertEqual([entry.id for entry in second], [ids[1]])
+
+    def test_search_matches_word_prefixes_in_prompt_and_story(self):
+        lighthouse = self.add("a lighthouse keeper")
+        dragon = self.add("a sleepy creature", "The dragon dreamed of gold.")
+        self.assertEqual([entry.id for entry in self.history.search("light keep")], [lighthouse])
+        self.assertEqual([entry.id for entry in self.history.search("drag")], [dragon])
+        self.assertEqual(self.history.search("light dragon"), [])
+
+    def test_operator_words_are_plain_words(self):
+        self.assertEqual(fts_query('cats AND "dogs" OR NEAR(x'), '"cats"* "AND"* "dogs"* "OR"* "NEAR"* "x"*')
+        both = self.add("cats and dogs")
+        self.add("cats only")
+        self.assertEqual([entry.id for entry in self.history.search("cats AND dogs")], [both])
+        self.assertEqual([entry.id for entry in self.history.search("cats OR")], [])
+        self.assertEqual([entry.id for entry in self.history.search("NEAR(")], [])
+
+    def test_blank_search_lists_everything(self):
+        ids = [self.add("one"), self.add("two")]
+        self.assertEqual([entry.id for entry in self.history.search("  ?! ")], ids[::-1])
+
+    def test_delete_removes_the_story_from_the_index(self):
+        doomed = self.add("a lighthouse keeper")
+        kept = self.add("a lighthouse painter")
+        self.history.delete(doomed)
+        self.assertIsNone(self.history.get(doomed))
+        self.assertEqual([entry.id for entry in self.history.search("lighthouse")], [kept])
+        # The stories_ad trigger took the row out of the index itself, not just out of the join
+        with sqlite3.connect(self.history.path) as conn:
+            indexed = conn.execute("SELECT rowid FROM stories_fts WHERE stories_fts MATCH ?", ('"keeper"*',)).fetchall()
+            conn.execute("INSERT INTO stories_fts (stories_fts) VALUES ('integrity-check')")
+        self.assertEqual(indexed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import random
+import unittest
+
+from story_parser import StoryStreamParser, parse_generated_story
+
+METHODS = ("zero-shot", "few-shot", "chain-of-thought")
+
+PIECES = ("Once upon a time", " a lighthouse keeper", " found a **bottle**.", "\n", "\n\n", "  ", "*",
+          "Story:", "St*ory:", "Now, write a short story about:", "4. Story:", "1. ", "2.", "3. Plot",
+          "Character: Mara", "Plot: a storm", "Setting: the coast", "Cha", "Pl", "Sett", " The end.",
+          "\n1. Character: Ned\n", "\n4. Story:\n", "Examples:\nPrompt: x\nStory: y\n")
+
+
+def _stream(parser, chunks):
+    shown = ""
+    for chunk in chunks:
+        reset, text = parser.feed(chunk)
+        shown = text if reset else shown + text
+    return shown
+
+
+def _chunked(response, rng):
+    chunks, position = [], 0
+    while position < len(response):
+        size = rng.randint(1, 12)
+        chunks.append(response[position:position + size])
+        position += size
+    return chunks
+
+
+class StreamMatchesBatchTest(unittest.TestCase):
+    def test_fuzzed_streams_match_the_batch_parse(self):
+        rng = random.Random(0)
+        for case in range(3000):
+            method = METHODS[case % len(METHODS)]
+            response = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 12)))
+            expected = parse_generated_story(response, method)
+            parser = StoryStreamParser(method)
+            shown = _stream(parser, _chunked(response, rng))
+            reset, text = parser.flush()
+            final = text if reset else shown + text
+            with self.subTest(method=method, response=response):
+                self.assertEqual(final, expected)
+                self.assertEqual(parser.finish(), expected)
+
+    def test_partial_last_line_is_flushed(self):
+        parser = StoryStreamParser("chain-of-thought")
+        shown = _stream(parser, ["The keeper waited.\n", "Cha"])
+        self.assertEqual(shown, "The keeper waited.")
+        self.assertEqual(parser.flush(), (False, "\nCha"))
+
+    def test_single_chunk_matches_for_every_method(self):
+        response = "1. Character: Mara\n2. Plot: a storm\n4. Story:\n**Mara** kept the light burning."
+        for method in METHODS:
+            parser = StoryStreamParser(method)
+            shown = _stream(parser, [response])
+            reset, text = parser.flush()
+            self.assertEqual(text if reset else shown + text, parse_generated_story(response, method))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from http import HTTPStatus
+from unittest import mock
+
+import story_server
+from gemini_client import CircuitOpenError
+from story_server import HTTPError, StoryServer, read_request
+
+
+def parse(data, limit=2 ** 16):
+    async def run():
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(run())
+
+
+class ReadRequestTest(unittest.TestCase):
+    def assertRejected(self, data, status, **kwargs):
+        with self.assertRaises(HTTPError) as raised:
+            parse(data, **kwargs)
+        self.assertEqual(raised.exception.status, status)
+
+    def test_parses_body(self):
+        request = parse(b"POST /generate?x=1 HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}")
+        self.assertEqual((request.method, request.path, request.body), ("POST", "/generate", b"{}"))
+
+    def test_negative_content_length(self):
+        self.assertRejected(b"POST /generate HTTP/1.1\r\nContent-Length: -5\r\n\r\n", HTTPStatus.BAD_REQUEST)
+
+    def test_request_line_over_limit(self):
+        self.assertRejected(b"GET /" + b"a" * 200 + b" HTTP/1.1\r\n\r\n", HTTPStatus.BAD_REQUEST, limit=64)
+
+    def test_header_line_over_limit(self):
+        self.assertRejected(b"GET / HTTP/1.1\r\nX-Long: " + b"a" * 200 + b"\r\n\r\n",
+                            HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, limit=64)
+
+
+class CircuitOpenTest(unittest.TestCase):
+    def test_open_breaker_is_503_with_retry_after(self):
+        server = StoryServer("test", concurrency=1)
+        self.addCleanup(server.close)
+        request = parse(b'POST /generate HTTP/1.1\r\nContent-Length: 18\r\n\r\n{"topic": "a fox"}')
+
+        async def run():
+            server._slots = asyncio.Semaphore(1)
+            await server.generate(request, writer=None)
+
+        with mock.patch.object(story_server, "generate_story_result", side_effect=CircuitOpenError(12.4)):
+            with self.assertRaises(HTTPError) as raised:
+                asyncio.run(run())
+        self.assertEqual(raised.exception.status, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual(raised.exception.retry_after, 12)
+
+
+if __name__ == "__main__":
+    unittest.main()